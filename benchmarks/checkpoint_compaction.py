@@ -0,0 +1,210 @@
+"""
+Checkpoint index and compaction benchmark on a synthetic dataset.
+
+Fills a scratch MongoDB database with checkpoints and checkpoint writes shaped like the
+ones of AsyncMongoDBSaver, then measures the latest-checkpoint query of the widget
+without indexes, with indexes and after compaction. Reports the logical size of the
+documents compaction deleted and the change of the storage size, which stays small
+because WiredTiger reuses the freed space instead of shrinking its files.
+
+Usage:
+    python -m benchmarks.checkpoint_compaction --checkpoints 1000000 --threads 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import time
+import uuid
+
+import numpy as np
+from bson import Binary, ObjectId
+
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.widget.app.utils.checkpoint_maintenance import CheckpointMaintenance
+
+
+def _object_id_at(timestamp: float) -> ObjectId:
+    """ObjectId with the given creation time and a random remainder."""
+    return ObjectId(struct.pack(">I", int(timestamp)) + os.urandom(8))
+
+
+async def fill(
+    db_client: AsyncDatabaseClient,
+    database_name: str,
+    checkpoints: int,
+    threads: int,
+    payload_bytes: int,
+    days: int,
+    batch_size: int,
+) -> list[str]:
+    checkpoint_collection = await db_client.get_collection(
+        database_name, "checkpoints_aio"
+    )
+    writes_collection = await db_client.get_collection(
+        database_name, "checkpoint_writes_aio"
+    )
+
+    thread_ids = [f"thread_{uuid.uuid4().hex[:9]}" for _ in range(threads)]
+    per_thread = max(checkpoints // threads, 1)
+    now = time.time()
+    payload = Binary(os.urandom(payload_bytes))
+
+    checkpoint_batch, writes_batch = [], []
+    for thread_id in thread_ids:
+        # Last activity of the thread is spread over the last `days` days
+        last_activity = now - random.uniform(0, days * 86400)
+        for i in range(per_thread):
+            checkpoint_id = str(uuid.uuid4())
+            checkpoint_batch.append(
+                {
+                    "_id": _object_id_at(last_activity - (per_thread - i) * 5),
+                    "thread_id": thread_id,
+                    "checkpoint_ns": "",
+                    "checkpoint_id": checkpoint_id,
+                    "type": "msgpack",
+                    "checkpoint": payload,
+                    "metadata": {},
+                }
+            )
+            writes_batch.append(
+                {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": "",
+                    "checkpoint_id": checkpoint_id,
+                    "task_id": str(uuid.uuid4()),
+                    "idx": 0,
+                    "channel": "messages",
+                    "type": "msgpack",
+                    "value": payload,
+                }
+            )
+
+            if len(checkpoint_batch) >= batch_size:
+                await checkpoint_collection.insert_many(checkpoint_batch, ordered=False)
+                await writes_collection.insert_many(writes_batch, ordered=False)
+                checkpoint_batch, writes_batch = [], []
+
+    if checkpoint_batch:
+        await checkpoint_collection.insert_many(checkpoint_batch, ordered=False)
+        await writes_collection.insert_many(writes_batch, ordered=False)
+
+    return thread_ids
+
+
+async def latest_checkpoint_latency(
+    db_client: AsyncDatabaseClient,
+    database_name: str,
+    thread_ids: list[str],
+    queries: int,
+) -> dict:
+    collection = await db_client.get_collection(database_name, "checkpoints_aio")
+
+    latencies = []
+    for thread_id in random.sample(thread_ids, min(queries, len(thread_ids))):
+        start = time.perf_counter()
+        await collection.find_one(
+            {"thread_id": thread_id}, {"checkpoint_id": 1}, sort=[("_id", -1)]
+        )
+        latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--checkpoints", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=20_000)
+    parser.add_argument("--payload-bytes", type=int, default=2048)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--keep-last", type=int, default=5)
+    parser.add_argument("--ttl-days", type=int, default=7)
+    parser.add_argument("--database", default="checkpointing_benchmark")
+    parser.add_argument("--keep-database", action="store_true")
+    args = parser.parse_args()
+
+    db_client = AsyncDatabaseClient()
+    client = await db_client.get_client()
+    await client.drop_database(args.database)
+
+    maintenance = CheckpointMaintenance(db_client, database_name=args.database)
+    maintenance._settings.checkpoint_keep_last = args.keep_last
+    maintenance._settings.checkpoint_thread_ttl_days = args.ttl_days
+
+    try:
+        start = time.perf_counter()
+        thread_ids = await fill(
+            db_client,
+            args.database,
+            args.checkpoints,
+            args.threads,
+            args.payload_bytes,
+            args.days,
+            args.batch_size,
+        )
+        fill_seconds = time.perf_counter() - start
+
+        sizes_before = await maintenance.data_sizes()
+        without_indexes = await latest_checkpoint_latency(
+            db_client, args.database, thread_ids, args.queries
+        )
+
+        await maintenance.ensure_indexes()
+        with_indexes = await latest_checkpoint_latency(
+            db_client, args.database, thread_ids, args.queries
+        )
+
+        start = time.perf_counter()
+        compaction = await maintenance.compact()
+        compaction_seconds = time.perf_counter() - start
+
+        after_compaction = await latest_checkpoint_latency(
+            db_client, args.database, thread_ids, args.queries
+        )
+
+        print(
+            json.dumps(
+                {
+                    "checkpoints": args.checkpoints,
+                    "threads": args.threads,
+                    "fill_seconds": round(fill_seconds, 1),
+                    "logical_size_before_mb": round(
+                        sizes_before["logical"] / 1024**2, 1
+                    ),
+                    "storage_size_before_mb": round(
+                        sizes_before["storage"] / 1024**2, 1
+                    ),
+                    "logical_freed_mb": round(
+                        compaction["logical_bytes_freed"] / 1024**2, 1
+                    ),
+                    "storage_freed_mb": round(
+                        compaction["storage_bytes_freed"] / 1024**2, 1
+                    ),
+                    "trimmed_checkpoints": compaction["trimmed_checkpoints"],
+                    "expired_threads": compaction["expired_threads"],
+                    "compaction_seconds": round(compaction_seconds, 1),
+                    "latest_checkpoint_without_indexes": without_indexes,
+                    "latest_checkpoint_with_indexes": with_indexes,
+                    "latest_checkpoint_after_compaction": after_compaction,
+                },
+                indent=2,
+            )
+        )
+
+    finally:
+        if not args.keep_database:
+            await client.drop_database(args.database)
+        await AsyncDatabaseClient.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+"""
+Checkpoint write size and latency of one attachment turn, full state vs. slim state.
+
+Replays the checkpoints and node writes that one PDF turn produces (input, pdf, database,
+llm) with the serializer of the checkpointer. It compares the former state layouts with
+the current one:
+
+    full:    base64 file in user_input_data, extracted text and retrieved context kept
+             in user_input_data / vector_db_data, every node writes the whole state
+    channel: attachment reference in user_input_data, nodes write their prompt part to
+             a prompt_parts channel, which is checkpointed after every node
+    slim:    attachment reference in user_input_data, nodes write their prompt part to
+             an untracked channel, which is part of the node writes but of no checkpoint
+
+With --mongo the documents are also inserted into a scratch database to time the writes.
+
+Usage:
+    python -m benchmarks.checkpoint_size --attachment-mb 5 --mongo
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+
+from bson import Binary
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.clients.async_database_client import AsyncDatabaseClient
+
+
+_serde = JsonPlusSerializer()
+
+
+def _history(turns: int) -> list:
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"Frage {i} " + "x" * 200))
+        messages.append(AIMessage(content=f"Antwort {i} " + "y" * 1500))
+    return messages
+
+
+def build_turn(layout: str, args) -> list[tuple[dict, dict]]:
+    """Channel values of every checkpoint of the turn and the writes that led to it."""
+    attachment = "data:application/pdf;base64," + base64.b64encode(
+        os.urandom(int(args.attachment_mb * 1024**2))
+    ).decode("ascii")
+    markdown = "m" * (args.markdown_kb * 1024)
+    context = ". ".join("c" * args.chunk_chars for _ in range(args.chunks))
+    pdf_part = f"Das folgende hochgeladene PDF-Dokument: {markdown}.\n\n"
+    context_part = f"Die folgenden abgerufenen Informationen: {context}.\n\n"
+
+    history = _history(args.history_turns)
+    question = HumanMessage(content="Was steht in dem Dokument?")
+    answer = AIMessage(content="z" * 1500)
+
+    if layout == "full":
+        state = {
+            "messages": history + [question],
+            "user_input_type": "pdf",
+            "user_input_data": attachment,
+            "vector_db_data": "",
+            "collection_name": "benchmark",
+            "prompt_parts": [],
+        }
+        steps = [(dict(state), dict(state))]
+
+        state.update(user_input_data=markdown, prompt_parts=[pdf_part])
+        steps.append((dict(state), dict(state)))
+
+        state.update(vector_db_data=context, prompt_parts=[pdf_part, context_part])
+        steps.append((dict(state), dict(state)))
+
+        state.update(messages=state["messages"] + [answer], prompt_parts=[])
+        steps.append((dict(state), dict(state)))
+
+        return steps
+
+    if layout == "slim":
+        state = {
+            "messages": history + [question],
+            "user_input_type": "pdf",
+            "user_input_data": f"sha256:{'0' * 64}",
+            "collection_name": "benchmark",
+        }
+        steps = [(dict(state), dict(state))]
+
+        attachment_parts = [{"kind": "attachment", "text": pdf_part}]
+        retrieval_parts = [{"kind": "context", "text": context_part}]
+        steps.append((dict(state), {"attachment_prompt_parts": attachment_parts}))
+        steps.append((dict(state), {"retrieval_prompt_parts": retrieval_parts}))
+
+        state.update(messages=state["messages"] + [answer])
+        steps.append((dict(state), {"messages": answer}))
+
+        return steps
+
+    state = {
+        "messages": history + [question],
+        "user_input_type": "pdf",
+        "user_input_data": f"sha256:{'0' * 64}",
+        "collection_name": "benchmark",
+        "prompt_parts": [],
+    }
+    steps = [(dict(state), dict(state))]
+
+    pdf_part = {"kind": "attachment", "text": pdf_part}
+    context_part = {"kind": "context", "text": context_part}
+
+    state.update(prompt_parts=[pdf_part])
+    steps.append((dict(state), {"prompt_parts": [pdf_part]}))
+
+    state.update(prompt_parts=[pdf_part, context_part])
+    steps.append((dict(state), {"prompt_parts": [context_part]}))
+
+    state.update(messages=state["messages"] + [answer], prompt_parts=[])
+    steps.append((dict(state), {"messages": answer, "prompt_parts": None}))
+
+    return steps
+
+
+def serialize_turn(steps: list[tuple[dict, dict]]) -> list[tuple[bytes, list[bytes]]]:
+    serialized = []
+    for channel_values, writes in steps:
+        checkpoint = {
+            "v": 1,
+            "id": str(uuid.uuid4()),
+            "ts": "2025-01-01T00:00:00+00:00",
+            "channel_values": channel_values,
+            "channel_versions": {channel: 1 for channel in channel_values},
+            "versions_seen": {},
+            "pending_sends": [],
+        }
+        _, checkpoint_bytes = _serde.dumps_typed(checkpoint)
+        write_bytes = [_serde.dumps_typed(value)[1] for value in writes.values()]
+        serialized.append((checkpoint_bytes, write_bytes))
+
+    return serialized
+
+
+async def write_latency(serialized: list, database_name: str, repeats: int) -> float:
+    """Average seconds to insert all checkpoints and writes of one turn."""
+    db_client = AsyncDatabaseClient()
+    checkpoints = await db_client.get_collection(database_name, "checkpoints_aio")
+    writes = await db_client.get_collection(database_name, "checkpoint_writes_aio")
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        thread_id = str(uuid.uuid4())
+        for checkpoint_bytes, write_bytes in serialized:
+            await writes.insert_many(
+                [
+                    {"thread_id": thread_id, "idx": i, "value": Binary(value)}
+                    for i, value in enumerate(write_bytes)
+                ]
+            )
+            await checkpoints.insert_one(
+                {"thread_id": thread_id, "checkpoint": Binary(checkpoint_bytes)}
+            )
+    elapsed = (time.perf_counter() - start) / repeats
+
+    client = await db_client.get_client()
+    await client.drop_database(database_name)
+    await AsyncDatabaseClient.close_client()
+
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attachment-mb", type=float, default=5)
+    parser.add_argument("--markdown-kb", type=int, default=60)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    parser.add_argument("--history-turns", type=int, default=5)
+    parser.add_argument("--mongo", action="store_true")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--database", default="checkpoint_size_benchmark")
+    args = parser.parse_args()
+
+    for layout in ("full", "channel", "slim"):
+        serialized = serialize_turn(build_turn(layout, args))
+        result = {
+            "layout": layout,
+            "checkpoint_bytes_per_turn": sum(len(cp) for cp, _ in serialized),
+            "write_bytes_per_turn": sum(sum(map(len, w)) for _, w in serialized),
+        }
+        if args.mongo:
+            result["write_seconds_per_turn"] = round(
+                await write_latency(serialized, args.database, args.repeats), 4
+            )
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
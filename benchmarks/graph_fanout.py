@@ -0,0 +1,125 @@
+"""
+Latency of the widget graph with sequential vs. parallel attachment and retrieval nodes.
+
+Runs the real graph (vision model, Docling, dense/sparse services, Qdrant, LLM) with an
+in-memory checkpointer for every given attachment type, once with the former sequential
+wiring (attachment -> database -> llm) and once with the parallel branches. Reports the
+time until the llm node starts and the total time per run.
+
+Usage:
+    python -m benchmarks.graph_fanout --collection <name> --question "..." \\
+        --pdf doc.pdf --image photo.jpg --csv data.csv --txt notes.txt --runs 5
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import mimetypes
+import time
+import uuid
+
+import numpy as np
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.widget.app.async_graph import AsyncGraph
+from src.widget.app.utils.pdf_conversion import PDFConverterPool
+from src.widget.app.utils.processors.async_processors import AsyncIMAGEProcessor
+
+
+async def run_once(graph, graph_input: dict) -> tuple[float, float]:
+    """Seconds until the llm node starts and until the answer is complete."""
+    config = {"configurable": {"thread_id": f"benchmark_{uuid.uuid4().hex[:9]}"}}
+    graph_input = dict(graph_input, thread_id=config["configurable"]["thread_id"])
+
+    start = time.perf_counter()
+    pre_llm = None
+    async for _, metadata in graph.astream(graph_input, config, stream_mode="messages"):
+        if pre_llm is None and metadata.get("langgraph_node") == "llm":
+            pre_llm = time.perf_counter() - start
+    total = time.perf_counter() - start
+
+    return pre_llm if pre_llm is not None else total, total
+
+
+def _summary(values: list[float]) -> dict:
+    values = np.array(values)
+    return {
+        "mean_s": round(float(values.mean()), 3),
+        "p50_s": round(float(np.percentile(values, 50)), 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--question", required=True)
+    parser.add_argument("--pdf")
+    parser.add_argument("--image")
+    parser.add_argument("--csv")
+    parser.add_argument("--txt")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    db_client = AsyncDatabaseClient()
+    graphs = {
+        "sequential": await AsyncGraph().build_graph(MemorySaver(), parallel=False),
+        "parallel": await AsyncGraph().build_graph(MemorySaver(), parallel=True),
+    }
+
+    for input_type in ("pdf", "image", "csv", "txt"):
+        path = getattr(args, input_type)
+        if not path:
+            continue
+
+        with open(path, "rb") as file:
+            raw = file.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        reference = await db_client.put_attachment(
+            hashlib.sha256(raw).hexdigest(), raw, content_type
+        )
+
+        graph_input = {
+            "messages": args.question,
+            "user_input_type": input_type,
+            "user_input_data": reference,
+            "collection_name": args.collection,
+        }
+
+        for mode, graph in graphs.items():
+            # The first run fills the image description / PDF markdown caches; it is
+            # measured separately because follow-up runs only measure the cache path
+            AsyncIMAGEProcessor._descriptions.clear()
+            if PDFConverterPool._markdown is not None:
+                PDFConverterPool._markdown.clear()
+
+            first_pre_llm, first_total = await run_once(graph, graph_input)
+
+            pre_llm, total = [], []
+            for _ in range(args.runs):
+                result = await run_once(graph, graph_input)
+                pre_llm.append(result[0])
+                total.append(result[1])
+
+            print(
+                json.dumps(
+                    {
+                        "type": input_type,
+                        "mode": mode,
+                        "first_run": {
+                            "pre_llm_s": round(first_pre_llm, 3),
+                            "total_s": round(first_total, 3),
+                        },
+                        "pre_llm": _summary(pre_llm),
+                        "total": _summary(total),
+                    }
+                )
+            )
+
+    PDFConverterPool.shutdown()
+    await AsyncDatabaseClient.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,187 @@
+"""
+Per-request overhead of the widget graph without and with the AppContainer.
+
+Without the container (the former behaviour) every node execution builds a new
+processor with its own clients: ChatOpenAI or AsyncOpenAI with their own HTTP connection
+pools, an AsyncVectorClient and a PromptAssembler, each of which read src/.env through
+Settings(). With the container the graph reuses one processor per node, with shared
+clients and the cached settings of get_settings().
+
+Measures, offline against the stand-ins of benchmarks/stand_ins.py without latency
+(Qdrant in local mode, checkpoints in a MemorySaver):
+
+- settings: one Settings() read against a get_settings() call
+- processors: the processors of a database question (database and llm node) built
+  per request, against the lookup in the container. The settings reads the former
+  code made are counted and priced with the Settings() time
+- graph: complete graph runs, each the first question of a new thread
+
+Usage:
+    python -m benchmarks.graph_overhead --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.stand_ins import StandInOptions, configure_environment, start_stand_ins
+
+
+COLLECTION = "overhead"
+QUESTIONS = [
+    "Wann beginnt die Anmeldung zur Prüfung?",
+    "Wie viele Credits hat das Modul?",
+    "Wer ist für die Studienberatung zuständig?",
+    "Wo finde ich die Prüfungsordnung?",
+]
+
+
+def _summary(seconds: list[float], unit: str = "ms") -> dict:
+    factor = 1e3 if unit == "ms" else 1e6
+    values = np.array(seconds) * factor
+    return {
+        f"mean_{unit}": round(float(values.mean()), 3),
+        f"p50_{unit}": round(float(np.percentile(values, 50)), 3),
+        f"p95_{unit}": round(float(np.percentile(values, 95)), 3),
+    }
+
+
+def _timings(function, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def measure_processors(container, repeat: int) -> dict:
+    from src.settings import Settings, get_settings
+    from src.widget.app.utils.processors.async_processor_factory import (
+        AsyncProcessorFactory,
+    )
+
+    settings_read = _timings(Settings, repeat)
+    settings_cached = _timings(get_settings, repeat)
+
+    per_request = AsyncProcessorFactory()
+    shared = AsyncProcessorFactory(container.processors)
+
+    async def build(factory) -> float:
+        start = time.perf_counter()
+        for user_input_type in ("db", "llm"):
+            await factory.create_processor(user_input_type)
+        return time.perf_counter() - start
+
+    hits = get_settings.cache_info().hits
+    before = [await build(per_request) for _ in range(repeat)]
+    # Every get_settings() call of the per-request processors was a Settings() before
+    reads_per_request = (get_settings.cache_info().hits - hits) / repeat
+    after = [await build(shared) for _ in range(repeat)]
+
+    return {
+        "settings": {
+            "Settings()": _summary(settings_read, "us"),
+            "get_settings()": _summary(settings_cached, "us"),
+        },
+        "processors": {
+            "settings_reads_per_request_before": reads_per_request,
+            "before": {
+                **_summary(before, "us"),
+                "mean_us_with_settings_reads": round(
+                    (np.mean(before) + reads_per_request * np.mean(settings_read))
+                    * 1e6,
+                    3,
+                ),
+            },
+            "after": _summary(after, "us"),
+        },
+    }
+
+
+async def measure_graph(graph, requests: int) -> dict:
+    timings = []
+    for i in range(requests):
+        graph_input = {
+            "messages": QUESTIONS[i % len(QUESTIONS)],
+            "user_input_type": "database",
+            "user_input_data": "",
+            "collection_name": COLLECTION,
+            "collection_names": [],
+            "thread_id": f"overhead_{uuid.uuid4().hex[:12]}",
+        }
+        config = {"configurable": {"thread_id": graph_input["thread_id"]}}
+
+        start = time.perf_counter()
+        await graph.ainvoke(graph_input, config)
+        timings.append(time.perf_counter() - start)
+
+    return _summary(timings)
+
+
+async def run(args) -> dict:
+    # src reads its settings on import, so it is imported after configure_environment
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from src.clients.async_vector_client import AsyncVectorClient
+    from src.widget.app.async_graph import AsyncGraph
+    from src.widget.app.container import AppContainer
+
+    vector_client = AsyncVectorClient()
+    await vector_client.create_collection(COLLECTION)
+    await vector_client.enter_points(
+        COLLECTION,
+        {
+            f"https://example.org/overhead/{d}": [
+                f"{question} Abschnitt {d}.{c}" for c, question in enumerate(QUESTIONS)
+            ]
+            for d in range(20)
+        },
+    )
+
+    container = AppContainer.create()
+    report = await measure_processors(container, args.repeat)
+
+    graphs = {
+        "before": await AsyncGraph().build_graph(MemorySaver()),
+        "after": await AsyncGraph(container).build_graph(MemorySaver()),
+    }
+    for graph in graphs.values():
+        await measure_graph(graph, args.warmup)
+
+    report["graph"] = {
+        name: await measure_graph(graph, args.requests)
+        for name, graph in graphs.items()
+    }
+    await container.aclose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200, help="Graph runs per mode")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=1000, help="Micro benchmarks")
+    args = parser.parse_args()
+
+    # Without latency, so that only our own code is measured
+    options = StandInOptions(
+        llm_ttft=0.0, llm_token_latency=0.0, answer_tokens=20, embed_latency=0.0
+    )
+    process, ports = start_stand_ins(options)
+    configure_environment(ports, options)
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        process.terminate()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Throughput and memory of the ingest pipeline per stage, with a JSON baseline.
+
+Runs the chunkers of src/ingest and AsyncVectorClient.enter_points on synthetic, seeded
+corpora: a large TXT, a wide and a long CSV, crawled markdown pages, a multi-page text
+PDF and a scanned PDF (pages as images only, so the OCR fallback is taken). The dense
+and sparse services are the deterministic stand-ins of benchmarks/stand_ins.py and
+Qdrant runs in-process, so the numbers measure our own code (and Docling / Tesseract
+for the PDFs).
+
+Reports documents/s, chunks/s and the peak RSS during every stage (median of --repeat
+runs). --update-baseline stores the results in benchmarks/baselines/, --check compares
+against the stored baseline and exits with 1 on a regression beyond --tolerance.
+
+Usage:
+    python -m benchmarks.ingest_throughput --repeat 3 --check
+    python -m benchmarks.ingest_throughput --repeat 3 --update-baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import psutil
+
+from benchmarks.stand_ins import StandInOptions, configure_environment, start_stand_ins
+
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(__file__), "baselines", "ingest_throughput.json"
+)
+COLLECTION = "ingest_benchmark"
+
+
+class PeakRSS:
+    """Samples the RSS of this process in a thread to find the peak of a stage."""
+
+    def __init__(self, interval: float = 0.005):
+        self._process = psutil.Process()
+        self._interval = interval
+        self._peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._peak = self._process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, self._process.memory_info().rss)
+
+    def _sample(self):
+        while not self._stop.wait(self._interval):
+            self._peak = max(self._peak, self._process.memory_info().rss)
+
+    @property
+    def peak_mb(self) -> float:
+        return self._peak / 1024**2
+
+
+class Corpus:
+    """Seeded synthetic text in the style of university web pages and documents."""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        syllables = "be de fa ge hoch kurs le ma prü ra schu se stu ter ung".split()
+        self.words = sorted({self._word(syllables) for _ in range(5000)})
+
+    def _word(self, syllables: list[str]) -> str:
+        return "".join(self.rng.choices(syllables, k=self.rng.randint(2, 4)))
+
+    def sentence(self) -> str:
+        words = self.rng.choices(self.words, k=self.rng.randint(8, 20))
+        return " ".join(words).capitalize() + "."
+
+    def paragraph(self) -> str:
+        return " ".join(self.sentence() for _ in range(self.rng.randint(3, 8)))
+
+    def text(self, size_bytes: int) -> str:
+        paragraphs, size = [], 0
+        while size < size_bytes:
+            paragraphs.append(self.paragraph())
+            size += len(paragraphs[-1]) + 2
+        return "\n\n".join(paragraphs)
+
+    def csv(self, rows: int, columns: int) -> bytes:
+        header = ";".join(f"spalte_{c}" for c in range(columns))
+        lines = [header]
+        for r in range(rows):
+            cells = [
+                str(r) if c == 0 else self.rng.choice(self.words)
+                for c in range(columns)
+            ]
+            lines.append(";".join(cells))
+        return "\n".join(lines).encode("utf-8")
+
+    def markdown(self, sections: int) -> str:
+        parts = []
+        for s in range(sections):
+            parts.append(f"# Abschnitt {s}\n\n{self.paragraph()}")
+            for sub in range(self.rng.randint(1, 3)):
+                parts.append(f"## Unterabschnitt {s}.{sub}\n\n{self.paragraph()}")
+        return "\n\n".join(parts)
+
+    def pdf(self, pages: int, scanned: bool) -> bytes:
+        import pymupdf
+
+        document = pymupdf.open()
+        for _ in range(pages):
+            page = document.new_page()
+            page.insert_textbox(
+                page.rect + (50, 50, -50, -50), self.text(2500), fontsize=9
+            )
+
+        if not scanned:
+            return document.tobytes()
+
+        # Rasterize every page, the scanned PDF has no text layer
+        scanned_document = pymupdf.open()
+        for page in document:
+            pixmap = page.get_pixmap(dpi=150)
+            new_page = scanned_document.new_page(
+                width=page.rect.width, height=page.rect.height
+            )
+            new_page.insert_image(new_page.rect, stream=pixmap.tobytes("png"))
+        return scanned_document.tobytes()
+
+
+async def measure(name: str, documents: int, run, repeat: int) -> dict:
+    """Run a stage repeat times, return the median throughput and the peak RSS."""
+    seconds, peaks, chunks = [], [], 0
+    for _ in range(repeat):
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            chunks = await run()
+            seconds.append(time.perf_counter() - start)
+        peaks.append(rss.peak_mb)
+
+    median = float(np.median(seconds))
+    result = {
+        "documents": documents,
+        "chunks": chunks,
+        "seconds": round(median, 4),
+        "documents_per_s": round(documents / median, 3),
+        "chunks_per_s": round(chunks / median, 2),
+        "peak_rss_mb": round(max(peaks), 1),
+    }
+    print(json.dumps({"stage": name, **result}))
+    return result
+
+
+async def run_stages(args) -> dict:
+    # src reads its settings on import, so it is imported after configure_environment
+    from src.clients.async_vector_client import AsyncVectorClient
+    from src.ingest.character_splitter import chunk_text
+    from src.ingest.ingest_service import (
+        achunk_markdown,
+        acrawl_chunk_csv,
+        acrawl_chunk_pdf,
+        acrawl_chunk_txt,
+    )
+
+    corpus = Corpus(args.seed)
+    scale = args.scale
+    results = {}
+
+    large_text = corpus.text(int(5 * 1024**2 * scale))
+    large_txt = large_text.encode("utf-8")
+    wide_csv = corpus.csv(rows=int(2_000 * scale), columns=200)
+    long_csv = corpus.csv(rows=int(200_000 * scale), columns=8)
+    pages = {
+        f"https://example.org/seite/{p}": corpus.markdown(sections=12)
+        for p in range(int(200 * scale))
+    }
+
+    async def character_splitter():
+        return len(await chunk_text(large_text))
+
+    async def chunk_txt():
+        return len(await acrawl_chunk_txt(binary_data=large_txt))
+
+    async def chunk_wide_csv():
+        return len(await acrawl_chunk_csv(binary_data=wide_csv))
+
+    async def chunk_long_csv():
+        return len(await acrawl_chunk_csv(binary_data=long_csv))
+
+    async def chunk_markdown():
+        async def crawled():
+            for url, markdown in pages.items():
+                yield {url: markdown}
+
+        chunks = 0
+        async for url_to_chunks in achunk_markdown(url_to_markdown=crawled()):
+            chunks += sum(len(c) for c in url_to_chunks.values())
+        return chunks
+
+    results["character_splitter.chunk_text"] = await measure(
+        "character_splitter.chunk_text", 1, character_splitter, args.repeat
+    )
+    results["acrawl_chunk_txt"] = await measure(
+        "acrawl_chunk_txt", 1, chunk_txt, args.repeat
+    )
+    results["acrawl_chunk_csv[wide]"] = await measure(
+        "acrawl_chunk_csv[wide]", 1, chunk_wide_csv, args.repeat
+    )
+    results["acrawl_chunk_csv[long]"] = await measure(
+        "acrawl_chunk_csv[long]", 1, chunk_long_csv, args.repeat
+    )
+    results["achunk_markdown"] = await measure(
+        "achunk_markdown", len(pages), chunk_markdown, args.repeat
+    )
+
+    if not args.skip_pdf:
+        text_pdf = corpus.pdf(pages=args.pdf_pages, scanned=False)
+        scanned_pdf = corpus.pdf(pages=args.scanned_pages, scanned=True)
+
+        async def chunk_text_pdf():
+            return len(await acrawl_chunk_pdf(binary_data=text_pdf))
+
+        async def chunk_scanned_pdf():
+            return len(await acrawl_chunk_pdf(binary_data=scanned_pdf))
+
+        results["acrawl_chunk_pdf[text]"] = await measure(
+            "acrawl_chunk_pdf[text]", 1, chunk_text_pdf, args.repeat
+        )
+        results["acrawl_chunk_pdf[scanned]"] = await measure(
+            "acrawl_chunk_pdf[scanned]", 1, chunk_scanned_pdf, args.repeat
+        )
+
+    vector_client = AsyncVectorClient()
+    sources_to_chunks = {
+        f"https://example.org/dokument/{d}": [
+            corpus.paragraph() for _ in range(args.chunks_per_source)
+        ]
+        for d in range(int(20 * scale) or 1)
+    }
+    total_chunks = sum(len(chunks) for chunks in sources_to_chunks.values())
+
+    async def enter_points():
+        await vector_client.delete_collection(COLLECTION)
+        await vector_client.create_collection(COLLECTION)
+        await vector_client.enter_points(COLLECTION, sources_to_chunks)
+        return total_chunks
+
+    results["AsyncVectorClient.enter_points"] = await measure(
+        "AsyncVectorClient.enter_points",
+        len(sources_to_chunks),
+        enter_points,
+        args.repeat,
+    )
+
+    return results
+
+
+def compare(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """Stages that got slower or use more memory than the baseline allows."""
+    regressions = []
+    for stage, result in results.items():
+        reference = baseline["stages"].get(stage)
+        if reference is None:
+            print(f"{stage}: not in the baseline, not compared")
+            continue
+
+        if result["chunks_per_s"] < reference["chunks_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{stage}: {result['chunks_per_s']} chunks/s, "
+                f"baseline {reference['chunks_per_s']}"
+            )
+        if result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{stage}: peak RSS {result['peak_rss_mb']} MB, "
+                f"baseline {reference['peak_rss_mb']} MB"
+            )
+        if result["chunks"] != reference["chunks"]:
+            # Not a regression by itself, but the throughputs are not comparable
+            print(
+                f"{stage}: {result['chunks']} chunks, baseline {reference['chunks']}, "
+                "did the chunking change?"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Factor for all corpus sizes"
+    )
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--scanned-pages", type=int, default=3)
+    parser.add_argument("--skip-pdf", action="store_true", help="Skip Docling / OCR")
+    parser.add_argument("--chunks-per-source", type=int, default=100)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Without latency, so that only our own code is measured
+    options = StandInOptions(embed_latency=0.0)
+    process, ports = start_stand_ins(options)
+    configure_environment(ports, options)
+
+    try:
+        results = asyncio.run(run_stages(args))
+    finally:
+        process.terminate()
+
+    config = {
+        key: getattr(args, key)
+        for key in (
+            "repeat",
+            "seed",
+            "scale",
+            "pdf_pages",
+            "scanned_pages",
+            "skip_pdf",
+            "chunks_per_source",
+        )
+    }
+    report = {
+        "config": config,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": results,
+    }
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"No baseline at {BASELINE_PATH}, run with --update-baseline first")
+            sys.exit(1)
+
+        with open(BASELINE_PATH) as file:
+            baseline = json.load(file)
+        if baseline["config"] != config:
+            print(f"Baseline config {baseline['config']} differs from {config}")
+        if baseline["machine"] != report["machine"]:
+            print(f"Baseline recorded on {baseline['machine']}")
+
+        regressions = compare(baseline, results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Offline end-to-end load test of the widget answer endpoints.
+
+Needs no network and no running services: the LLM and the dense/sparse services are
+replaced by the stand-ins of benchmarks/stand_ins.py (in a child process), Qdrant runs
+in-process in local mode, checkpoints are kept by a MemorySaver and the message log by an
+in-memory store. A synthetic corpus is ingested through the real vector client, then the
+real widget app is served by uvicorn on the loopback interface and driven by concurrent
+simulated users, each asking its questions in its own chat thread.
+
+Reports latency percentiles, throughput and the time per stage (from the spans recorded
+by src/tracing for the measured requests) as JSON.
+
+With --websocket every user asks over one connection to /ws instead.
+
+Usage:
+    python -m benchmarks.load_test --users 20 --questions 5 --stream \\
+        --llm-ttft 0.3 --llm-token-latency 0.02 --answer-tokens 150
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+import uuid
+
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+
+from benchmarks.stand_ins import (
+    StandInOptions,
+    configure_environment,
+    start_stand_ins,
+)
+
+
+COLLECTION = "loadtest"
+SYLLABLES = (
+    "ba ber da den fa ge hoch ka kurs la le ma mo na prü ra "
+    "schu se stu ta ter ung ver zu"
+).split()
+
+
+def build_corpus(args, rng: random.Random) -> tuple[dict[str, list[str]], list[str]]:
+    """Synthetic documents (source -> chunks) and questions about random chunks."""
+    vocabulary = sorted(
+        {
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            for _ in range(args.vocabulary)
+        }
+    )
+
+    corpus = {}
+    for d in range(args.documents):
+        corpus[f"https://example.org/dokument/{d}"] = [
+            " ".join(rng.choice(vocabulary) for _ in range(args.chunk_words)) + "."
+            for _ in range(args.chunks_per_document)
+        ]
+
+    chunks = [chunk for document in corpus.values() for chunk in document]
+    questions = []
+    for _ in range(args.question_pool):
+        words = rng.choice(chunks).rstrip(".").split()
+        questions.append("Was bedeutet " + " ".join(rng.sample(words, 6)) + "?")
+
+    return corpus, questions
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    values = np.array(values) * 1000
+    return {
+        "mean_ms": round(float(values.mean()), 1),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+    }
+
+
+async def ask(client: httpx.AsyncClient, payload: dict, stream: bool) -> dict:
+    start = time.perf_counter()
+    ttft = None
+
+    if stream:
+        ok = False
+        async with client.stream(
+            "POST", "/generate_answer_stream", json=payload
+        ) as response:
+            trace_id = response.headers.get("x-trace-id")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token" and ttft is None:
+                    ttft = time.perf_counter() - start
+                ok = event["type"] == "done"
+    else:
+        response = await client.post("/generate_answer", json=payload)
+        trace_id = response.headers.get("x-trace-id")
+        ok = response.status_code == 200
+
+    return {
+        "ok": ok,
+        "latency": time.perf_counter() - start,
+        "ttft": ttft,
+        "trace_id": trace_id,
+    }
+
+
+async def ask_socket(connection, payload: dict) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    request_id = uuid.uuid4().hex
+
+    await connection.send(json.dumps({"type": "ask", "id": request_id, **payload}))
+    while True:
+        event = json.loads(await connection.recv())
+        if event.get("id") != request_id:
+            continue
+        if event["type"] == "token" and ttft is None:
+            ttft = time.perf_counter() - start
+        if event["type"] in ("done", "error", "cancelled"):
+            break
+
+    return {
+        "ok": event["type"] == "done",
+        "latency": time.perf_counter() - start,
+        "ttft": ttft,
+        "trace_id": event.get("trace_id"),
+    }
+
+
+async def simulate_user(
+    client: httpx.AsyncClient,
+    args,
+    questions: list[str],
+    delay: float,
+    results: list[dict],
+):
+    """One user asking its questions in sequence in a new chat thread."""
+    await asyncio.sleep(delay)
+    thread_id = f"loadtest_{uuid.uuid4().hex[:12]}"
+
+    connection = None
+    if args.websocket:
+        connection = await websockets.connect(
+            f"ws://{client.base_url.host}:{client.base_url.port}/ws"
+        )
+        # The ready event
+        await connection.recv()
+
+    try:
+        for question in questions:
+            payload = {
+                "message": question,
+                "data": "",
+                "collection": COLLECTION,
+                "thread_id": thread_id,
+            }
+            try:
+                if connection is not None:
+                    results.append(await ask_socket(connection, payload))
+                else:
+                    results.append(await ask(client, payload, args.stream))
+            except (httpx.HTTPError, websockets.WebSocketException) as e:
+                print(f"Request failed: {type(e).__name__} {e}")
+                results.append({"ok": False, "latency": None, "ttft": None})
+
+            if args.think_time:
+                await asyncio.sleep(random.expovariate(1 / args.think_time))
+    finally:
+        if connection is not None:
+            await connection.close()
+
+
+def stage_breakdown(spans: list[dict], trace_ids: set[str], total_seconds: float):
+    """Time per span name over the measured requests, largest total first."""
+    durations: dict[str, list[float]] = {}
+    for record in spans:
+        if record["trace_id"] not in trace_ids:
+            continue
+        seconds = (record["end_time_unix_nano"] - record["start_time_unix_nano"]) / 1e9
+        durations.setdefault(record["name"], []).append(seconds)
+
+    stages = {}
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        stages[name] = {
+            "count": len(values),
+            "share_of_request_time": round(sum(values) / total_seconds, 3),
+            **_percentiles(values),
+        }
+    return stages
+
+
+async def run(args, options: StandInOptions):
+    # src reads its settings on import, so it is imported after configure_environment
+    from langgraph.checkpoint.memory import MemorySaver
+
+    import src.widget.frontend.app as widget
+    from benchmarks.local_backends import InMemoryDatabaseClient
+    from src import tracing
+    from src.clients.async_answer_cache import AsyncAnswerCache
+    from src.clients.async_vector_client import AsyncVectorClient
+    from src.widget.app.async_graph import AsyncGraph
+    from src.widget.app.container import AppContainer
+
+    rng = random.Random(args.seed)
+    corpus, question_pool = build_corpus(args, rng)
+
+    start = time.perf_counter()
+    vector_client = AsyncVectorClient()
+    await vector_client.create_collection(COLLECTION)
+    await vector_client.enter_points(COLLECTION, corpus)
+    print(
+        f"Ingested {sum(len(chunks) for chunks in corpus.values())} chunks "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+    # What the lifespan of the app does, with the in-memory backends
+    widget.CONTAINER = AppContainer.create(db_client=InMemoryDatabaseClient())
+    widget.GRAPH = await AsyncGraph(widget.CONTAINER).build_graph(MemorySaver())
+    widget.DB_CLIENT = widget.CONTAINER.db_client
+    widget.ANSWER_CACHE = AsyncAnswerCache()
+    widget.DENSE_CLIENT = widget.CONTAINER.dense_client
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(
+            widget.app,
+            host="127.0.0.1",
+            port=port,
+            lifespan="off",
+            log_level="warning",
+            access_log=False,
+        )
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}",
+        timeout=httpx.Timeout(args.timeout),
+        limits=httpx.Limits(max_connections=args.users),
+    ) as client:
+        for question in question_pool[: args.warmup]:
+            payload = {
+                "message": question,
+                "data": "",
+                "collection": COLLECTION,
+                "thread_id": f"warmup_{uuid.uuid4().hex[:12]}",
+            }
+            await ask(client, payload, args.stream)
+
+        results: list[dict] = []
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                simulate_user(
+                    client,
+                    args,
+                    rng.sample(question_pool, args.questions),
+                    i * args.ramp_up / args.users,
+                    results,
+                )
+                for i in range(args.users)
+            )
+        )
+        wall_seconds = time.perf_counter() - start
+
+    server.should_exit = True
+    await server_task
+
+    succeeded = [result for result in results if result["ok"]]
+    latencies = [result["latency"] for result in succeeded]
+    trace_ids = {result["trace_id"] for result in succeeded if result.get("trace_id")}
+
+    if args.websocket:
+        endpoint = "/ws"
+    else:
+        endpoint = "/generate_answer_stream" if args.stream else "/generate_answer"
+
+    report = {
+        "endpoint": endpoint,
+        "users": args.users,
+        "requests": len(results),
+        "errors": len(results) - len(succeeded),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_rps": round(len(succeeded) / wall_seconds, 2),
+        "latency": _percentiles(latencies),
+        "stand_ins": vars(options),
+        "stages": stage_breakdown(
+            tracing.finished_spans(), trace_ids, max(sum(latencies), 1e-9)
+        ),
+    }
+    if args.stream or args.websocket:
+        report["ttft"] = _percentiles(
+            [result["ttft"] for result in succeeded if result["ttft"] is not None]
+        )
+
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10, help="Concurrent users")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per user")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="Seconds")
+    parser.add_argument("--stream", action="store_true", help="Use the NDJSON endpoint")
+    parser.add_argument("--websocket", action="store_true", help="Ask over /ws")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--answer-cache", action="store_true")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--chunks-per-document", type=int, default=20)
+    parser.add_argument("--chunk-words", type=int, default=120)
+    parser.add_argument("--vocabulary", type=int, default=3000)
+    parser.add_argument("--question-pool", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--llm-token-latency", type=float, default=0.02)
+    parser.add_argument("--answer-tokens", type=int, default=150)
+    parser.add_argument("--embed-latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    options = StandInOptions(
+        dimension=args.dimension,
+        llm_ttft=args.llm_ttft,
+        llm_token_latency=args.llm_token_latency,
+        answer_tokens=args.answer_tokens,
+        embed_latency=args.embed_latency,
+    )
+    process, ports = start_stand_ins(options)
+    configure_environment(ports, options)
+    os.environ["ANSWER_CACHE_ENABLED"] = str(args.answer_cache).lower()
+
+    try:
+        asyncio.run(run(args, options))
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
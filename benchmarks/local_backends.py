@@ -0,0 +1,58 @@
+"""
+In-process replacement for MongoDB, used by the offline benchmarks. Qdrant runs in the
+local mode of the vector client (BENCHMARK_LOCAL_QDRANT, set by configure_environment).
+
+Import this module only after stand_ins.configure_environment, it imports src.
+"""
+
+from typing import Optional
+
+from src.clients.async_database_client import AsyncDatabaseClient
+
+
+class InMemoryDatabaseClient(AsyncDatabaseClient):
+    """
+    AsyncDatabaseClient keeping attachments and message logs in dicts, with the same
+    semantics as the Mongo implementation for the calls the widget makes per request.
+    Checkpoints are kept by the MemorySaver of the graph.
+    """
+
+    def __init__(self):
+        self._attachments: dict[str, tuple[bytes, str]] = {}
+        self._messages: dict[str, list[str]] = {}
+
+    @classmethod
+    async def get_client(cls):
+        return None
+
+    @classmethod
+    async def close_client(cls):
+        pass
+
+    async def ensure_indexes(self):
+        pass
+
+    async def put_attachment(self, digest: str, data: bytes, content_type: str) -> str:
+        self._attachments.setdefault(digest, (data, content_type))
+        return f"sha256:{digest}"
+
+    async def get_attachment(self, reference: str) -> Optional[tuple[bytes, str]]:
+        return self._attachments.get(reference.removeprefix("sha256:"))
+
+    async def append_messages(self, thread_id: str, messages: list[str]):
+        self._messages.setdefault(thread_id, []).extend(messages)
+
+    async def get_messages(
+        self,
+        thread_id: str,
+        after: Optional[int] = None,
+        last: Optional[int] = None,
+    ) -> tuple[int, list[str]]:
+        messages = self._messages.get(thread_id, [])
+        start = after + 1 if after is not None else 0
+        if last is not None:
+            start = max(start, len(messages) - last)
+        return start, messages[start:]
+
+    async def delete(self, thread_id: str):
+        self._messages.pop(thread_id, None)
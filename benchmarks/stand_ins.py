@@ -0,0 +1,216 @@
+"""
+Local stand-ins for the external services of the widget, used by the offline benchmarks.
+
+- an OpenAI compatible chat completions server with configurable latencies
+- fake dense and sparse embedding services with the API of src/dense and src/sparse,
+  deterministic hashed bag-of-words vectors, so similar texts get similar vectors
+
+The servers run in a child process on the loopback interface, so that their pacing is
+not disturbed by the process under test. This module does not import src, because the
+settings must point to the stand-ins before src is imported.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+from aiohttp import web
+
+
+@dataclass
+class StandInOptions:
+    dimension: int = 1024
+    # Seconds until the first token and between two tokens of the fake LLM
+    llm_ttft: float = 0.3
+    llm_token_latency: float = 0.02
+    answer_tokens: int = 150
+    # Seconds per embedded text of the fake embedders
+    embed_latency: float = 0.002
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _bucket(word: str, size: int) -> int:
+    # Python's hash() is salted per process, md5 keeps the vectors deterministic
+    return int.from_bytes(hashlib.md5(word.encode()).digest()[:8], "little") % size
+
+
+def fake_dense_vector(text: str, dimension: int) -> list[float]:
+    """Normalized hashed bag of words."""
+    vector = [0.0] * dimension
+    for word in _words(text):
+        vector[_bucket(word, dimension)] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def fake_sparse_vector(text: str) -> dict:
+    counts: dict[int, float] = {}
+    for word in _words(text):
+        index = _bucket(word, 2**20)
+        counts[index] = counts.get(index, 0.0) + 1.0
+    indices = sorted(counts)
+    return {"indices": indices, "values": [counts[index] for index in indices]}
+
+
+def _inputs(data: dict) -> list[str]:
+    texts = data.get("inputs", [])
+    return [texts] if isinstance(texts, str) else texts
+
+
+def dense_app(options: StandInOptions) -> web.Application:
+    async def embed(request: web.Request) -> web.Response:
+        texts = _inputs(await request.json())
+        await asyncio.sleep(options.embed_latency * len(texts))
+        return web.json_response(
+            {"vectors": [fake_dense_vector(text, options.dimension) for text in texts]}
+        )
+
+    async def tokenize(request: web.Request) -> web.Response:
+        texts = (await request.json()).get("inputs", [])
+        if isinstance(texts, str):
+            return web.json_response({"counts": len(_words(texts))})
+        return web.json_response({"counts": [len(_words(text)) for text in texts]})
+
+    app = web.Application(client_max_size=256 * 1024**2)
+    app.router.add_post("/embed", embed)
+    app.router.add_post("/tokenize", tokenize)
+    return app
+
+
+def sparse_app(options: StandInOptions) -> web.Application:
+    async def embed(request: web.Request) -> web.Response:
+        texts = _inputs(await request.json())
+        await asyncio.sleep(options.embed_latency * len(texts))
+        return web.json_response(
+            {"vectors": [fake_sparse_vector(text) for text in texts]}
+        )
+
+    app = web.Application(client_max_size=256 * 1024**2)
+    app.router.add_post("/embed", embed)
+    return app
+
+
+def llm_app(options: StandInOptions) -> web.Application:
+    def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> bytes:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(data)}\n\n".encode()
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "fake")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        tokens = [f"Wort{i} " for i in range(options.answer_tokens)]
+        answer = "".join(tokens)
+
+        await asyncio.sleep(options.llm_ttft)
+
+        if not body.get("stream"):
+            await asyncio.sleep(options.llm_token_latency * len(tokens))
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": answer},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 0,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": len(tokens),
+                    },
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, token in enumerate(tokens):
+            delta = {"content": token}
+            if i == 0:
+                delta["role"] = "assistant"
+            await response.write(chunk(completion_id, model, delta))
+            await asyncio.sleep(options.llm_token_latency)
+        await response.write(chunk(completion_id, model, {}, finish_reason="stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def models(request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "fake"}]})
+
+    app = web.Application(client_max_size=256 * 1024**2)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/v1/models", models)
+    return app
+
+
+async def _serve(options: StandInOptions, ready) -> None:
+    ports = {}
+    for name, app in (
+        ("dense", dense_app(options)),
+        ("sparse", sparse_app(options)),
+        ("llm", llm_app(options)),
+    ):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        ports[name] = runner.addresses[0][1]
+
+    ready.put(ports)
+    await asyncio.Event().wait()
+
+
+def _run(options: dict, ready) -> None:
+    asyncio.run(_serve(StandInOptions(**options), ready))
+
+
+def start_stand_ins(options: StandInOptions) -> tuple[multiprocessing.Process, dict]:
+    """Start the stand-in servers in a child process and return it with their ports."""
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(target=_run, args=(asdict(options), ready), daemon=True)
+    process.start()
+    return process, ready.get(timeout=30)
+
+
+def configure_environment(ports: dict, options: StandInOptions) -> None:
+    """Point the settings of src to the stand-ins. Must run before src is imported."""
+    os.environ.update(
+        {
+            "DENSE__URL": "http://127.0.0.1",
+            "DENSE__PORT": str(ports["dense"]),
+            "SPARSE__URL": "http://127.0.0.1",
+            "SPARSE__PORT": str(ports["sparse"]),
+            "LLM__URL": f"http://127.0.0.1:{ports['llm']}/v1",
+            "LLM__NAME": "fake",
+            "DENSE_EMBEDDING_DIMENSION": str(options.dimension),
+            "QDRANT_KEY": "benchmark",
+            # In-memory Qdrant in the process under test
+            "BENCHMARK_LOCAL_QDRANT": "true",
+            # Spans are only kept in memory for the per-stage breakdown
+            "TRACE_EXPORTER": "none",
+            "TRACE_BUFFER_SIZE": "1000000",
+        }
+    )
@@ -0,0 +1,201 @@
+"""
+Recall / latency / memory benchmark for the Qdrant storage profiles.
+
+Creates one scratch collection per profile on the configured Qdrant instance,
+fills it with random unit vectors, and compares the profile's search params
+against an exact (brute force) search.
+
+Memory is measured as the growth of the resident memory of Qdrant while the collection
+is filled and indexed: of the server from its /metrics endpoint, of this process if
+BENCHMARK_LOCAL_QDRANT is set. The estimate of the dense vectors is reported next to it.
+
+Usage:
+    python -m benchmarks.storage_profiles --points 50000 --queries 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+
+import httpx
+import numpy as np
+from qdrant_client import models
+
+from src.clients.async_vector_client import AsyncVectorContextManager
+from src.clients.utils.storage_profiles import STORAGE_PROFILES, StorageProfile
+from src.settings import Settings
+
+
+_settings = Settings()
+
+
+def _random_unit_vectors(amount: int, dimension: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((amount, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _estimated_ram_bytes(profile: StorageProfile, points: int, dimension: int) -> int:
+    """Rough RAM footprint of the dense vectors (HNSW graph and payload excluded)."""
+    if isinstance(profile.quantization_config, models.BinaryQuantization):
+        return points * dimension // 8
+    if isinstance(profile.quantization_config, models.ScalarQuantization):
+        return points * dimension
+    return 0 if profile.dense_on_disk else points * dimension * 4
+
+
+async def _resident_bytes() -> Optional[int]:
+    """Resident memory of Qdrant, None if it cannot be read."""
+    if _settings.benchmark_local_qdrant:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return None
+
+    headers = {}
+    if _settings.qdrant_key is not None:
+        headers["api-key"] = _settings.qdrant_key.get_secret_value()
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(
+                f"{_settings.qdrant.url}:{_settings.qdrant.port}/metrics",
+                headers=headers,
+            )
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Error reading the Qdrant metrics: {e}")
+        return None
+
+    for line in response.text.splitlines():
+        if line.startswith("memory_resident_bytes"):
+            return int(float(line.split()[-1]))
+    return None
+
+
+def _megabytes(amount: Optional[int]) -> Optional[float]:
+    return None if amount is None else round(amount / 1024**2, 1)
+
+
+async def _wait_until_indexed(client, collection_name: str, timeout: float = 600):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        info = await client.get_collection(collection_name=collection_name)
+        if info.status == models.CollectionStatus.GREEN:
+            return
+        await asyncio.sleep(1)
+
+
+async def benchmark_profile(
+    profile: StorageProfile,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    top_k: int,
+    batch_size: int,
+) -> dict:
+    collection_name = f"bench_{profile.name}_{uuid.uuid4().hex[:8]}"
+    dimension = vectors.shape[1]
+
+    resident_before = await _resident_bytes()
+
+    async with AsyncVectorContextManager() as client:
+        await client.create_collection(
+            collection_name=collection_name,
+            vectors_config={"dense": profile.vector_params(dimension)},
+            sparse_vectors_config={"sparse": profile.sparse_vector_params()},
+            hnsw_config=profile.hnsw_config,
+            quantization_config=profile.quantization_config,
+        )
+
+        try:
+            for i in range(0, len(vectors), batch_size):
+                batch = vectors[i : i + batch_size]
+                await client.upsert(
+                    collection_name=collection_name,
+                    points=[
+                        models.PointStruct(id=i + j, vector={"dense": vector.tolist()})
+                        for j, vector in enumerate(batch)
+                    ],
+                )
+            await _wait_until_indexed(client, collection_name)
+            resident_after = await _resident_bytes()
+
+            # The timed pass runs first, so that the exact search does not warm the
+            # caches for it
+            latencies = []
+            found = []
+            for query in queries:
+                start = time.perf_counter()
+                approx = await client.query_points(
+                    collection_name=collection_name,
+                    query=query.tolist(),
+                    using="dense",
+                    limit=top_k,
+                    search_params=profile.search_params,
+                )
+                latencies.append(time.perf_counter() - start)
+                found.append({point.id for point in approx.points})
+
+            recalls = []
+            for query, approx_ids in zip(queries, found):
+                exact = await client.query_points(
+                    collection_name=collection_name,
+                    query=query.tolist(),
+                    using="dense",
+                    limit=top_k,
+                    search_params=models.SearchParams(exact=True),
+                )
+                expected = {point.id for point in exact.points}
+                recalls.append(len(expected & approx_ids) / max(len(expected), 1))
+
+        finally:
+            await client.delete_collection(collection_name=collection_name)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "profile": profile.name,
+        "points": len(vectors),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "latency_p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "ram_growth_mb": _megabytes(
+            resident_after - resident_before
+            if resident_before is not None and resident_after is not None
+            else None
+        ),
+        "dense_ram_mb_estimated": _megabytes(
+            _estimated_ram_bytes(profile, len(vectors), dimension)
+        ),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--profiles", nargs="*", default=list(STORAGE_PROFILES.keys()))
+    args = parser.parse_args()
+
+    dimension = int(_settings.dense_embedding_dimension)
+    vectors = _random_unit_vectors(args.points, dimension, seed=1)
+    queries = _random_unit_vectors(args.queries, dimension, seed=2)
+
+    results = []
+    for name in args.profiles:
+        result = await benchmark_profile(
+            STORAGE_PROFILES[name], vectors, queries, args.top_k, args.batch_size
+        )
+        print(json.dumps(result))
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
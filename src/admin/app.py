@@ -13,6 +13,8 @@ from pathlib import Path
 
 from src.admin.database import Database
 from src.admin.routers import auth, dashboard, files, collections, users
+from src.clients.async_vector_client import AsyncVectorContextManager
+from src import metrics
 
 # Create a logger for this module
 logger = logging.getLogger(__name__)
@@ -22,9 +24,12 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Lifespan context manager for database initialization"""
     # Startup
+    AsyncVectorContextManager.require_server_backend("admin")
     db = Database()
     await db.ensure_admin_user()
     yield
+    # Shutdown
+    await AsyncVectorContextManager.close_local_client()
 
 
 app = FastAPI(title="Admin Frontend", lifespan=lifespan)
@@ -38,6 +43,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.install(app)
+
 # Configure static files with absolute path
 static_dir = Path(__file__).parent / "static"
 app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
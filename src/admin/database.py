@@ -27,6 +27,7 @@ class Database:
         self.db = self.client["admin_panel"]
         self.users_collection = self.db["users"]
         self.collections_collection = self.db["collections"]
+        self.metadata_collection = self.db["metadata"]
         self._initialized = True
 
     async def ensure_admin_user(self) -> None:
@@ -59,6 +60,17 @@ class Database:
             await self.create_user(admin_data)
             logger.info(f"Default admin user '{admin_username}' created successfully")
 
+    async def bump_collections_version(self) -> None:
+        """
+        Increment the version of the collection and user documents.
+
+        The widget caches the collections for its bootstrap endpoints and reloads them
+        when this version changed, so every write to collections or users bumps it.
+        """
+        await self.metadata_collection.update_one(
+            {"_id": "collections"}, {"$inc": {"version": 1}}, upsert=True
+        )
+
     # User-related methods
     async def get_user(self, username: str) -> Optional[Dict]:
         """Get a user by username"""
@@ -89,6 +101,7 @@ class Database:
     async def create_user(self, user_data: Dict) -> str:
         """Create a new user"""
         result = await self.users_collection.insert_one(user_data)
+        await self.bump_collections_version()
         return str(result.inserted_id)
 
     async def update_user(self, user_id: str, update_data: Dict) -> bool:
@@ -96,11 +109,13 @@ class Database:
         result = await self.users_collection.update_one(
             {"_id": ObjectId(user_id)}, {"$set": update_data}
         )
+        await self.bump_collections_version()
         return result.modified_count > 0
 
     async def delete_user(self, user_id: str) -> bool:
         """Delete a user by ID"""
         result = await self.users_collection.delete_one({"_id": ObjectId(user_id)})
+        await self.bump_collections_version()
         return result.deleted_count > 0
 
     async def delete_users_by_collection(self, collection_id: ObjectId) -> int:
@@ -108,6 +123,7 @@ class Database:
         result = await self.users_collection.delete_many(
             {"collection_id": collection_id}
         )
+        await self.bump_collections_version()
         return result.deleted_count
 
     async def get_collection(self, collection_id: str) -> Optional[Dict]:
@@ -128,6 +144,7 @@ class Database:
     async def create_collection(self, collection_data: Dict) -> str:
         """Create a new collection"""
         result = await self.collections_collection.insert_one(collection_data)
+        await self.bump_collections_version()
         return str(result.inserted_id)
 
     async def update_collection(self, collection_id: str, update_data: Dict) -> bool:
@@ -135,6 +152,7 @@ class Database:
         result = await self.collections_collection.update_one(
             {"_id": ObjectId(collection_id)}, {"$set": update_data}
         )
+        await self.bump_collections_version()
         return result.matched_count > 0
 
     async def delete_collection(self, collection_id: str) -> bool:
@@ -142,6 +160,7 @@ class Database:
         result = await self.collections_collection.delete_one(
             {"_id": ObjectId(collection_id)}
         )
+        await self.bump_collections_version()
         return result.deleted_count > 0
 
     async def get_all_collections(self) -> List[Dict]:
@@ -17,6 +17,8 @@ class Collection:
     password_required: bool = False
     password: Optional[str] = None
     collection_name: Optional[str] = None  # Name used in vector DB
+    # Qdrant storage profile, see storage_profiles.py
+    storage_profile: str = "small-fast"
     created_at: datetime = field(default_factory=datetime.utcnow)
     _id: Optional[str] = None  # MongoDB ObjectId as string
 
@@ -37,6 +39,7 @@ class Collection:
             "password_required": self.password_required,
             "password": self.password,
             "collection_name": self.collection_name,
+            "storage_profile": self.storage_profile,
             "created_at": self.created_at,
         }
 
@@ -55,6 +58,7 @@ class Collection:
             "owner_id": str(self.owner_id),
             "password_required": self.password_required,
             "collection_name": self.collection_name,
+            "storage_profile": self.storage_profile,
             "created_at": self.created_at.isoformat()
             if isinstance(self.created_at, datetime)
             else self.created_at,
@@ -72,6 +76,7 @@ class Collection:
             else str(data.get("user_id", "")),
             password_required=data.get("password_required", False),
             password=data.get("password", None),
+            storage_profile=data.get("storage_profile", "small-fast"),
         )
 
         # Override default values if they exist in the data
@@ -4,6 +4,10 @@ from pydantic import BaseModel
 from src.admin.database import Database
 from src.admin.services.auth_service import AuthService
 from src.admin.services.collection_service import CollectionService
+from src.clients.utils.storage_profiles import (
+    DEFAULT_STORAGE_PROFILE,
+    STORAGE_PROFILES,
+)
 import logging
 
 router = APIRouter(prefix="/admin/collections", tags=["collections"])
@@ -18,6 +22,7 @@ class CollectionCreate(BaseModel):
     owner_id: Optional[str] = None
     password_required: bool = False
     collection_password: Optional[str] = None
+    storage_profile: str = DEFAULT_STORAGE_PROFILE
 
 
 class CollectionUpdate(BaseModel):
@@ -47,6 +52,19 @@ async def get_collections(user=Depends(AuthService.verify_user)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/storage-profiles")
+async def get_storage_profiles(user=Depends(AuthService.verify_user)):
+    """Get the available Qdrant storage profiles"""
+    return [
+        {
+            "name": profile.name,
+            "description": profile.description,
+            "default": profile.name == DEFAULT_STORAGE_PROFILE,
+        }
+        for profile in STORAGE_PROFILES.values()
+    ]
+
+
 @router.post("/")
 async def add_collection(
     request: Request,
@@ -55,6 +73,7 @@ async def add_collection(
     owner_id: Optional[str] = Form(None),
     password_required: Optional[bool] = Form(False),
     collection_password: Optional[str] = Form(None),
+    storage_profile: Optional[str] = Form(DEFAULT_STORAGE_PROFILE),
 ):
     """Add a new collection"""
     try:
@@ -88,6 +107,14 @@ async def add_collection(
         ):
             raise HTTPException(status_code=400, detail="Please use a different key")
 
+        # Check if the storage profile exists
+        storage_profile = storage_profile or DEFAULT_STORAGE_PROFILE
+        if storage_profile not in STORAGE_PROFILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown storage profile '{storage_profile}'",
+            )
+
         # Determine owner ID
         final_owner_id = None
         if user.role == "admin" and owner_id:
@@ -96,7 +123,7 @@ async def add_collection(
             final_owner_id = user.id
 
         logger.info(
-            f"Creating collection with data_source_name: {data_source_name}, welcome_message: {welcome_message}, owner_id: {final_owner_id}, password_required: {password_required}, collection_password: {collection_password}"
+            f"Creating collection with data_source_name: {data_source_name}, welcome_message: {welcome_message}, owner_id: {final_owner_id}, password_required: {password_required}, collection_password: {collection_password}, storage_profile: {storage_profile}"
         )
 
         # Create the collection
@@ -106,6 +133,7 @@ async def add_collection(
             final_owner_id,
             password_required,
             collection_password,
+            storage_profile,
         )
 
         if not collection_id:
@@ -1,5 +1,9 @@
 from src.admin.database import Database
 from src.clients.async_vector_client import AsyncVectorClient
+from src.clients.utils.storage_profiles import (
+    DEFAULT_STORAGE_PROFILE,
+    get_storage_profile,
+)
 from src.admin.models.collection import Collection
 from src.admin.models.user import User
 from bson import ObjectId
@@ -58,9 +62,13 @@ class CollectionService:
         owner_id: str,
         password_required=False,
         collection_password=None,
+        storage_profile: str = DEFAULT_STORAGE_PROFILE,
     ):
         """Create a new collection"""
 
+        # Validate the storage profile before anything is written
+        profile = get_storage_profile(storage_profile)
+
         # Check if password is required
         password = None
         if password_required:
@@ -78,6 +86,7 @@ class CollectionService:
             owner_id=owner_id,
             password_required=password_required,
             password=password,
+            storage_profile=profile.name,
         )
 
         collection_id = await self.db.create_collection(collection.to_dict())
@@ -89,9 +98,13 @@ class CollectionService:
         collection.collection_name = collection_name
         await self.db.update_collection(collection_id, collection.to_dict())
 
-        logger.info(f"Creating Qdrant collection: {collection_name}")
+        logger.info(
+            f"Creating Qdrant collection: {collection_name} with storage profile {profile.name}"
+        )
         # Create Qdrant collection
-        await self.vector_client.create_collection(collection_name)
+        await self.vector_client.create_collection(
+            collection_name, storage_profile=profile.name
+        )
 
         return str(collection_id)
 
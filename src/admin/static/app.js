@@ -835,6 +835,8 @@ function openModal() {
         }
     }
     
+    loadStorageProfiles();
+
     // Focus on the first input field
     setTimeout(() => {
         const firstInput = document.getElementById('bot-name');
@@ -844,6 +846,32 @@ function openModal() {
     }, 100);
 }
 
+// Fill the storage profile dropdown of the add collection modal
+function loadStorageProfiles() {
+    const profileSelect = document.getElementById('storage-profile');
+    if (!profileSelect || profileSelect.dataset.loaded === 'true') return;
+
+    fetch('/admin/collections/storage-profiles')
+        .then(response => {
+            if (!response.ok) throw new Error(`Network response was not ok: ${response.status}`);
+            return response.json();
+        })
+        .then(profiles => {
+            profileSelect.innerHTML = '';
+            profiles.forEach(profile => {
+                const option = document.createElement('option');
+                option.value = profile.name;
+                option.textContent = `${profile.name} - ${profile.description}`;
+                option.selected = profile.default;
+                profileSelect.appendChild(option);
+            });
+            profileSelect.dataset.loaded = 'true';
+        })
+        .catch(error => {
+            console.error('Error loading storage profiles:', error);
+        });
+}
+
 // Open the add user modal
 function openUserModal() {
     const modal = document.getElementById('add-user-modal');
@@ -1240,6 +1268,7 @@ function loadBotSettings(collectionId) {
             // Update collection ID display
             document.getElementById('collection-id-display').textContent = collection.collection_name || collectionId;
             document.getElementById('copy-collection-id').disabled = false;
+            document.getElementById('storage-profile-display').textContent = collection.storage_profile || 'small-fast';
             
             // Handle password protection
             const passwordRequiredCheckbox = document.getElementById('password-required-config');
@@ -1802,6 +1831,7 @@ function clearAndDisableEverything() {
     
     // Clear and disable collection ID display
     document.getElementById('collection-id-display').textContent = 'Please select a data source first';
+    document.getElementById('storage-profile-display').textContent = '-';
     document.getElementById('copy-collection-id').disabled = true;
 
     // Disable URL scraper card and inputs
@@ -2459,6 +2489,7 @@ function submitFacultyForm(event) {
     const formData = new FormData();
     formData.append('data_source_name', collectionName);
     formData.append('welcome_message', welcomeMessage);
+    formData.append('storage_profile', document.getElementById('storage-profile').value);
     
     // Handle checkbox - backend expects "on" or nothing
     if (passwordRequired) {
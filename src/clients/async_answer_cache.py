@@ -0,0 +1,248 @@
+from qdrant_client import models
+from qdrant_client.models import PointStruct
+from dataclasses import dataclass
+import time
+import uuid
+import typing as tt
+
+from src.clients.async_vector_client import (
+    ANSWER_CACHE_COLLECTION,
+    ANSWER_CACHE_VERSIONS,
+    AsyncVectorContextManager,
+    answer_cache_filter,
+    answer_cache_version_id,
+)
+from src.settings import get_settings
+from src.metrics import QDRANT_SECONDS, timed
+from src.tracing import traced
+
+
+@dataclass
+class AnswerCacheKey:
+    """The question embedding and the ingest version of its collection."""
+
+    embedding: list[float]
+    # Read before the answer is generated
+    version: int
+
+
+class AsyncAnswerCache:
+    """
+    Semantic cache of generated answers, stored in a dedicated Qdrant collection.
+
+    Every entry belongs to one knowledge collection (payload "collection_name") and is
+    keyed by the dense embedding of the question. A lookup is a hit when the most similar
+    cached question of the same collection has a cosine similarity above the threshold.
+
+    Entries are stamped with the ingest version of their collection as read before the
+    answer was generated. AsyncVectorClient bumps the version whenever the points of the
+    collection change, entries of other versions are neither served nor stored. Entries
+    expire after answer_cache_ttl_hours and every collection keeps at most
+    answer_cache_max_entries, the oldest are dropped first.
+    """
+
+    # Whether the cache collection is known to exist (checked once per process)
+    _collection_ready: bool = False
+    # Whether the version collection is known to exist, it is created on the first ingest
+    _versions_ready: bool = False
+
+    # Counters of this process, exposed through stats()
+    _hits: int = 0
+    _misses: int = 0
+    _seconds_saved: float = 0.0
+
+    def __init__(self):
+        self._settings = get_settings()
+
+    async def _ensure_collection(self, client) -> None:
+        if AsyncAnswerCache._collection_ready:
+            return
+
+        if not await client.collection_exists(collection_name=ANSWER_CACHE_COLLECTION):
+            await client.create_collection(
+                collection_name=ANSWER_CACHE_COLLECTION,
+                vectors_config=models.VectorParams(
+                    size=int(self._settings.dense_embedding_dimension),
+                    distance=models.Distance.COSINE,
+                ),
+            )
+            await client.create_payload_index(
+                collection_name=ANSWER_CACHE_COLLECTION,
+                field_name="collection_name",
+                field_schema=models.PayloadSchemaType.KEYWORD,
+            )
+            print(f"created collection {ANSWER_CACHE_COLLECTION}")
+
+        # Also for caches created before entries had a version
+        await client.create_payload_index(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            field_name="ingest_version",
+            field_schema=models.PayloadSchemaType.INTEGER,
+        )
+        await client.create_payload_index(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            field_name="created_at",
+            field_schema=models.PayloadSchemaType.FLOAT,
+        )
+
+        AsyncAnswerCache._collection_ready = True
+
+    def _expiry(self) -> float:
+        return time.time() - self._settings.answer_cache_ttl_hours * 3600
+
+    def _valid_filter(self, collection_name: str, version: int) -> models.Filter:
+        """Filter selecting the servable entries of a collection."""
+        return models.Filter(
+            must=[
+                *answer_cache_filter(collection_name).must,
+                models.FieldCondition(
+                    key="ingest_version", match=models.MatchValue(value=version)
+                ),
+                models.FieldCondition(
+                    key="created_at", range=models.Range(gte=self._expiry())
+                ),
+            ]
+        )
+
+    async def _read_version(self, client, collection_name: str) -> int:
+        if not AsyncAnswerCache._versions_ready:
+            if not await client.collection_exists(
+                collection_name=ANSWER_CACHE_VERSIONS
+            ):
+                # Nothing was ingested since the cache exists
+                return 0
+            AsyncAnswerCache._versions_ready = True
+
+        records = await client.retrieve(
+            collection_name=ANSWER_CACHE_VERSIONS,
+            ids=[answer_cache_version_id(collection_name)],
+            with_payload=True,
+        )
+        return records[0].payload["version"] if records else 0
+
+    async def current_version(self, collection_name: str) -> tt.Optional[int]:
+        """The ingest version of a collection, None if it cannot be read."""
+        try:
+            async with AsyncVectorContextManager() as client:
+                return await self._read_version(client, collection_name)
+        except Exception as e:
+            print(f"Error reading the answer cache version: {str(e)}")
+            return None
+
+    async def _enforce_bounds(self, client, collection_name: str, version: int):
+        """Drop expired and stale entries and the oldest beyond the maximum."""
+        await client.delete(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
+                    must=answer_cache_filter(collection_name).must,
+                    must_not=[self._valid_filter(collection_name, version)],
+                )
+            ),
+        )
+
+        count = await client.count(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            count_filter=answer_cache_filter(collection_name),
+            exact=True,
+        )
+        excess = count.count - self._settings.answer_cache_max_entries
+        if excess <= 0:
+            return
+
+        oldest, _ = await client.scroll(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            scroll_filter=answer_cache_filter(collection_name),
+            order_by=models.OrderBy(key="created_at", direction=models.Direction.ASC),
+            limit=excess,
+            with_payload=False,
+        )
+        await client.delete(
+            collection_name=ANSWER_CACHE_COLLECTION,
+            points_selector=models.PointIdsList(points=[point.id for point in oldest]),
+        )
+
+    @traced("answer_cache.lookup", kind="client")
+    @timed(QDRANT_SECONDS, operation="answer_cache_lookup")
+    async def lookup(
+        self, collection_name: str, key: AnswerCacheKey
+    ) -> tt.Optional[str]:
+        """Return the cached answer for a similar question or None on a miss."""
+        try:
+            async with AsyncVectorContextManager() as client:
+                await self._ensure_collection(client)
+
+                response = await client.query_points(
+                    collection_name=ANSWER_CACHE_COLLECTION,
+                    query=key.embedding,
+                    query_filter=self._valid_filter(collection_name, key.version),
+                    score_threshold=self._settings.answer_cache_threshold,
+                    with_payload=True,
+                    limit=1,
+                )
+
+        except Exception as e:
+            print(f"Error looking up the answer cache: {str(e)}")
+            return None
+
+        if not response.points:
+            AsyncAnswerCache._misses += 1
+            return None
+
+        payload = response.points[0].payload
+        AsyncAnswerCache._hits += 1
+        AsyncAnswerCache._seconds_saved += payload.get("generation_seconds", 0.0)
+
+        return payload["answer"]
+
+    @traced("answer_cache.store", kind="client")
+    @timed(QDRANT_SECONDS, operation="answer_cache_store")
+    async def store(
+        self,
+        collection_name: str,
+        question: str,
+        key: AnswerCacheKey,
+        answer: str,
+        generation_seconds: float,
+    ) -> None:
+        """Cache the answer of a question together with the time it took to generate it."""
+        try:
+            async with AsyncVectorContextManager() as client:
+                await self._ensure_collection(client)
+
+                # The collection changed while the answer was generated
+                if await self._read_version(client, collection_name) != key.version:
+                    print(f"Answer of {collection_name} not cached, collection changed")
+                    return
+
+                await client.upsert(
+                    collection_name=ANSWER_CACHE_COLLECTION,
+                    points=[
+                        PointStruct(
+                            id=str(uuid.uuid4()),
+                            vector=key.embedding,
+                            payload={
+                                "collection_name": collection_name,
+                                "question": question,
+                                "answer": answer,
+                                "generation_seconds": generation_seconds,
+                                "ingest_version": key.version,
+                                "created_at": time.time(),
+                            },
+                        )
+                    ],
+                )
+                await self._enforce_bounds(client, collection_name, key.version)
+
+        except Exception as e:
+            print(f"Error storing the answer in the cache: {str(e)}")
+
+    @classmethod
+    def stats(cls) -> dict:
+        lookups = cls._hits + cls._misses
+        return {
+            "hits": cls._hits,
+            "misses": cls._misses,
+            "hit_rate": cls._hits / lookups if lookups else 0.0,
+            "llm_seconds_saved": round(cls._seconds_saved, 3),
+        }
@@ -1,12 +1,18 @@
-from pymongo import AsyncMongoClient
+from datetime import datetime, timezone
+from typing import Optional
+from bson import Binary
+from pymongo import ASCENDING, AsyncMongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import msgpack
 
-from src.settings import Settings
+from src.settings import get_settings
+from src.metrics import MONGO_SECONDS, timed
+from src.tracing import traced
 
 
 class AsyncDatabaseClient:
     _client = None
-    _settings = Settings()
+    _settings = get_settings()
 
     @classmethod
     async def get_client(cls):
@@ -29,12 +35,29 @@ class AsyncDatabaseClient:
         database = client[database_name]
         return database[collection_name]
 
+    @traced("mongo.find_one", kind="client")
+    @timed(MONGO_SECONDS, operation="find_one")
     async def find_one(
-        self, database_name: str, collection_name: str, filter: dict, sort: list
+        self,
+        database_name: str,
+        collection_name: str,
+        filter: dict,
+        sort: list,
+        projection: Optional[dict] = None,
     ):
         """Find one document in the collection."""
         collection = await self.get_collection(database_name, collection_name)
-        return await collection.find_one(filter, sort=sort)
+        return await collection.find_one(filter, projection, sort=sort)
+
+    @traced("mongo.get_collections_version", kind="client")
+    @timed(MONGO_SECONDS, operation="get_collections_version")
+    async def get_collections_version(self) -> int:
+        """Version of the collections and users, bumped by the admin service."""
+        metadata = await self.get_collection(
+            database_name="admin_panel", collection_name="metadata"
+        )
+        document = await metadata.find_one({"_id": "collections"})
+        return document["version"] if document else 0
 
     def _unpack_ext(self, code, data):
         """Custom unpacking for msgpack ExtType."""
@@ -47,36 +70,249 @@ class AsyncDatabaseClient:
                 return data
         return msgpack.ExtType(code, data)
 
-    async def get_latest_checkpoint(self, thread_id: str) -> list:
-        """Get the latest checkpoint from the collection."""
-        # Find the latest checkpoint
+    @staticmethod
+    def _message_contents(messages: list) -> list[str]:
+        """Extract the text of serialized LangChain messages."""
+        contents = []
+        for message in messages:
+            if (
+                isinstance(message, list)
+                and len(message) > 2
+                and isinstance(message[2], dict)
+            ):
+                content = message[2].get(b"content", b"").decode()
+                contents.append(content)
+
+        return contents
+
+    def _unpack_messages_channel(self, checkpoint: bytes) -> list:
+        """
+        Decode only channel_values.messages of a msgpack checkpoint.
+
+        Every other channel (retrieved context, attachment data, ...) is skipped without
+        being turned into Python objects.
+        """
+        unpacker = msgpack.Unpacker(
+            raw=True, ext_hook=self._unpack_ext, max_buffer_size=len(checkpoint) + 1
+        )
+        unpacker.feed(checkpoint)
+
+        for _ in range(unpacker.read_map_header()):
+            if unpacker.unpack() != b"channel_values":
+                unpacker.skip()
+                continue
+
+            for _ in range(unpacker.read_map_header()):
+                if unpacker.unpack() == b"messages":
+                    return unpacker.unpack()
+                unpacker.skip()
+
+        return []
+
+    @traced("mongo.get_checkpoint_messages", kind="client")
+    @timed(MONGO_SECONDS, operation="get_checkpoint_messages")
+    async def get_checkpoint_messages(self, thread_id: str) -> list[str]:
+        """Get the message texts of the latest checkpoint without decoding the other channels."""
         latest_checkpoint = await self.find_one(
             database_name="checkpointing_db",
             collection_name="checkpoints_aio",
             filter={"thread_id": thread_id},
             sort=[("_id", -1)],
+            projection={"checkpoint": 1},
         )
 
         if not latest_checkpoint or "checkpoint" not in latest_checkpoint:
             return []
 
-        # Unpack the msgpack data from the latest checkpoint
-        checkpoint_unpacked = msgpack.unpackb(
-            latest_checkpoint["checkpoint"], raw=True, ext_hook=self._unpack_ext
-        )[b"channel_values"][b"messages"]
+        return self._message_contents(
+            self._unpack_messages_channel(latest_checkpoint["checkpoint"])
+        )
 
-        messages = []
-        for message in checkpoint_unpacked:
-            if (
-                isinstance(message, list)
-                and len(message) > 2
-                and isinstance(message[2], dict)
-            ):
-                content = message[2].get(b"content", b"").decode()
-                messages.append(content)
+    async def ensure_indexes(self):
+        """Create the indexes the widget queries rely on."""
+        message_log = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_messages"
+        )
+        await message_log.create_index(
+            [("thread_id", ASCENDING), ("index", ASCENDING)], unique=True
+        )
+
+        attachments = await self.get_collection(
+            database_name="checkpointing_db", collection_name="attachments"
+        )
+        await attachments.create_index(
+            "last_used_at",
+            expireAfterSeconds=self._settings.attachment_ttl_hours * 3600,
+        )
 
-        return messages
+    @traced("mongo.put_attachment", kind="client")
+    @timed(MONGO_SECONDS, operation="put_attachment")
+    async def put_attachment(self, digest: str, data: bytes, content_type: str) -> str:
+        """
+        Store an uploaded file once per content hash.
+
+        Returns:
+            str: The reference ("sha256:<digest>") that is kept in the graph state instead of the file.
+        """
+        attachments = await self.get_collection(
+            database_name="checkpointing_db", collection_name="attachments"
+        )
+        await attachments.update_one(
+            {"_id": digest},
+            {
+                "$set": {"last_used_at": datetime.now(timezone.utc)},
+                "$setOnInsert": {
+                    "data": Binary(data),
+                    "content_type": content_type,
+                    "size": len(data),
+                },
+            },
+            upsert=True,
+        )
 
+        return f"sha256:{digest}"
+
+    @traced("mongo.get_attachment", kind="client")
+    @timed(MONGO_SECONDS, operation="get_attachment")
+    async def get_attachment(self, reference: str) -> Optional[tuple[bytes, str]]:
+        """
+        Get the bytes and the content type of a stored file by its reference.
+
+        Reading the file counts as a use, so files of active threads outlive the TTL.
+        """
+        attachments = await self.get_collection(
+            database_name="checkpointing_db", collection_name="attachments"
+        )
+        attachment = await attachments.find_one_and_update(
+            {"_id": reference.removeprefix("sha256:")},
+            {"$set": {"last_used_at": datetime.now(timezone.utc)}},
+            projection={"data": 1, "content_type": 1},
+        )
+
+        if attachment is None:
+            return None
+
+        return bytes(attachment["data"]), attachment["content_type"]
+
+    @traced("mongo.append_messages", kind="client")
+    @timed(MONGO_SECONDS, operation="append_messages")
+    async def append_messages(self, thread_id: str, messages: list[str]):
+        """
+        Append messages to the compact per-thread message log.
+
+        The indexes are reserved atomically with a counter per thread, so concurrent
+        appends to the same thread get disjoint ranges. The first append of a thread
+        backfills the log from the latest checkpoint, which already contains the new
+        messages because the graph has written it before.
+        """
+        message_log = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_messages"
+        )
+        counters = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_message_counters"
+        )
+
+        async def reserve(amount: int) -> Optional[int]:
+            counter = await counters.find_one_and_update(
+                {"_id": thread_id},
+                {"$inc": {"next": amount}},
+                return_document=ReturnDocument.AFTER,
+            )
+            return None if counter is None else counter["next"] - amount
+
+        start = await reserve(len(messages))
+        if start is None:
+            # First append of the thread, or of a log from before the counters existed
+            last_message = await message_log.find_one(
+                {"thread_id": thread_id}, sort=[("index", -1)], projection={"index": 1}
+            )
+            if last_message is None:
+                backfill = await self.get_checkpoint_messages(thread_id) or messages
+                start = 0
+            else:
+                backfill = messages
+                start = last_message["index"] + 1
+
+            try:
+                await counters.insert_one(
+                    {"_id": thread_id, "next": start + len(backfill)}
+                )
+                messages = backfill
+            except DuplicateKeyError:
+                # Another append created the counter in the meantime
+                start = await reserve(len(messages))
+
+        if not messages:
+            return
+
+        try:
+            await message_log.insert_many(
+                [
+                    {"thread_id": thread_id, "index": start + i, "content": content}
+                    for i, content in enumerate(messages)
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            print(f"Error appending messages of thread {thread_id}: {e}")
+
+    @traced("mongo.get_messages", kind="client")
+    @timed(MONGO_SECONDS, operation="get_messages")
+    async def get_messages(
+        self,
+        thread_id: str,
+        after: Optional[int] = None,
+        last: Optional[int] = None,
+    ) -> tuple[int, list[str]]:
+        """
+        Page through the messages of a thread.
+
+        Args:
+            thread_id: The thread to read.
+            after: Only return messages with an index greater than this.
+            last: Only return the last K (matching) messages.
+
+        Returns:
+            tuple[int, list[str]]: Index of the first returned message and the message texts.
+        """
+        message_log = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_messages"
+        )
+
+        query = {"thread_id": thread_id}
+        if after is not None:
+            query["index"] = {"$gt": after}
+
+        projection = {"_id": 0, "index": 1, "content": 1}
+        if last is not None:
+            cursor = message_log.find(query, projection).sort("index", -1).limit(last)
+            documents = list(reversed(await cursor.to_list(length=last)))
+        else:
+            cursor = message_log.find(query, projection).sort("index", 1)
+            documents = await cursor.to_list(length=None)
+
+        if documents:
+            return documents[0]["index"], [doc["content"] for doc in documents]
+
+        if await message_log.find_one({"thread_id": thread_id}, {"_id": 1}):
+            # The log exists, there are just no messages in the requested range
+            return (after + 1 if after is not None else 0), []
+
+        # Thread from before the message log existed: backfill it once
+        messages = await self.get_checkpoint_messages(thread_id)
+        if messages:
+            await self.append_messages(thread_id, messages)
+
+        start = after + 1 if after is not None else 0
+        messages = messages[start:]
+        if last is not None and len(messages) > last:
+            start += len(messages) - last
+            messages = messages[-last:]
+
+        return start, messages
+
+    @traced("mongo.delete", kind="client")
+    @timed(MONGO_SECONDS, operation="delete")
     async def delete(self, thread_id: str):
         """Delete all checkpoints for a given thread_id."""
         checkpointing_writes_collection = await self.get_collection(
@@ -85,6 +321,14 @@ class AsyncDatabaseClient:
         checkpointing_collection = await self.get_collection(
             database_name="checkpointing_db", collection_name="checkpoints_aio"
         )
+        message_log = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_messages"
+        )
+        counters = await self.get_collection(
+            database_name="checkpointing_db", collection_name="thread_message_counters"
+        )
 
         await checkpointing_writes_collection.delete_many({"thread_id": thread_id})
         await checkpointing_collection.delete_many({"thread_id": thread_id})
+        await message_log.delete_many({"thread_id": thread_id})
+        await counters.delete_one({"_id": thread_id})
@@ -1,12 +1,13 @@
 import aiohttp
 from typing import Union
 
-from src.settings import Settings
+from src.settings import get_settings
+from src.tracing import inject, set_attribute, traced
 
 
 class AsyncDenseClient:
     def __init__(self):
-        self._settings = Settings()
+        self._settings = get_settings()
         self.embed_endpoint: str = (
             f"{self._settings.dense.url}:{self._settings.dense.port}/embed"
         )
@@ -14,13 +15,15 @@ class AsyncDenseClient:
             f"{self._settings.dense.url}:{self._settings.dense.port}/tokenize"
         )
 
+    @traced("dense.embed", kind="client")
     async def calc_dense_embeddings(self, texts: Union[list[str], str]) -> list[str]:
         if isinstance(texts, str):
             texts = [texts]
+        set_attribute("texts", len(texts))
 
         data: dict = {"inputs": texts}
 
-        headers: dict = {"Content-Type": "application/json"}
+        headers: dict = inject({"Content-Type": "application/json"})
 
         async with aiohttp.ClientSession() as session:
             response = await session.post(
@@ -29,12 +32,13 @@ class AsyncDenseClient:
 
             return (await response.json())["vectors"]
 
+    @traced("dense.tokenize", kind="client")
     async def get_token_count(
         self, texts: Union[list[str], str]
     ) -> Union[list[int], int]:
         data: dict = {"inputs": texts}
 
-        headers: dict = {"Content-Type": "application/json"}
+        headers: dict = inject({"Content-Type": "application/json"})
 
         async with aiohttp.ClientSession() as session:
             response = await session.post(
@@ -1,35 +1,44 @@
 from openai import AsyncOpenAI, APIConnectionError
 
 from src.clients.utils.exceptions import NoResponseException
-from src.settings import Settings
+from src.clients.utils.llm_scheduler import LLMScheduler
+from src.settings import get_settings
+from src.tracing import traced
 
 
 class AsyncImageModelClient:
     def __init__(self):
-        self._settings = Settings()
+        self._settings = get_settings()
         self.model = AsyncOpenAI(base_url=self._settings.llm.url, api_key="empty")
+        self.scheduler = LLMScheduler.shared()
 
-    async def image_to_text(self, base64_str: str) -> str:
+    async def aclose(self):
+        """Close the HTTP connection pool of the client."""
+        await self.model.close()
+
+    @traced("llm.image_to_text", kind="client")
+    async def image_to_text(self, base64_str: str, collection: str = "") -> str:
         try:
-            response = await self.model.chat.completions.create(
-                model=self._settings.llm.name,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Describe the picture in German. Answer in detail but with few words as possible.",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"{base64_str}"},
-                            },
-                        ],
-                    }
-                ],
-                max_tokens=1024,
-            )
+            async with self.scheduler.slot(collection):
+                response = await self.model.chat.completions.create(
+                    model=self._settings.llm.name,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": "Describe the picture in German. Answer in detail but with few words as possible.",
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {"url": f"{base64_str}"},
+                                },
+                            ],
+                        }
+                    ],
+                    max_tokens=1024,
+                )
 
             return response.choices[0].message.content
 
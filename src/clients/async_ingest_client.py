@@ -5,16 +5,18 @@ import os
 import logging
 
 from src.settings import Settings
+from src.tracing import inject, traced
 
 _settings = Settings()
 
 logger = logging.getLogger(__name__)
 
 
+@traced("ingest.chunk_pdf", kind="client")
 async def chunk_pdf(path_to_pdf: str) -> list[str]:
     try:
         async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=30)
+            headers=inject(), timeout=aiohttp.ClientTimeout(total=30)
         ) as session:
             async with aiofiles.open(path_to_pdf, "rb") as pdf_file:
                 content = await pdf_file.read()
@@ -42,6 +44,7 @@ async def chunk_pdf(path_to_pdf: str) -> list[str]:
         return []
 
 
+@traced("ingest.insert_document", kind="client")
 async def insert_document(path_to_document: str, collection_name: str) -> bool:
     try:
         mime_type, _ = mimetypes.guess_type(path_to_document)
@@ -51,7 +54,7 @@ async def insert_document(path_to_document: str, collection_name: str) -> bool:
 
         filename = os.path.basename(path_to_document)
 
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=inject()) as session:
             async with aiofiles.open(path_to_document, "rb") as document:
                 content = await document.read()
                 form = aiohttp.FormData()
@@ -77,6 +80,7 @@ async def insert_document(path_to_document: str, collection_name: str) -> bool:
         return False
 
 
+@traced("ingest.insert_urls", kind="client")
 async def insert_urls(
     collection_name: str,
     urls: list[str],
@@ -85,7 +89,7 @@ async def insert_urls(
 ) -> bool:
     try:
         async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=7200)
+            headers=inject(), timeout=aiohttp.ClientTimeout(total=7200)
         ) as session:
             payload = {
                 "collection_name": collection_name,
@@ -111,6 +115,7 @@ async def insert_urls(
         return False
 
 
+@traced("ingest.create_url_crawl_job", kind="client")
 async def create_url_crawl_job(
     collection_name: str,
     base_url: str,
@@ -119,7 +124,7 @@ async def create_url_crawl_job(
 ) -> str | None:
     """Create a background job for faculty scrape, returns job_id or None."""
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=inject()) as session:
             payload = {
                 "collection_name": collection_name,
                 "base_url": base_url,
@@ -138,9 +143,10 @@ async def create_url_crawl_job(
         return None
 
 
+@traced("ingest.get_job_status", kind="client")
 async def get_job_status(job_id: str) -> dict | None:
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=inject()) as session:
             async with session.get(
                 f"{_settings.ingest.url}:{_settings.ingest.port}/jobs/by-id/{job_id}"
             ) as response:
@@ -153,9 +159,10 @@ async def get_job_status(job_id: str) -> dict | None:
         return None
 
 
+@traced("ingest.get_active_job", kind="client")
 async def get_active_job(collection_name: str) -> dict | None:
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=inject()) as session:
             logger.info(f"Getting active job for collection {collection_name}")
             async with session.get(
                 f"{_settings.ingest.url}:{_settings.ingest.port}/jobs/active",
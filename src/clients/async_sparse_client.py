@@ -1,20 +1,22 @@
 import aiohttp
 from qdrant_client import models
 
-from src.settings import Settings
+from src.settings import get_settings
+from src.tracing import inject, traced
 
 
 class AsyncSparseClient:
     def __init__(self):
-        self._settings = Settings()
+        self._settings = get_settings()
         self.url: str = (
             f"{self._settings.sparse.url}:{self._settings.sparse.port}/embed"
         )
 
+    @traced("sparse.embed", kind="client")
     async def calc_sparse_embeddings(self, texts: str):
         async with aiohttp.ClientSession() as session:
             data: dict = {"inputs": texts}
-            headers: dict = {"Content-Type": "application/json"}
+            headers: dict = inject({"Content-Type": "application/json"})
 
             async with session.post(self.url, headers=headers, json=data) as response:
                 if response.status == 200:
@@ -1,23 +1,71 @@
-from langchain_core.messages import BaseMessage
+import time
+from typing import AsyncIterator
+from langchain_core.messages import BaseMessage, BaseMessageChunk
 from langchain_openai import ChatOpenAI
 from openai import APIConnectionError
 
-from src.settings import Settings
+from src.settings import get_settings
 from src.clients.utils.exceptions import NoResponseException
+from src.clients.utils.llm_scheduler import LLMScheduler
+from src.metrics import LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND
+from src.tracing import traced
 
 
 class AsyncTextModelClient:
     def __init__(self):
-        self._settings = Settings()
+        self._settings = get_settings()
         self.model = ChatOpenAI(
             base_url=self._settings.llm.url,
             api_key="empty",
             model=self._settings.llm.name,
+            streaming=True,
         )
+        self.scheduler = LLMScheduler.shared()
 
-    async def chat(self, messages: list[BaseMessage]):
+    async def aclose(self):
+        """Close the HTTP connection pool of the client."""
+        await self.model.root_async_client.close()
+
+    @traced("llm.chat", kind="client")
+    async def chat(self, messages: list[BaseMessage], collection: str = ""):
+        try:
+            async with self.scheduler.slot(collection):
+                return await self.model.ainvoke(messages)
+
+        except APIConnectionError as e:
+            print(f"LLM is not responding right now - Error: {e}")
+            raise NoResponseException
+
+    @traced("llm.stream", kind="client")
+    async def stream(
+        self, messages: list[BaseMessage], collection: str = ""
+    ) -> AsyncIterator[BaseMessageChunk]:
+        """
+        Yield the answer of the LLM chunk by chunk as the tokens arrive.
+
+        The request waits for its turn in the LLM scheduler, fair between collections.
+
+        Raises:
+            LLMBusyException: If the LLM server stayed saturated for the queue timeout.
+            NoResponseException: If the LLM server is not reachable.
+        """
+        first_token = None
+        # The server streams one token per chunk
+        tokens = 0
         try:
-            return await self.model.ainvoke(messages)
+            async with self.scheduler.slot(collection):
+                start = time.perf_counter()
+                async for chunk in self.model.astream(messages):
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        LLM_TIME_TO_FIRST_TOKEN.observe(first_token - start)
+                    tokens += 1
+                    yield chunk
+
+            if tokens > 1 and time.perf_counter() > first_token:
+                LLM_TOKENS_PER_SECOND.observe(
+                    (tokens - 1) / (time.perf_counter() - first_token)
+                )
 
         except APIConnectionError as e:
             print(f"LLM is not responding right now - Error: {e}")
@@ -1,64 +1,178 @@
 from qdrant_client import AsyncQdrantClient, models
 from qdrant_client.models import PointStruct
 from qdrant_client.models import QueryResponse
+import asyncio
+import time
 import warnings
 import uuid
 import typing as tt
 
 from src.clients.async_dense_client import AsyncDenseClient
 from src.clients.async_sparse_client import AsyncSparseClient
-from src.settings import Settings
+from src.clients.utils.context_merging import build_context
+from src.clients.utils.storage_profiles import (
+    StorageProfile,
+    get_storage_profile,
+    storage_profile_from_config,
+)
+from src.settings import get_settings
+from src.metrics import (
+    INGEST_CHUNKS,
+    INGEST_CHUNKS_PER_SECOND,
+    QDRANT_SECONDS,
+    observe_throughput,
+    timed,
+)
+from src.tracing import set_attribute, traced
 
 
 warnings.filterwarnings(
     "ignore", message="Api key is used with an insecure connection."
 )
 
+# Collection holding the cached answers of all knowledge collections
+ANSWER_CACHE_COLLECTION = "answer_cache"
+# Ingest version of every knowledge collection, answers of older versions are stale
+ANSWER_CACHE_VERSIONS = "answer_cache_versions"
+
+
+def reciprocal_rank_fusion(rankings: list[list], limit: int, k: int = 60) -> list:
+    """Fuse ranked point lists with Reciprocal Rank Fusion (score = sum 1 / (k + rank))."""
+    scores: dict = {}
+    points: dict = {}
+    for ranking in rankings:
+        for rank, point in enumerate(ranking, start=1):
+            scores[point.id] = scores.get(point.id, 0.0) + 1.0 / (k + rank)
+            points[point.id] = point
+
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [points[point_id] for point_id in best]
+
+
+def answer_cache_filter(collection_name: str) -> models.Filter:
+    """Filter selecting the cached answers of one knowledge collection."""
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="collection_name",
+                match=models.MatchValue(value=collection_name),
+            )
+        ]
+    )
+
+
+def answer_cache_version_id(collection_name: str) -> str:
+    """Point ID of the ingest version of a knowledge collection."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"answer_cache/{collection_name}"))
+
 
 class AsyncVectorContextManager:
+    """
+    Qdrant client of the configured backend.
+
+    Every context opens its own client to the Qdrant server. The offline benchmarks set
+    BENCHMARK_LOCAL_QDRANT instead, then all contexts of the process share one client of
+    qdrant-client's local mode, on disk at BENCHMARK_QDRANT_PATH or in memory if it is
+    not set. The storage of the local mode can only be opened by one client, so it stays
+    open for the lifetime of the process.
+
+    This is not a deployment mode: the widget, ingest and admin services are separate
+    processes that need to see the same collections, so they call
+    require_server_backend at startup and refuse the local store.
+    """
+
+    _local_client: tt.Optional[AsyncQdrantClient] = None
+    _local_lock = asyncio.Lock()
+
     def __init__(self):
-        self._settings = Settings()
-        self.client = AsyncQdrantClient(
-            url=self._settings.qdrant.url,
-            port=self._settings.qdrant.port,
-            api_key=self._settings.qdrant_key.get_secret_value(),
-        )
+        self._settings = get_settings()
+        self.client = None
+        if not self._settings.benchmark_local_qdrant:
+            self.client = AsyncQdrantClient(
+                url=self._settings.qdrant.url,
+                port=self._settings.qdrant.port,
+                api_key=self._settings.qdrant_key.get_secret_value(),
+            )
+
+    @classmethod
+    async def get_local_client(cls, path: tt.Optional[str]) -> AsyncQdrantClient:
+        async with cls._local_lock:
+            if cls._local_client is None:
+                if path:
+                    cls._local_client = AsyncQdrantClient(path=path)
+                else:
+                    cls._local_client = AsyncQdrantClient(location=":memory:")
+            return cls._local_client
+
+    @staticmethod
+    def require_server_backend(service: str):
+        """Refuse to start a service on the process-local Qdrant store."""
+        if get_settings().benchmark_local_qdrant:
+            raise RuntimeError(
+                f"BENCHMARK_LOCAL_QDRANT is only meant for the offline benchmarks, "
+                f"the {service} service needs a Qdrant server"
+            )
+
+    @classmethod
+    async def close_local_client(cls):
+        async with cls._local_lock:
+            if cls._local_client is not None:
+                await cls._local_client.close()
+                cls._local_client = None
 
     async def __aenter__(self):
+        if self.client is None:
+            self.client = await self.get_local_client(
+                self._settings.benchmark_qdrant_path
+            )
         return self.client
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.client.close()
+        if not self._settings.benchmark_local_qdrant:
+            await self.client.close()
 
 
 class AsyncVectorClient:
+    # Storage profile per collection, resolved once from the Qdrant collection config
+    _storage_profiles: dict[str, StorageProfile] = {}
+    # Whether the answer cache collections are known to exist, they are never dropped
+    # but created by other processes, so a missing one is checked again on every write
+    _versions_ready: bool = False
+    _answer_cache_ready: bool = False
+
     def __init__(self):
-        self._settings = Settings()
+        self._settings = get_settings()
         self.dense_client = AsyncDenseClient()
         self.sparse_client = AsyncSparseClient()
 
-    async def create_collection(self, collection_name: str) -> None:
+    @traced("qdrant.create_collection", kind="client")
+    @timed(QDRANT_SECONDS, operation="create_collection")
+    async def create_collection(
+        self, collection_name: str, storage_profile: tt.Optional[str] = None
+    ) -> None:
+        profile = get_storage_profile(storage_profile)
+
         async with AsyncVectorContextManager() as client:
             if not await client.collection_exists(collection_name=collection_name):
                 try:
                     await client.create_collection(
                         collection_name=collection_name,
                         vectors_config={
-                            "dense": models.VectorParams(
-                                size=int(self._settings.dense_embedding_dimension),
-                                distance=models.Distance.COSINE,
+                            "dense": profile.vector_params(
+                                self._settings.dense_embedding_dimension
                             )
                         },
                         sparse_vectors_config={
-                            "sparse": models.SparseVectorParams(
-                                index=models.SparseIndexParams(
-                                    on_disk=False,
-                                ),
-                            )
+                            "sparse": profile.sparse_vector_params(),
                         },
+                        hnsw_config=profile.hnsw_config,
+                        quantization_config=profile.quantization_config,
                     )
+                    self._storage_profiles[collection_name] = profile
 
-                    print(f"created collection {collection_name}")
+                    print(
+                        f"created collection {collection_name} with storage profile {profile.name}"
+                    )
 
                 except Exception as e:
                     print(f"Error creating collection {collection_name}: {str(e)}")
@@ -67,6 +181,74 @@ class AsyncVectorClient:
             else:
                 print(f"collection already exists {collection_name}")
 
+    async def get_storage_profile(
+        self, client: AsyncQdrantClient, collection_name: str
+    ) -> StorageProfile:
+        """Resolve the storage profile of a collection from its Qdrant config (cached)."""
+        profile = self._storage_profiles.get(collection_name)
+        if profile is None:
+            info = await client.get_collection(collection_name=collection_name)
+            profile = storage_profile_from_config(info.config.quantization_config)
+            self._storage_profiles[collection_name] = profile
+        return profile
+
+    async def invalidate_answer_cache(
+        self, client: AsyncQdrantClient, collection_name: str
+    ) -> None:
+        """
+        Drop the cached answers of a collection after its points changed.
+
+        The ingest version of the collection is bumped first. Answers generated from the
+        old points are stamped with the old version, so one stored after the delete by a
+        generation that was already running is never served.
+        """
+        try:
+            if not AsyncVectorClient._versions_ready:
+                if await client.collection_exists(
+                    collection_name=ANSWER_CACHE_VERSIONS
+                ):
+                    AsyncVectorClient._versions_ready = True
+                else:
+                    try:
+                        await client.create_collection(
+                            collection_name=ANSWER_CACHE_VERSIONS, vectors_config={}
+                        )
+                        AsyncVectorClient._versions_ready = True
+                    except Exception as e:
+                        # Created by another process in the meantime
+                        print(f"Error creating {ANSWER_CACHE_VERSIONS}: {str(e)}")
+
+            await client.upsert(
+                collection_name=ANSWER_CACHE_VERSIONS,
+                points=[
+                    PointStruct(
+                        id=answer_cache_version_id(collection_name),
+                        vector={},
+                        payload={
+                            "collection_name": collection_name,
+                            "version": time.time_ns(),
+                        },
+                    )
+                ],
+            )
+
+            # Nothing to delete before the widget created the cache. Entries stored
+            # later by a generation that read the old version are never served
+            if not AsyncVectorClient._answer_cache_ready:
+                AsyncVectorClient._answer_cache_ready = await client.collection_exists(
+                    collection_name=ANSWER_CACHE_COLLECTION
+                )
+            if AsyncVectorClient._answer_cache_ready:
+                await client.delete(
+                    collection_name=ANSWER_CACHE_COLLECTION,
+                    points_selector=models.FilterSelector(
+                        filter=answer_cache_filter(collection_name)
+                    ),
+                )
+        except Exception as e:
+            print(f"Error invalidating the answer cache of {collection_name}: {str(e)}")
+
+    @traced("qdrant.enter_point", kind="client")
     async def enter_point(self, collection_name: str, text: str, source: str) -> None:
         async with AsyncVectorContextManager() as client:
             embeddings_dense: list = await self.dense_client.calc_dense_embeddings(
@@ -90,8 +272,11 @@ class AsyncVectorClient:
                 ],
             )
 
+            await self.invalidate_answer_cache(client, collection_name)
+
             print(f"point with id: {unique_id} got entered")
 
+    @traced("qdrant.enter_points", kind="client")
     async def enter_points(
         self,
         collection_name: str,
@@ -108,21 +293,38 @@ class AsyncVectorClient:
             # Determine total chunks to be inserted (used for progress)
             total_chunks = sum(len(chunks) for chunks in sources_to_chunks.values())
             processed = 0
+            upsert_seconds = QDRANT_SECONDS.labels(operation="upsert")
 
             for url, chunks in sources_to_chunks.items():
                 # Prepare texts
                 texts = [f"Source: {url}\nContent: {chunk}" for chunk in chunks]
 
                 # Embeddings (dense & sparse)
+                start = time.perf_counter()
                 embeddings_dense: list = await self.dense_client.calc_dense_embeddings(
                     texts=texts
                 )
                 print(f"Calculated {len(embeddings_dense)} dense embeddings")
+                observe_throughput(
+                    INGEST_CHUNKS_PER_SECOND,
+                    INGEST_CHUNKS,
+                    len(texts),
+                    time.perf_counter() - start,
+                    stage="embed_dense",
+                )
 
+                start = time.perf_counter()
                 embeddings_sparse: list = (
                     await self.sparse_client.calc_sparse_embeddings(texts=texts)
                 )
                 print(f"Calculated {len(embeddings_sparse)} sparse embeddings")
+                observe_throughput(
+                    INGEST_CHUNKS_PER_SECOND,
+                    INGEST_CHUNKS,
+                    len(texts),
+                    time.perf_counter() - start,
+                    stage="embed_sparse",
+                )
 
                 # Build point structs for this URL and upsert in batches
                 points_for_url = [
@@ -139,7 +341,17 @@ class AsyncVectorClient:
                 # Upsert in batches and report progress
                 for i in range(0, len(points_for_url), batch_size):
                     batch = points_for_url[i : i + batch_size]
+                    start = time.perf_counter()
                     await client.upsert(collection_name=collection_name, points=batch)
+                    seconds = time.perf_counter() - start
+                    upsert_seconds.observe(seconds)
+                    observe_throughput(
+                        INGEST_CHUNKS_PER_SECOND,
+                        INGEST_CHUNKS,
+                        len(batch),
+                        seconds,
+                        stage="upsert",
+                    )
                     processed += len(batch)
                     if progress_callback is not None and total_chunks > 0:
                         try:
@@ -154,8 +366,11 @@ class AsyncVectorClient:
                         except Exception:
                             pass
 
+            await self.invalidate_answer_cache(client, collection_name)
+
             print(f"{processed} points got entered")
 
+    @traced("qdrant.remove_point", kind="client")
     async def remove_point(self, id: str):
         """Remove a single point by ID"""
         async with AsyncVectorContextManager() as client:
@@ -166,30 +381,131 @@ class AsyncVectorClient:
 
             print(f"point with id: {id} got removed")
 
+    async def _embed_question(self, question: str) -> tuple[list, dict]:
+        """Dense and sparse embedding of a question, calculated concurrently."""
+        embeddings_dense, embeddings_sparse = await asyncio.gather(
+            self.dense_client.calc_dense_embeddings(texts=question),
+            self.sparse_client.calc_sparse_embeddings(texts=question),
+        )
+        return embeddings_dense[0], embeddings_sparse[0]
+
+    @traced("qdrant.query", kind="client")
+    @timed(QDRANT_SECONDS, operation="query")
+    async def _query_collection(
+        self,
+        client: AsyncQdrantClient,
+        collection_name: str,
+        embeddings_dense: list,
+        embeddings_sparse: dict,
+        limit: int = 10,
+    ) -> list:
+        """Hybrid (dense + sparse, RRF fused) search in one collection."""
+        set_attribute("collection_name", collection_name)
+        profile = await self.get_storage_profile(client, collection_name)
+
+        query_response: QueryResponse = await client.query_points(
+            collection_name=collection_name,
+            prefetch=[
+                models.Prefetch(
+                    query=embeddings_sparse,
+                    using="sparse",
+                    limit=profile.prefetch_limit,
+                ),
+                models.Prefetch(
+                    query=embeddings_dense,
+                    using="dense",
+                    limit=profile.prefetch_limit,
+                    params=profile.search_params,
+                ),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+        )
+
+        return query_response.points
+
+    def _build_context(self, points: list) -> str:
+        hits = [
+            (point.payload.get("source", ""), point.payload["text"]) for point in points
+        ]
+        context = build_context(
+            hits, duplicate_threshold=self._settings.context_duplicate_threshold
+        )
+        print(
+            f"Context of {len(hits)} hits reduced from "
+            f"{sum(len(text) for _, text in hits)} to {len(context)} characters"
+        )
+
+        return context
+
+    @traced("qdrant.get_relevant_context", kind="client")
     async def get_relevant_context(self, collection_name: str, question: str) -> str:
         async with AsyncVectorContextManager() as client:
-            embeddings_dense: list = (
-                await self.dense_client.calc_dense_embeddings(texts=question)
-            )[0]
+            embeddings_dense, embeddings_sparse = await self._embed_question(question)
 
-            embeddings_sparse: dict = (
-                await self.sparse_client.calc_sparse_embeddings(texts=question)
-            )[0]
+            points = await self._query_collection(
+                client, collection_name, embeddings_dense, embeddings_sparse
+            )
 
-            query_response: QueryResponse = await client.query_points(
-                collection_name=collection_name,
-                prefetch=[
-                    models.Prefetch(query=embeddings_sparse, using="sparse", limit=20),
-                    models.Prefetch(query=embeddings_dense, using="dense", limit=20),
-                ],
-                query=models.FusionQuery(fusion=models.Fusion.RRF),
-                limit=10,
+            return self._build_context(points)
+
+    @traced("qdrant.get_relevant_context_multi", kind="client")
+    async def get_relevant_context_multi(
+        self, collection_names: list[str], question: str, limit: int = 10
+    ) -> str:
+        """
+        Search several collections at once and fuse their results.
+
+        The question is embedded once and all collections are queried concurrently. A
+        collection that fails or does not answer within multi_collection_timeout seconds
+        is left out instead of stalling the answer. The ranked lists of the collections
+        are fused with Reciprocal Rank Fusion into one global top-k.
+
+        Args:
+            collection_names: The collections to search.
+            question: The question of the user.
+            limit: Number of hits after fusion.
+
+        Returns:
+            str: The context built from the fused hits.
+        """
+        if len(collection_names) == 1:
+            return await self.get_relevant_context(collection_names[0], question)
+
+        async with AsyncVectorContextManager() as client:
+            embeddings_dense, embeddings_sparse = await self._embed_question(question)
+
+            results = await asyncio.gather(
+                *(
+                    asyncio.wait_for(
+                        self._query_collection(
+                            client,
+                            collection_name,
+                            embeddings_dense,
+                            embeddings_sparse,
+                            limit,
+                        ),
+                        timeout=self._settings.multi_collection_timeout,
+                    )
+                    for collection_name in collection_names
+                ),
+                return_exceptions=True,
             )
 
-            result = [point.payload["text"] for point in query_response.points]
+            rankings = []
+            for collection_name, result in zip(collection_names, results):
+                if isinstance(result, BaseException):
+                    print(
+                        f"Collection {collection_name} left out of the search - "
+                        f"Error: {type(result).__name__} {result}"
+                    )
+                    continue
+                rankings.append(result)
 
-            return ". ".join(result)
+            return self._build_context(reciprocal_rank_fusion(rankings, limit))
 
+    @traced("qdrant.get_points", kind="client")
+    @timed(QDRANT_SECONDS, operation="scroll")
     async def get_points(self, collection_name: str) -> list:
         async with AsyncVectorContextManager() as client:
             count_result = await client.count(collection_name=collection_name)
@@ -207,6 +523,7 @@ class AsyncVectorClient:
 
             return points_result[0]
 
+    @traced("qdrant.remove_file", kind="client")
     async def remove_file(self, filename: str):
         """Remove all points associated with a filename"""
 
@@ -235,6 +552,8 @@ class AsyncVectorClient:
                     points_selector=models.PointIdsList(points=point_ids),
                 )
 
+    @traced("qdrant.get_point", kind="client")
+    @timed(QDRANT_SECONDS, operation="retrieve")
     async def get_point(self, collection_name: str, point_id: str) -> any:
         """Get a single point by ID"""
         async with AsyncVectorContextManager() as client:
@@ -278,6 +597,7 @@ class AsyncVectorClient:
                 print(f"Error getting point {point_id}: {str(e)}")
                 return None
 
+    @traced("qdrant.update_point", kind="client")
     async def update_point(
         self, collection_name: str, point_id, text: str, source: str
     ) -> bool:
@@ -330,12 +650,16 @@ class AsyncVectorClient:
                     ],
                 )
 
+                await self.invalidate_answer_cache(client, collection_name)
+
                 print(f"Point with id: {point_id} updated successfully")
                 return True
             except Exception as e:
                 print(f"Error updating point {point_id}: {str(e)}")
                 return False
 
+    @traced("qdrant.remove_points", kind="client")
+    @timed(QDRANT_SECONDS, operation="delete")
     async def remove_points(self, collection_name: str, point_ids: list) -> None:
         """Remove multiple points by IDs"""
         if not point_ids:
@@ -347,6 +671,7 @@ class AsyncVectorClient:
                     collection_name=collection_name,
                     points_selector=models.PointIdsList(points=point_ids),
                 )
+                await self.invalidate_answer_cache(client, collection_name)
                 print(
                     f"Removed {len(point_ids)} points from collection {collection_name}"
                 )
@@ -354,11 +679,15 @@ class AsyncVectorClient:
                 print(f"Error removing points: {str(e)}")
                 raise
 
+    @traced("qdrant.delete_collection", kind="client")
+    @timed(QDRANT_SECONDS, operation="delete_collection")
     async def delete_collection(self, collection_name: str) -> None:
         """Delete an entire collection"""
         async with AsyncVectorContextManager() as client:
             try:
                 await client.delete_collection(collection_name=collection_name)
+                await self.invalidate_answer_cache(client, collection_name)
+                self._storage_profiles.pop(collection_name, None)
                 print(f"Collection {collection_name} deleted successfully")
                 return True
             except Exception as e:
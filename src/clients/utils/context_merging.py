@@ -0,0 +1,113 @@
+import re
+
+
+# Overlap of neighbouring chunks written by split_string is 100 characters, but the
+# sentence boundary search may shorten the first chunk, so smaller overlaps are accepted
+MIN_CHUNK_OVERLAP = 20
+MAX_CHUNK_OVERLAP = 400
+
+SHINGLE_SIZE = 5
+
+
+def strip_source_prefix(text: str, source: str) -> str:
+    """Remove the "Source: ...\\nContent: " prefix every stored chunk starts with."""
+    prefix = f"Source: {source}\nContent: "
+    if text.startswith(prefix):
+        return text[len(prefix) :]
+    return text
+
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)}
+    return {
+        tuple(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of first that is a prefix of second."""
+    for length in range(min(len(first), len(second), MAX_CHUNK_OVERLAP), 0, -1):
+        if length < MIN_CHUNK_OVERLAP:
+            break
+        if first.endswith(second[:length]):
+            return length
+    return 0
+
+
+def _merge_neighbours(texts: list[str]) -> list[str]:
+    """Merge chunks of one source that overlap or contain each other."""
+    merged = list(texts)
+
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged)):
+                if i == j:
+                    continue
+
+                first, second = merged[i], merged[j]
+                if second in first:
+                    combined = first
+                else:
+                    overlap = _overlap(first, second)
+                    if not overlap:
+                        continue
+                    combined = first + second[overlap:]
+
+                merged[i] = combined
+                del merged[j]
+                changed = True
+                break
+
+            if changed:
+                break
+
+    return merged
+
+
+def build_context(hits: list[tuple[str, str]], duplicate_threshold: float) -> str:
+    """
+    Turn ranked search hits into a compact, source-annotated context block.
+
+    Hits are grouped by source (in the order of their best rank), near-duplicates are
+    dropped by word shingle similarity and overlapping neighbours are merged.
+
+    Args:
+        hits: (source, text) of the hits, best hit first.
+        duplicate_threshold: Jaccard similarity above which a hit counts as duplicate.
+
+    Returns:
+        str: One block per source, "Source: <source>" followed by its merged text.
+    """
+    groups: dict[str, list[str]] = {}
+    kept_shingles: list[set] = []
+
+    for source, text in hits:
+        text = strip_source_prefix(text, source).strip()
+        if not text:
+            continue
+
+        shingles = _shingles(text)
+        if any(
+            _jaccard(shingles, kept) >= duplicate_threshold for kept in kept_shingles
+        ):
+            continue
+
+        kept_shingles.append(shingles)
+        groups.setdefault(source, []).append(text)
+
+    blocks = []
+    for source, texts in groups.items():
+        merged = _merge_neighbours(texts)
+        blocks.append(f"Source: {source}\n" + "\n[...]\n".join(merged))
+
+    return "\n\n".join(blocks)
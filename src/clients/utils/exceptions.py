@@ -4,3 +4,7 @@ class NoResponseException(Exception):
 
 class GraphException(Exception):
     pass
+
+
+class LLMBusyException(Exception):
+    """No request to the LLM server became free within the queue timeout."""
@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from src.clients.utils.exceptions import LLMBusyException
+from src.metrics import LLM_QUEUE_TIMEOUTS, LLM_QUEUE_WAIT_SECONDS, QUEUE_DEPTH
+from src.settings import get_settings
+from src.tracing import span
+
+
+class LLMScheduler:
+    """
+    Caps the concurrent requests to the LLM server and shares them between collections.
+
+    Waiting requests are ordered by weighted fair queuing (start-time fair queuing): a
+    request gets the virtual finish tag max(virtual time, last tag of its collection) +
+    1 / weight and the smallest tag is served next. A collection sending many questions
+    at once therefore mostly delays its own requests, the question of a quiet collection
+    is served after at most one request of every busy collection.
+
+    A request that leaves the queue without being served (queue timeout or cancelled)
+    gives its tag back: the later requests of its collection move forward by its cost,
+    so a burst of abandoned requests does not push back the next one of the collection.
+    """
+
+    _shared: Optional["LLMScheduler"] = None
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_timeout: float,
+        weights: Optional[dict[str, float]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.weights = weights or {}
+        self.active = 0
+        # Heap of (finish tag, sequence, start tag, collection, future) of the waiting
+        # requests
+        self._queue: list[tuple[float, int, float, str, asyncio.Future]] = []
+        self._finish_tags: dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+
+    @classmethod
+    def shared(cls) -> "LLMScheduler":
+        """The scheduler of the process, configured by the settings."""
+        if cls._shared is None:
+            settings = get_settings()
+            scheduler = cls._shared = cls(
+                settings.llm_max_concurrency,
+                settings.llm_queue_timeout,
+                settings.llm_collection_weights,
+            )
+            QUEUE_DEPTH.labels(queue="llm_waiting").set_function(
+                lambda: scheduler.waiting
+            )
+            QUEUE_DEPTH.labels(queue="llm_active").set_function(
+                lambda: scheduler.active
+            )
+        return cls._shared
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, future in self._queue if not future.done())
+
+    def _enqueue(self, collection: str) -> tuple[float, asyncio.Future]:
+        weight = self.weights.get(collection, 1.0)
+        start = max(self._virtual_time, self._finish_tags.get(collection, 0.0))
+        finish = start + 1.0 / weight
+        self._finish_tags[collection] = finish
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._queue, (finish, next(self._sequence), start, collection, future)
+        )
+        return finish, future
+
+    def _withdraw(self, collection: str, finish: float):
+        """Give back the tag of a request that left the queue without being served."""
+        cost = 1.0 / self.weights.get(collection, 1.0)
+        for i, (tag, sequence, start, queued, future) in enumerate(self._queue):
+            if queued == collection and tag > finish and not future.done():
+                self._queue[i] = (tag - cost, sequence, start - cost, queued, future)
+        heapq.heapify(self._queue)
+
+        if collection in self._finish_tags:
+            self._finish_tags[collection] -= cost
+
+    def _dispatch(self):
+        while self._queue and self.active < self.max_concurrency:
+            _, _, start, _, future = heapq.heappop(self._queue)
+            # Requests that timed out or were cancelled while waiting
+            if future.done():
+                continue
+            self._virtual_time = start
+            self.active += 1
+            future.set_result(None)
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, collection: str) -> AsyncIterator[None]:
+        """
+        Hold one of the concurrent requests to the LLM server for the enclosed block.
+
+        Args:
+            collection (str): The collection the request is answered for.
+
+        Raises:
+            LLMBusyException: If no request became free within the queue timeout.
+        """
+        if self.max_concurrency <= 0:
+            yield
+            return
+
+        label = collection or "none"
+        start = time.perf_counter()
+        finish, future = self._enqueue(collection)
+        self._dispatch()
+
+        try:
+            with span("llm.queue", collection=label):
+                await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            self._withdraw(collection, finish)
+            if future.done() and not future.cancelled():
+                # The slot was granted in the same moment, hand it on
+                self._release()
+            if isinstance(e, asyncio.TimeoutError):
+                LLM_QUEUE_TIMEOUTS.labels(collection=label).inc()
+                raise LLMBusyException from e
+            raise
+        finally:
+            LLM_QUEUE_WAIT_SECONDS.labels(collection=label).observe(
+                time.perf_counter() - start
+            )
+
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Optional
+from qdrant_client import models
+
+
+DEFAULT_STORAGE_PROFILE = "small-fast"
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    Describes how a Qdrant collection stores its vectors and how it is searched.
+
+    small-fast: everything in RAM, no quantization. Best latency for small collections.
+    large:      int8 scalar quantization in RAM, original vectors and sparse index on disk.
+    huge:       binary quantization in RAM with oversampling and rescoring on disk originals.
+    """
+
+    name: str
+    description: str
+    dense_on_disk: bool
+    sparse_on_disk: bool
+    hnsw_config: models.HnswConfigDiff
+    quantization_config: Optional[models.QuantizationConfig] = None
+    search_params: Optional[models.SearchParams] = None
+    prefetch_limit: int = 20
+
+    def vector_params(self, dimension: int) -> models.VectorParams:
+        return models.VectorParams(
+            size=int(dimension),
+            distance=models.Distance.COSINE,
+            on_disk=self.dense_on_disk,
+        )
+
+    def sparse_vector_params(self) -> models.SparseVectorParams:
+        return models.SparseVectorParams(
+            index=models.SparseIndexParams(on_disk=self.sparse_on_disk)
+        )
+
+
+STORAGE_PROFILES: dict[str, StorageProfile] = {
+    "small-fast": StorageProfile(
+        name="small-fast",
+        description="All vectors and indexes in RAM",
+        dense_on_disk=False,
+        sparse_on_disk=False,
+        hnsw_config=models.HnswConfigDiff(m=16, ef_construct=100),
+        search_params=models.SearchParams(hnsw_ef=128),
+    ),
+    "large": StorageProfile(
+        name="large",
+        description="int8 quantization in RAM, originals and sparse index on disk",
+        dense_on_disk=True,
+        sparse_on_disk=True,
+        hnsw_config=models.HnswConfigDiff(m=16, ef_construct=128),
+        quantization_config=models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True,
+            )
+        ),
+        search_params=models.SearchParams(
+            hnsw_ef=128,
+            quantization=models.QuantizationSearchParams(
+                rescore=True,
+                oversampling=2.0,
+            ),
+        ),
+        prefetch_limit=30,
+    ),
+    "huge": StorageProfile(
+        name="huge",
+        description="Binary quantization in RAM with oversampling and rescoring",
+        dense_on_disk=True,
+        sparse_on_disk=True,
+        hnsw_config=models.HnswConfigDiff(m=32, ef_construct=256, on_disk=True),
+        quantization_config=models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        ),
+        search_params=models.SearchParams(
+            hnsw_ef=256,
+            quantization=models.QuantizationSearchParams(
+                rescore=True,
+                oversampling=3.0,
+            ),
+        ),
+        prefetch_limit=40,
+    ),
+}
+
+
+def get_storage_profile(name: Optional[str]) -> StorageProfile:
+    """Return the profile with the given name, falling back to the default profile."""
+    if not name:
+        return STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE]
+
+    try:
+        return STORAGE_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown storage profile '{name}'. Available: {', '.join(STORAGE_PROFILES)}"
+        )
+
+
+def storage_profile_from_config(
+    quantization_config: Optional[models.QuantizationConfig],
+) -> StorageProfile:
+    """Derive the profile of an existing collection from its quantization config."""
+    if isinstance(quantization_config, models.BinaryQuantization):
+        return STORAGE_PROFILES["huge"]
+    if isinstance(quantization_config, models.ScalarQuantization):
+        return STORAGE_PROFILES["large"]
+    return STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE]
@@ -1,8 +1,11 @@
+import time
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.dense.dense_service import get_tokenize_count, calc_dense_embeddings
+from src import metrics, tracing
 
 
 app = FastAPI()
@@ -15,14 +18,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+tracing.install(app, service_name="dense")
+metrics.install(app)
+
+_batch_size = metrics.EMBEDDING_BATCH_SIZE.labels(model="dense")
+_in_flight = metrics.QUEUE_DEPTH.labels(queue="dense_embed")
+
 
 @app.post("/embed")
 async def get_dense_embeddings(request: Request):
     try:
         data = await request.json()
         texts = data.get("inputs", "")
+        items = 1 if isinstance(texts, str) else len(texts)
+        _batch_size.observe(items)
 
-        vectors = await calc_dense_embeddings(texts)
+        _in_flight.inc()
+        start = time.perf_counter()
+        try:
+            vectors = await calc_dense_embeddings(texts)
+        finally:
+            _in_flight.dec()
+        metrics.observe_throughput(
+            metrics.EMBEDDING_ITEMS_PER_SECOND,
+            metrics.EMBEDDING_ITEMS,
+            items,
+            time.perf_counter() - start,
+            model="dense",
+        )
 
         return JSONResponse(
             content={
@@ -31,6 +54,7 @@ async def get_dense_embeddings(request: Request):
         )
     except Exception as e:
         print(e)
+        metrics.ERRORS.labels(where="dense_embed").inc()
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
@@ -14,6 +14,9 @@ from src.ingest.ingest_service import (
     acrawl_chunk_pdf,
     acrawl_url_and_add_to_vectorstore,
 )
+from src.clients.async_vector_client import AsyncVectorContextManager
+from src.settings import Settings
+from src import metrics, tracing
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +36,7 @@ def _public_job(job: dict) -> dict:
 async def lifespan(app: FastAPI):
     global CRAWLER_INSTANCE
     global BROWSER_CONFIG
+    AsyncVectorContextManager.require_server_backend("ingest")
     logger.info("\nStarting up and initializing crawler...")
 
     browser_config = BrowserConfig(
@@ -57,6 +61,7 @@ async def lifespan(app: FastAPI):
     logger.info("\nShutting down and closing crawler...")
     if CRAWLER_INSTANCE:
         await CRAWLER_INSTANCE.close()
+    await AsyncVectorContextManager.close_local_client()
 
 
 async def _restart_crawler():
@@ -114,6 +119,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_settings = Settings()
+tracing.install(
+    app,
+    service_name="ingest",
+    remote_services=[
+        f"{_settings.dense.url}:{_settings.dense.port}",
+        f"{_settings.sparse.url}:{_settings.sparse.port}",
+    ],
+)
+metrics.install(app)
+metrics.QUEUE_DEPTH.labels(queue="ingest_jobs").set_function(
+    lambda: sum(job.get("status") in {"queued", "running"} for job in JOBS.values())
+)
+
 
 async def _run_url_crawl_job(
     job_id: str,
@@ -17,7 +17,9 @@ import pytesseract
 from PIL import Image
 import logging
 import io
+import time
 from src.settings import Settings
+from src import metrics
 from src.clients.async_dense_client import AsyncDenseClient
 from src.clients.async_vector_client import AsyncVectorClient
 from src.ingest.character_splitter import chunk_text
@@ -342,10 +344,20 @@ async def aurls_to_vectorstore(
     try:
         _async_vector_client = AsyncVectorClient()
         urls_to_chunks = {}
+        start = time.perf_counter()
         async for url_to_chunks in achunk_markdown(url_to_markdown=markdown_generator):
             for url, chunks in url_to_chunks.items():
                 urls_to_chunks[url] = chunks
 
+        # Crawling and chunking are interleaved, so both count for this stage
+        metrics.observe_throughput(
+            metrics.INGEST_CHUNKS_PER_SECOND,
+            metrics.INGEST_CHUNKS,
+            sum(len(chunks) for chunks in urls_to_chunks.values()),
+            time.perf_counter() - start,
+            stage="crawl_chunk_urls",
+        )
+
         if progress_callback is not None:
             try:
                 progress_callback(
@@ -526,6 +538,7 @@ async def adocument_to_vectorstore(
         Exception: If an error occurs during chunking or vector store insertion.
     """
 
+    start = time.perf_counter()
     if data_type == "pdf":
         chunks: list[str] = await acrawl_chunk_pdf(binary_data=binary_data)
     elif data_type == "txt":
@@ -535,6 +548,14 @@ async def adocument_to_vectorstore(
     else:
         raise ValueError(f"Unsupported data type: {data_type}")
 
+    metrics.observe_throughput(
+        metrics.INGEST_CHUNKS_PER_SECOND,
+        metrics.INGEST_CHUNKS,
+        len(chunks),
+        time.perf_counter() - start,
+        stage=f"chunk_{data_type}",
+    )
+
     if len(chunks) == 0:
         return False
 
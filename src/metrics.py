@@ -0,0 +1,380 @@
+"""
+Prometheus metrics shared by the dense, sparse, ingest, widget and admin services.
+
+A small registry of counters, gauges and histograms rendered in the Prometheus text
+exposition format on /metrics of every app. Labelled children are created once and can
+be kept by the caller, and histogram buckets are preallocated, so recording on hot paths
+is a dict lookup at most, a bisect and two additions.
+"""
+
+import functools
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Requests that are not measured, the scrape itself included
+UNMEASURED_PATHS = ("/metrics", "/static/", "/debug/")
+
+_registry: list["_Metric"] = []
+# Histograms of the timed calls the current task is inside of
+_timing: ContextVar[frozenset] = ContextVar("timing", default=frozenset())
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        _registry.append(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """A new child holding the value of one set of label values."""
+
+    def labels(self, *values, **kwargs):
+        """Return the child of the label values, created on first use."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _samples(self, values: tuple, child) -> list[str]:
+        """The exposition lines of one child."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for values, child in list(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}_total{labels} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "function")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from function at scrape time, e.g. the length of a queue."""
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self, values, child):
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        # One count per bucket plus +Inf, cumulated only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            labels = _format_labels(self.labelnames, values, le)
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry if metric._children) + "\n"
+
+
+def timed(histogram: Histogram, **labels):
+    """
+    Decorator observing the duration of every call of an async function.
+
+    Only the outermost timed call per histogram is observed. A timed method calling
+    another one of the same histogram (e.g. get_checkpoint_messages calling find_one)
+    is counted once, under its own labels.
+    """
+    child = histogram.labels(**labels)
+
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            active = _timing.get()
+            if histogram in active:
+                return await function(*args, **kwargs)
+
+            token = _timing.set(active | {histogram})
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+                _timing.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def observe_throughput(
+    rate: Histogram, total: Counter, items: int, seconds: float, **labels
+):
+    """Record a batch of items processed in seconds as items per second and total."""
+    total.labels(**labels).inc(items)
+    if items and seconds > 0:
+        rate.labels(**labels).observe(items / seconds)
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests until the response is complete.",
+    ("method", "route", "status"),
+)
+ERRORS = Counter(
+    "errors",
+    "Errors that were handled and reported to the caller.",
+    ("where",),
+)
+QUEUE_DEPTH = Gauge(
+    "queue_depth",
+    "Work items waiting or in progress.",
+    ("queue",),
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size",
+    "Texts per embedding request.",
+    ("model",),
+    buckets=SIZE_BUCKETS,
+)
+EMBEDDING_ITEMS_PER_SECOND = Histogram(
+    "embedding_items_per_second",
+    "Embedding throughput per request.",
+    ("model",),
+    buckets=RATE_BUCKETS,
+)
+EMBEDDING_ITEMS = Counter(
+    "embedding_items",
+    "Embedded texts.",
+    ("model",),
+)
+
+QDRANT_SECONDS = Histogram(
+    "qdrant_request_duration_seconds",
+    "Latency of Qdrant operations.",
+    ("operation",),
+)
+MONGO_SECONDS = Histogram(
+    "mongo_request_duration_seconds",
+    "Latency of MongoDB operations.",
+    ("operation",),
+)
+
+INGEST_CHUNKS_PER_SECOND = Histogram(
+    "ingest_chunks_per_second",
+    "Ingest throughput per stage and batch.",
+    ("stage",),
+    buckets=RATE_BUCKETS,
+)
+INGEST_CHUNKS = Counter(
+    "ingest_chunks",
+    "Chunks processed per ingest stage.",
+    ("stage",),
+)
+
+COALESCED_REQUESTS = Counter(
+    "coalesced_requests",
+    "Answer requests sharing a graph run: the leader runs it, followers reuse it.",
+    ("role",),
+)
+
+WEBSOCKET_MESSAGES = Counter(
+    "websocket_messages",
+    "Messages received on the WebSocket chat channel.",
+    ("type",),
+)
+
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending the prompt to the first streamed token.",
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Time a request waited for a free request to the LLM server.",
+    ("collection",),
+)
+LLM_QUEUE_TIMEOUTS = Counter(
+    "llm_queue_timeouts",
+    "Requests answered as busy, because the LLM server stayed saturated.",
+    ("collection",),
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Streamed tokens per second after the first token.",
+    buckets=RATE_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing the latency of every request per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNMEASURED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template instead of the path keeps the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+
+def install(app: FastAPI):
+    """Add the metrics middleware and the /metrics endpoint to an app."""
+    app.add_middleware(MetricsMiddleware)
+
+    async def metrics():
+        return PlainTextResponse(content=render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Optional
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -19,6 +20,11 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=env_path, env_nested_delimiter="__")
 
     qdrant: Endpoint
+    # Offline benchmarks only, not a deployment mode: runs Qdrant in-process
+    # (qdrant-client local mode), on disk at benchmark_qdrant_path or in memory. The
+    # store is private to one process, so the services refuse to start with it
+    benchmark_local_qdrant: bool = False
+    benchmark_qdrant_path: Optional[str] = None
     mongo: Endpoint
     ingest: Endpoint
     llm: LLM
@@ -32,6 +38,69 @@ class Settings(BaseSettings):
 
     llm_chat_history_limit: Optional[int] = None
 
+    # Concurrent requests of this process to the LLM server, shared between the
+    # collections by weighted fair queuing (weight 1 if not listed), 0 disables the cap
+    llm_max_concurrency: int = 8
+    llm_queue_timeout: float = 30.0
+    llm_collection_weights: dict[str, float] = {}
+
+    answer_cache_enabled: bool = True
+    answer_cache_threshold: float = 0.95
+    # Cached answers expire after answer_cache_ttl_hours, the oldest are dropped when a
+    # collection has more than answer_cache_max_entries
+    answer_cache_ttl_hours: int = 24
+    answer_cache_max_entries: int = 1000
+    # Serves the hit/miss counters of the widget on /answer_cache/stats (no auth)
+    answer_cache_stats_route: bool = False
+
+    # Identical concurrent first questions of a collection share one graph run
+    single_flight_enabled: bool = True
+
+    # WebSocket chat channel: clients ping every ws_ping_interval seconds, connections
+    # silent for ws_idle_timeout seconds are closed. Answers stay resumable after a
+    # dropped connection until ws_resume_ttl seconds after they finished
+    ws_ping_interval: float = 20.0
+    ws_idle_timeout: float = 60.0
+    ws_resume_ttl: float = 120.0
+
+    image_max_edge: int = 1568
+    image_jpeg_quality: int = 85
+    image_description_cache_size: int = 256
+
+    # Collection metadata of the widget bootstrap endpoints: seconds between checks of
+    # the version bumped by the admin service, and until a reload in any case
+    collection_cache_check_interval: float = 2.0
+    collection_cache_ttl: int = 300
+
+    checkpoint_keep_last: int = 5
+    checkpoint_thread_ttl_days: int = 7
+    checkpoint_compaction_interval: int = 3600
+
+    attachment_ttl_hours: int = 24
+
+    prompt_token_budget: int = 12000
+    prompt_history_share: float = 0.2
+    prompt_context_share: float = 0.4
+    prompt_attachment_share: float = 0.4
+
+    context_duplicate_threshold: float = 0.8
+    multi_collection_timeout: float = 3.0
+
+    pdf_conversion_workers: int = 1
+    pdf_markdown_cache_size: int = 64
+
+    attachment_index_min_tokens: int = 3000
+    attachment_index_chunk_size: int = 1500
+    attachment_index_chunk_overlap: int = 200
+    attachment_index_batch_size: int = 64
+    attachment_index_top_k: int = 6
+    attachment_index_ttl: int = 1800
+    attachment_index_max_mb: int = 256
+
+    csv_sample_rows: int = 10
+    csv_top_values: int = 5
+    csv_max_matching_rows: int = 20
+
     qdrant_key: Optional[SecretStr] = None
     mongo_password: Optional[SecretStr] = None
     mongo_username: Optional[SecretStr] = None
@@ -39,6 +108,12 @@ class Settings(BaseSettings):
     secret_key: Optional[SecretStr] = None
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """The settings of the process, read and validated once."""
+    return Settings()
+
+
 if __name__ == "__main__":
     settings = Settings()
     print(settings.model_dump())
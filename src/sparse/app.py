@@ -1,8 +1,11 @@
+import time
+
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.sparse.sparse_service import calc_sparse_embedding
+from src import metrics, tracing
 
 
 app = FastAPI()
@@ -15,6 +18,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+tracing.install(app, service_name="sparse")
+metrics.install(app)
+
+_batch_size = metrics.EMBEDDING_BATCH_SIZE.labels(model="sparse")
+_in_flight = metrics.QUEUE_DEPTH.labels(queue="sparse_embed")
+
 
 @app.post("/embed")
 async def get_sparse_embeddings(request: Request):
@@ -24,7 +33,22 @@ async def get_sparse_embeddings(request: Request):
     try:
         data = await request.json()
         texts = data.get("inputs", [])
-        vectors = await calc_sparse_embedding(texts)
+        items = 1 if isinstance(texts, str) else len(texts)
+        _batch_size.observe(items)
+
+        _in_flight.inc()
+        start = time.perf_counter()
+        try:
+            vectors = await calc_sparse_embedding(texts)
+        finally:
+            _in_flight.dec()
+        metrics.observe_throughput(
+            metrics.EMBEDDING_ITEMS_PER_SECOND,
+            metrics.EMBEDDING_ITEMS,
+            items,
+            time.perf_counter() - start,
+            model="sparse",
+        )
         response_vectors = [
             {
                 "indices": vector.indices,
@@ -40,6 +64,7 @@ async def get_sparse_embeddings(request: Request):
         )
     except Exception as e:
         print(e)
+        metrics.ERRORS.labels(where="sparse_embed").inc()
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
@@ -0,0 +1,422 @@
+"""
+Span based request tracing shared by the widget, dense, sparse and ingest services.
+
+Spans follow the OpenTelemetry data model (trace and span ids, parent span, kind, start
+and end in unix nanoseconds, attributes, status, service name) and the trace context is
+propagated between the services with the W3C traceparent header. Finished spans are
+kept in memory, so that /debug/trace/{trace_id} can show the waterfall of a request, and
+can be exported as JSON lines to the console or to a local file. The file is written by
+a background thread and rotated by size, so exporting never blocks the event loop.
+
+Configuration (environment or src/.env):
+    TRACE_EXPORTER: "none" (default), "console" or "file"
+    TRACE_FILE: Path of the JSONL file, default "traces/spans.jsonl"
+    TRACE_FILE_MAX_MB: Size at which the file is rotated to TRACE_FILE + ".1"
+    TRACE_BUFFER_SIZE: Number of finished spans kept in memory per process
+    TRACE_DEBUG_ROUTES: Serve /debug/spans and /debug/trace, off by default because
+        the spans contain request details
+"""
+
+import asyncio
+import functools
+import html
+import inspect
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+import aiohttp
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, JSONResponse
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Requests that are not traced
+UNTRACED_PATHS = ("/debug/", "/static/")
+
+
+class TracingSettings(BaseSettings):
+    # Not part of Settings, because the dense service runs without src/.env
+    model_config = SettingsConfigDict(
+        env_prefix="TRACE_", env_file="src/.env", extra="ignore"
+    )
+
+    exporter: str = "none"
+    file: str = "traces/spans.jsonl"
+    file_max_mb: int = 100
+    buffer_size: int = 10000
+    debug_routes: bool = False
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: Optional[str]
+    kind: str
+    start_time_unix_nano: int
+    end_time_unix_nano: Optional[int] = None
+    attributes: dict = field(default_factory=dict)
+    status: str = "OK"
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "status": self.status,
+            "resource": {"service.name": _service_name},
+        }
+
+
+_settings = TracingSettings()
+_service_name = "unknown"
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_finished: deque = deque(maxlen=_settings.buffer_size)
+_export_queue: queue.SimpleQueue = queue.SimpleQueue()
+_export_lock = threading.Lock()
+_export_thread: Optional[threading.Thread] = None
+
+
+def _write_spans() -> None:
+    """Append the queued spans to the trace file, rotating it at file_max_mb."""
+    max_bytes = _settings.file_max_mb * 1024**2
+    os.makedirs(os.path.dirname(_settings.file) or ".", exist_ok=True)
+    export_file = open(_settings.file, "a")
+
+    while True:
+        lines = [json.dumps(_export_queue.get()) + "\n"]
+        # Write everything queued in the meantime at once
+        while not _export_queue.empty() and len(lines) < 1000:
+            lines.append(json.dumps(_export_queue.get()) + "\n")
+
+        try:
+            export_file.writelines(lines)
+            export_file.flush()
+            if export_file.tell() >= max_bytes:
+                export_file.close()
+                os.replace(_settings.file, _settings.file + ".1")
+                export_file = open(_settings.file, "a")
+        except OSError as e:
+            print(f"Error writing spans to {_settings.file}: {e}")
+
+
+def _export(span: Span) -> None:
+    global _export_thread
+    record = span.to_dict()
+    _finished.append(record)
+
+    if _settings.exporter == "console":
+        print(json.dumps(record))
+    elif _settings.exporter == "file":
+        if _export_thread is None:
+            with _export_lock:
+                if _export_thread is None:
+                    _export_thread = threading.Thread(
+                        target=_write_spans, name="span-export", daemon=True
+                    )
+                    _export_thread.start()
+        _export_queue.put(record)
+
+
+def _start_span(
+    name: str,
+    kind: str = "internal",
+    remote_parent: Optional[tuple[str, str]] = None,
+    attributes: Optional[dict] = None,
+) -> Span:
+    parent = _current_span.get()
+    if remote_parent is not None:
+        trace_id, parent_span_id = remote_parent
+    elif parent is not None:
+        trace_id, parent_span_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_span_id = secrets.token_hex(16), None
+
+    return Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent_span_id,
+        kind=kind,
+        start_time_unix_nano=time.time_ns(),
+        attributes=dict(attributes or {}),
+    )
+
+
+def _end_span(span: Span, error: Optional[BaseException] = None) -> None:
+    if error is not None and not isinstance(error, GeneratorExit):
+        span.status = "ERROR"
+        span.attributes["error"] = f"{type(error).__name__}: {error}"
+    span.end_time_unix_nano = time.time_ns()
+    _export(span)
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: str = "internal",
+    remote_parent: Optional[tuple[str, str]] = None,
+    **attributes,
+) -> Iterator[Span]:
+    """Record the enclosed block as a span, child of the current span of the context."""
+    current = _start_span(name, kind, remote_parent, attributes)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator was closed from another context
+            pass
+        _end_span(current, error)
+
+
+def traced(name: str, kind: str = "internal"):
+    """
+    Decorator recording every call of an async function as a span.
+
+    Async generators are recorded from the first to the last item, without becoming the
+    current span, because their body runs in the context of the consumer.
+    """
+
+    def decorator(function):
+        if inspect.isasyncgenfunction(function):
+
+            @functools.wraps(function)
+            async def generator_wrapper(*args, **kwargs):
+                current = _start_span(name, kind)
+                error = None
+                try:
+                    async for item in function(*args, **kwargs):
+                        if "first_item_ms" not in current.attributes:
+                            current.attributes["first_item_ms"] = round(
+                                (time.time_ns() - current.start_time_unix_nano) / 1e6, 1
+                            )
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    _end_span(current, error)
+
+            return generator_wrapper
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def set_attribute(key: str, value) -> None:
+    """Set an attribute on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def inject(headers: Optional[dict] = None) -> dict:
+    """Add the traceparent header of the current span to outgoing request headers."""
+    headers = dict(headers or {})
+    current = _current_span.get()
+    if current is not None:
+        headers["traceparent"] = f"00-{current.trace_id}-{current.span_id}-01"
+    return headers
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """Return (trace_id, parent_span_id) of a W3C traceparent header."""
+    if not value:
+        return None
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def finished_spans() -> list[dict]:
+    """All finished spans still kept in memory by this process."""
+    return list(_finished)
+
+
+def get_trace(trace_id: str) -> list[dict]:
+    """Finished spans of a trace recorded by this process."""
+    return [record for record in list(_finished) if record["trace_id"] == trace_id]
+
+
+class TracingMiddleware:
+    """ASGI middleware recording every HTTP request as the server span of its trace."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        remote_parent = parse_traceparent(
+            headers.get(b"traceparent", b"").decode("latin-1")
+        )
+
+        with span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            remote_parent=remote_parent,
+        ) as server_span:
+
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    server_span.set_attribute("http.status_code", status)
+                    if status >= 500:
+                        server_span.status = "ERROR"
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", server_span.trace_id.encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+
+
+async def _fetch_remote_spans(base_url: str, trace_id: str) -> list[dict]:
+    try:
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=2)
+        ) as session:
+            async with session.get(f"{base_url}/debug/spans/{trace_id}") as response:
+                if response.status != 200:
+                    return []
+                return await response.json()
+    except Exception as e:
+        print(f"Error fetching spans from {base_url}: {e}")
+        return []
+
+
+async def collect_trace(trace_id: str, remote_services: list[str]) -> list[dict]:
+    """Spans of a trace from this process and the given services, oldest first."""
+    remote = await asyncio.gather(
+        *(_fetch_remote_spans(base_url, trace_id) for base_url in remote_services)
+    )
+    spans = get_trace(trace_id) + [record for records in remote for record in records]
+    return sorted(spans, key=lambda record: record["start_time_unix_nano"])
+
+
+def render_waterfall(trace_id: str, spans: list[dict]) -> str:
+    """Render the spans of a trace as an HTML waterfall, children below their parent."""
+    if not spans:
+        return f"<p>No spans recorded for trace {html.escape(trace_id)}.</p>"
+
+    start = min(record["start_time_unix_nano"] for record in spans)
+    end = max(record["end_time_unix_nano"] for record in spans)
+    total = max(end - start, 1)
+
+    children: dict = {}
+    span_ids = {record["span_id"] for record in spans}
+    for record in spans:
+        parent = record["parent_span_id"]
+        children.setdefault(parent if parent in span_ids else None, []).append(record)
+
+    rows = []
+
+    def add_rows(parent_id: Optional[str], depth: int):
+        for record in children.get(parent_id, []):
+            offset = (record["start_time_unix_nano"] - start) / total * 100
+            duration = record["end_time_unix_nano"] - record["start_time_unix_nano"]
+            width = max(duration / total * 100, 0.2)
+            color = "#d9534f" if record["status"] == "ERROR" else "#4a90d9"
+            attributes = html.escape(json.dumps(record["attributes"]))
+            rows.append(
+                "<tr>"
+                f"<td style='padding-left:{depth * 16}px' title='{attributes}'>"
+                f"{html.escape(record['name'])}</td>"
+                f"<td>{html.escape(record['resource']['service.name'])}</td>"
+                f"<td style='text-align:right'>{duration / 1e6:.1f} ms</td>"
+                "<td style='width:50%'>"
+                f"<div style='margin-left:{offset:.2f}%;width:{width:.2f}%;"
+                f"background:{color};height:12px'></div></td>"
+                "</tr>"
+            )
+            add_rows(record["span_id"], depth + 1)
+
+    add_rows(None, 0)
+
+    return (
+        f"<h3>Trace {html.escape(trace_id)} ({total / 1e6:.1f} ms)</h3>"
+        "<table style='width:100%;font:13px monospace;border-collapse:collapse'>"
+        "<tr><th>Span</th><th>Service</th><th>Duration</th><th></th></tr>"
+        + "".join(rows)
+        + "</table>"
+    )
+
+
+def install(
+    app: FastAPI, service_name: str, remote_services: Optional[list[str]] = None
+):
+    """
+    Enable tracing for a FastAPI app.
+
+    Adds the tracing middleware and, if TRACE_DEBUG_ROUTES is set,
+    /debug/spans/{trace_id} (JSON spans of this process) and /debug/trace/{trace_id}
+    (waterfall including the spans of the remote services, which need the setting too).
+
+    Args:
+        app (FastAPI): The app of the service.
+        service_name (str): Name of the service in the spans.
+        remote_services (list[str]): Base URLs of the traced services this app calls.
+    """
+    global _service_name
+    _service_name = service_name
+    remote_services = remote_services or []
+
+    app.add_middleware(TracingMiddleware)
+
+    if not _settings.debug_routes:
+        return
+
+    async def debug_spans(trace_id: str):
+        return JSONResponse(content=get_trace(trace_id))
+
+    async def debug_trace(trace_id: str, format: str = "html"):
+        spans = await collect_trace(trace_id, remote_services)
+        if format == "json":
+            return JSONResponse(content=spans)
+        return HTMLResponse(content=render_waterfall(trace_id, spans))
+
+    app.add_api_route("/debug/spans/{trace_id}", debug_spans, methods=["GET"])
+    app.add_api_route("/debug/trace/{trace_id}", debug_trace, methods=["GET"])
@@ -1,22 +1,29 @@
+from typing import Optional, Union
 from langgraph.graph import START, END
 from langgraph.graph import StateGraph
 from langgraph.graph.state import CompiledStateGraph
-from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from pymongo import AsyncMongoClient
 
-from src.settings import Settings
+from src.settings import get_settings
+from src.tracing import traced
+from src.widget.app.container import AppContainer
 from src.widget.app.utils.state import State
+from src.widget.app.utils.traced_checkpointer import TracedAsyncMongoDBSaver
 from src.widget.app.utils.processors.async_processor_factory import (
     AsyncProcessorFactory,
 )
 
 
 class AsyncGraph:
-    def __init__(self):
-        self.processor_factory = AsyncProcessorFactory()
-        self._settings = Settings()
+    def __init__(self, container: Optional[AppContainer] = None):
+        # Without a container every node execution builds its own processor
+        self.processor_factory = AsyncProcessorFactory(
+            container.processors if container is not None else None
+        )
+        self._settings = get_settings()
 
-    async def data_type_condition(self, state: State) -> str:
+    async def sequential_data_type_condition(self, state: State) -> str:
         data_type_mapping = {
             "pdf": "pdf",
             "txt": "txt",
@@ -27,36 +34,67 @@ class AsyncGraph:
 
         return data_type_mapping.get(state["user_input_type"])
 
+    async def data_type_condition(self, state: State) -> Union[str, list[str]]:
+        node = await self.sequential_data_type_condition(state)
+        if node == "database":
+            return node
+
+        # Attachment processing and retrieval are independent, run them in parallel
+        return [node, "database"]
+
+    @traced("graph.node.database")
     async def db_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(user_input_type="db")
         return await processor.process(state)
 
+    @traced("graph.node.llm")
     async def llm_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(user_input_type="llm")
         return await processor.process(state)
 
+    @traced("graph.node.image")
     async def image_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(
             user_input_type="image"
         )
         return await processor.process(state)
 
+    @traced("graph.node.pdf")
     async def pdf_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(user_input_type="pdf")
         return await processor.process(state)
 
+    @traced("graph.node.csv")
     async def csv_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(user_input_type="csv")
         return await processor.process(state)
 
+    @traced("graph.node.txt")
     async def txt_node(self, state: State) -> dict:
         processor = await self.processor_factory.create_processor(user_input_type="txt")
         return await processor.process(state)
 
-    async def build_graph(self) -> CompiledStateGraph:
-        mongodb_uri = f"mongodb://{self._settings.mongo_username.get_secret_value()}:{self._settings.mongo_password.get_secret_value()}@{self._settings.mongo.url}:{self._settings.mongo.port}/admin"
-        mongodb_client = AsyncMongoClient(mongodb_uri)
-        checkpointer = AsyncMongoDBSaver(mongodb_client)
+    async def build_graph(
+        self,
+        checkpointer: Optional[BaseCheckpointSaver] = None,
+        parallel: bool = True,
+    ) -> CompiledStateGraph:
+        """
+        Build the graph of the widget.
+
+        Args:
+            checkpointer (BaseCheckpointSaver): Checkpointer to use, defaults to the traced MongoDB saver.
+            parallel (bool): Run attachment processing and retrieval as parallel branches
+                that join before the llm node. False restores the former sequential graph
+                (attachment -> database -> llm), e.g. for benchmarks.
+
+        Returns:
+            CompiledStateGraph: The compiled graph.
+        """
+        if checkpointer is None:
+            mongodb_uri = f"mongodb://{self._settings.mongo_username.get_secret_value()}:{self._settings.mongo_password.get_secret_value()}@{self._settings.mongo.url}:{self._settings.mongo.port}/admin"
+            mongodb_client = AsyncMongoClient(mongodb_uri)
+            checkpointer = TracedAsyncMongoDBSaver(mongodb_client)
 
         graph_builder = StateGraph(State)
 
@@ -69,7 +107,11 @@ class AsyncGraph:
 
         graph_builder.add_conditional_edges(
             START,
-            self.data_type_condition,
+            (
+                self.data_type_condition
+                if parallel
+                else self.sequential_data_type_condition
+            ),
             {
                 "image": "image",
                 "pdf": "pdf",
@@ -79,10 +121,13 @@ class AsyncGraph:
             },
         )
 
-        graph_builder.add_edge("image", "database")
-        graph_builder.add_edge("pdf", "database")
-        graph_builder.add_edge("txt", "database")
-        graph_builder.add_edge("csv", "database")
+        # In the parallel graph both branches finish in the same superstep, so the llm
+        # node runs once with the prompt parts of both
+        attachment_target = "llm" if parallel else "database"
+        graph_builder.add_edge("image", attachment_target)
+        graph_builder.add_edge("pdf", attachment_target)
+        graph_builder.add_edge("txt", attachment_target)
+        graph_builder.add_edge("csv", attachment_target)
         graph_builder.add_edge("database", "llm")
 
         graph_builder.add_edge("llm", END)
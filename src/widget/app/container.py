@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.clients.async_dense_client import AsyncDenseClient
+from src.clients.async_image_client import AsyncImageModelClient
+from src.clients.async_text_client import AsyncTextModelClient
+from src.clients.async_vector_client import AsyncVectorClient
+from src.settings import Settings, get_settings
+from src.widget.app.utils.attachment_index import AttachmentIndex
+from src.widget.app.utils.prompt_assembler import PromptAssembler
+from src.widget.app.utils.processors.async_processors import (
+    AsyncProcessor,
+    AsyncCSVProcessor,
+    AsyncDBProcessor,
+    AsyncIMAGEProcessor,
+    AsyncLLMProcessor,
+    AsyncPDFProcessor,
+    AsyncTXTProcessor,
+)
+
+
+@dataclass
+class AppContainer:
+    """
+    Application scoped dependencies of the widget, built once in the lifespan.
+
+    The LLM and vision clients keep one HTTP connection pool each for all requests and
+    the processors hold no per-request state, so the graph reuses one processor per
+    node instead of building new clients on every node execution. The prompt assembler
+    and the attachment index (with its dense client) are shared by the processors the
+    same way.
+    """
+
+    settings: Settings
+    text_client: AsyncTextModelClient
+    image_client: AsyncImageModelClient
+    vector_client: AsyncVectorClient
+    db_client: AsyncDatabaseClient
+    dense_client: AsyncDenseClient
+    prompt_assembler: PromptAssembler
+    attachment_index: AttachmentIndex
+    processors: dict[str, AsyncProcessor]
+
+    @classmethod
+    def create(cls, db_client: Optional[AsyncDatabaseClient] = None) -> "AppContainer":
+        text_client = AsyncTextModelClient()
+        image_client = AsyncImageModelClient()
+        vector_client = AsyncVectorClient()
+        db_client = db_client or AsyncDatabaseClient()
+        dense_client = AsyncDenseClient()
+        prompt_assembler = PromptAssembler()
+        attachment_index = AttachmentIndex(dense_client)
+
+        return cls(
+            settings=get_settings(),
+            text_client=text_client,
+            image_client=image_client,
+            vector_client=vector_client,
+            db_client=db_client,
+            dense_client=dense_client,
+            prompt_assembler=prompt_assembler,
+            attachment_index=attachment_index,
+            processors={
+                "pdf": AsyncPDFProcessor(
+                    text_client, db_client, prompt_assembler, attachment_index
+                ),
+                "txt": AsyncTXTProcessor(
+                    text_client, db_client, prompt_assembler, attachment_index
+                ),
+                "image": AsyncIMAGEProcessor(image_client, db_client),
+                "csv": AsyncCSVProcessor(text_client, db_client),
+                "db": AsyncDBProcessor(vector_client, attachment_index),
+                "llm": AsyncLLMProcessor(text_client, prompt_assembler),
+            },
+        )
+
+    async def aclose(self):
+        """Close the connection pools of the shared clients."""
+        await self.text_client.aclose()
+        await self.image_client.aclose()
@@ -0,0 +1,140 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from src.clients.async_dense_client import AsyncDenseClient
+from src.settings import get_settings
+
+
+def split_text(text: str, chunk_size: int, overlap: int) -> list[str]:
+    """Split text into overlapping chunks, preferring to cut at paragraph or sentence ends."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            boundary = max(text.rfind("\n\n", start, end), text.rfind(". ", start, end))
+            if boundary > start + chunk_size // 2:
+                end = boundary + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+    return chunks
+
+
+@dataclass
+class _ThreadIndex:
+    digest: str
+    chunks: list[str]
+    # Normalized dense embeddings of the chunks, one row per chunk
+    matrix: np.ndarray
+    last_used: float
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(chunk) for chunk in self.chunks)
+
+
+class AttachmentIndex:
+    """
+    Temporary in-memory vector index of large chat attachments, one per thread.
+
+    Instead of pasting a large attachment into the prompt, it is chunked and embedded
+    once and only the passages most similar to the question are used, also for the
+    follow-up questions of the thread. Indexes are evicted after attachment_index_ttl
+    seconds of inactivity and, least recently used first, when all indexes together
+    exceed attachment_index_max_mb, except for the most recently used one, so that an
+    attachment above the limit on its own is still searchable. The index lives in the
+    memory of the widget process.
+    """
+
+    _indexes: dict[str, _ThreadIndex] = {}
+
+    def __init__(self, dense_client: Optional[AsyncDenseClient] = None):
+        self._settings = get_settings()
+        self.dense_client = dense_client or AsyncDenseClient()
+
+    def _evict(self):
+        """Drop expired indexes and the least recently used ones above the size limit."""
+        now = time.monotonic()
+        for thread_id in [
+            thread_id
+            for thread_id, index in self._indexes.items()
+            if now - index.last_used > self._settings.attachment_index_ttl
+        ]:
+            del self._indexes[thread_id]
+
+        max_bytes = self._settings.attachment_index_max_mb * 1024**2
+        by_last_use = sorted(self._indexes.items(), key=lambda item: item[1].last_used)
+        total = sum(index.nbytes for index in self._indexes.values())
+        # The most recently used index stays, even if it exceeds the limit on its own
+        for thread_id, index in by_last_use[:-1]:
+            if total <= max_bytes:
+                break
+            del self._indexes[thread_id]
+            total -= index.nbytes
+
+    async def _embed(self, texts: list[str]) -> np.ndarray:
+        batch_size = self._settings.attachment_index_batch_size
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            vectors.extend(
+                await self.dense_client.calc_dense_embeddings(
+                    texts=texts[i : i + batch_size]
+                )
+            )
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    async def add(self, thread_id: str, digest: str, text: str):
+        """Chunk and embed an attachment as the index of the thread (replacing an older one)."""
+        current = self._indexes.get(thread_id)
+        if current is not None and current.digest == digest:
+            current.last_used = time.monotonic()
+            return
+
+        chunks = split_text(
+            text,
+            self._settings.attachment_index_chunk_size,
+            self._settings.attachment_index_chunk_overlap,
+        )
+        if not chunks:
+            return
+
+        self._indexes[thread_id] = _ThreadIndex(
+            digest=digest,
+            chunks=chunks,
+            matrix=await self._embed(chunks),
+            last_used=time.monotonic(),
+        )
+        print(f"Indexed attachment of thread {thread_id} in {len(chunks)} chunks")
+        # Makes room among the other threads, the new index is the most recently used
+        self._evict()
+
+    async def search(self, thread_id: str, question: str) -> Optional[list[str]]:
+        """Return the top-k passages of the thread's attachment, None if there is no index."""
+        self._evict()
+        index = self._indexes.get(thread_id)
+        if index is None:
+            return None
+
+        query = (await self._embed([question]))[0]
+        scores = index.matrix @ query
+
+        top_k = min(self._settings.attachment_index_top_k, len(index.chunks))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        # Keep document order so that neighbouring passages read naturally
+        best = np.sort(best)
+
+        index.last_used = time.monotonic()
+        return [index.chunks[i] for i in best]
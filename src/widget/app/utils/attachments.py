@@ -0,0 +1,28 @@
+import base64
+import hashlib
+
+
+def decode_data_url(data_url: str) -> tuple[bytes, str, str]:
+    """
+    Decode a base64 data URL sent by the widget.
+
+    This is CPU bound for large files and meant to be run in a worker thread.
+
+    Returns:
+        tuple[bytes, str, str]: The raw file bytes, their sha256 hex digest and the content type.
+    """
+    header, _, base64_str = data_url.partition(",")
+    if not base64_str:
+        header, base64_str = "", header
+
+    content_type = header.removeprefix("data:").split(";")[0]
+    if not content_type:
+        content_type = "application/octet-stream"
+    raw = base64.b64decode(base64_str)
+
+    return raw, hashlib.sha256(raw).hexdigest(), content_type
+
+
+def to_data_url(raw: bytes, content_type: str) -> str:
+    """Encode file bytes as a base64 data URL."""
+    return f"data:{content_type};base64,{base64.b64encode(raw).decode('ascii')}"
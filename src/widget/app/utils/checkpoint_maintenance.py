@@ -0,0 +1,198 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.settings import get_settings
+
+
+class CheckpointMaintenance:
+    """
+    Indexes, retention and compaction of the LangGraph checkpoint collections.
+
+    The AsyncMongoDBSaver writes several checkpoints per chat turn, but only the newest
+    one is needed to continue a thread. Compaction keeps the latest checkpoints of every
+    thread and removes threads that were idle for longer than the TTL. A thread's last
+    activity is taken from the ObjectId timestamp of its newest checkpoint.
+    """
+
+    def __init__(
+        self,
+        db_client: AsyncDatabaseClient,
+        database_name: str = "checkpointing_db",
+    ):
+        self._settings = get_settings()
+        self.db_client = db_client
+        self.database_name = database_name
+
+    async def _collection(self, collection_name: str):
+        return await self.db_client.get_collection(
+            database_name=self.database_name, collection_name=collection_name
+        )
+
+    async def ensure_indexes(self):
+        """Create the compound indexes used by the checkpointer and the widget."""
+        indexes = {
+            "checkpoints_aio": [
+                [("thread_id", ASCENDING), ("_id", DESCENDING)],
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("checkpoint_id", DESCENDING),
+                ],
+            ],
+            "checkpoint_writes_aio": [
+                [
+                    ("thread_id", ASCENDING),
+                    ("checkpoint_ns", ASCENDING),
+                    ("checkpoint_id", ASCENDING),
+                ],
+            ],
+        }
+
+        for collection_name, keys_list in indexes.items():
+            collection = await self._collection(collection_name)
+            for keys in keys_list:
+                try:
+                    await collection.create_index(keys)
+                except OperationFailure as e:
+                    # An equivalent index may already exist under another name
+                    print(f"Could not create index {keys} on {collection_name}: {e}")
+
+    async def data_sizes(self) -> dict:
+        """
+        Sizes in bytes of the checkpoint collections.
+
+        "logical" is the uncompressed size of the documents, "storage" the size of the
+        collection files on disk. WiredTiger keeps the space of deleted documents in the
+        files for reuse, so the storage size only shrinks after a compact command.
+        """
+        client = await self.db_client.get_client()
+        database = client[self.database_name]
+
+        sizes = {"logical": 0, "storage": 0}
+        for collection_name in ("checkpoints_aio", "checkpoint_writes_aio"):
+            try:
+                stats = await database.command("collStats", collection_name)
+                sizes["logical"] += stats.get("size", 0)
+                sizes["storage"] += stats.get("storageSize", 0)
+            except OperationFailure:
+                pass
+
+        return sizes
+
+    async def _delete_thread(self, thread_id: str):
+        for collection_name in (
+            "checkpoints_aio",
+            "checkpoint_writes_aio",
+            "thread_messages",
+        ):
+            collection = await self._collection(collection_name)
+            await collection.delete_many({"thread_id": thread_id})
+
+        counters = await self._collection("thread_message_counters")
+        await counters.delete_one({"_id": thread_id})
+
+    async def _trim_thread(self, thread_id: str, keep_last: int) -> int:
+        """Delete all but the newest keep_last checkpoints of a thread (and their writes)."""
+        checkpoints = await self._collection("checkpoints_aio")
+        writes = await self._collection("checkpoint_writes_aio")
+
+        cursor = (
+            checkpoints.find({"thread_id": thread_id}, {"checkpoint_id": 1})
+            .sort("_id", DESCENDING)
+            .skip(keep_last)
+        )
+        old_checkpoints = await cursor.to_list(length=None)
+        if not old_checkpoints:
+            return 0
+
+        await checkpoints.delete_many(
+            {"_id": {"$in": [doc["_id"] for doc in old_checkpoints]}}
+        )
+        await writes.delete_many(
+            {
+                "thread_id": thread_id,
+                "checkpoint_id": {
+                    "$in": [doc["checkpoint_id"] for doc in old_checkpoints]
+                },
+            }
+        )
+
+        return len(old_checkpoints)
+
+    async def compact(self) -> dict:
+        """
+        Run one compaction pass.
+
+        Returns:
+            dict: Number of trimmed checkpoints and expired threads, the logical size
+                of the deleted documents and the change of the storage size in bytes.
+        """
+        keep_last = max(self._settings.checkpoint_keep_last, 1)
+        cutoff = ObjectId.from_datetime(
+            datetime.now(timezone.utc)
+            - timedelta(days=self._settings.checkpoint_thread_ttl_days)
+        )
+
+        sizes_before = await self.data_sizes()
+        checkpoints = await self._collection("checkpoints_aio")
+
+        # One entry per thread that is either idle or has too many checkpoints
+        threads = await checkpoints.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": "$thread_id",
+                        "count": {"$sum": 1},
+                        "latest": {"$max": "$_id"},
+                    }
+                },
+                {
+                    "$match": {
+                        "$or": [
+                            {"count": {"$gt": keep_last}},
+                            {"latest": {"$lt": cutoff}},
+                        ]
+                    }
+                },
+            ],
+            allowDiskUse=True,
+        )
+
+        trimmed_checkpoints = 0
+        expired_threads = 0
+        async for thread in threads:
+            if thread["latest"] < cutoff:
+                await self._delete_thread(thread["_id"])
+                expired_threads += 1
+            else:
+                trimmed_checkpoints += await self._trim_thread(thread["_id"], keep_last)
+
+        sizes_after = await self.data_sizes()
+        result = {
+            "trimmed_checkpoints": trimmed_checkpoints,
+            "expired_threads": expired_threads,
+            "logical_bytes_freed": max(
+                sizes_before["logical"] - sizes_after["logical"], 0
+            ),
+            "storage_bytes_freed": sizes_before["storage"] - sizes_after["storage"],
+        }
+        print(f"Checkpoint compaction finished: {result}")
+
+        return result
+
+    async def run_periodically(self):
+        """Compact the checkpoint collections every checkpoint_compaction_interval seconds."""
+        while True:
+            try:
+                await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error compacting checkpoints: {e}")
+
+            await asyncio.sleep(self._settings.checkpoint_compaction_interval)
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bson import ObjectId
+
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.settings import get_settings
+
+
+@dataclass
+class CollectionMetadata:
+    """Snapshot of the collections as served by the widget bootstrap endpoints."""
+
+    version: int
+    # JSON body of /get_collections and its ETag
+    body: bytes
+    etag: str
+    # Response of /process_key by collection key
+    by_key: dict[str, dict] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+class CollectionMetadataCache:
+    """
+    In-process cache of the collection and bot documents for /get_collections and
+    /process_key.
+
+    The admin service bumps a version document on every change of a collection or user.
+    The snapshot is reused until that version changed, which is checked at most every
+    collection_cache_check_interval seconds. After collection_cache_ttl seconds it is
+    rebuilt in any case, so that changes made outside the admin service show up as well.
+    """
+
+    _snapshot: Optional[CollectionMetadata] = None
+    _lock = asyncio.Lock()
+
+    def __init__(self, db_client: AsyncDatabaseClient):
+        self.db_client = db_client
+        self._settings = get_settings()
+
+    async def _load(self, version: int) -> CollectionMetadata:
+        collections = await self.db_client.get_collection(
+            database_name="admin_panel", collection_name="collections"
+        )
+        users = await self.db_client.get_collection(
+            database_name="admin_panel", collection_name="users"
+        )
+
+        bot_names = {}
+        async for user in users.find({"bot_name": {"$exists": True}}):
+            bot_names[str(user["_id"])] = user["bot_name"]
+
+        public = []
+        by_key = {}
+        async for inst in collections.find():
+            if inst.get("password") is not None:
+                by_key.setdefault(
+                    inst["password"],
+                    {
+                        "answer": "collection found",
+                        "collection_name": inst["collection_name"],
+                        "welcome_message": inst["welcome_message"],
+                        "data_source_name": inst["data_source_name"],
+                    },
+                )
+
+            inst["_id"] = str(inst["_id"])
+            if "owner_id" in inst and isinstance(inst["owner_id"], ObjectId):
+                inst["owner_id"] = str(inst["owner_id"])
+                try:
+                    inst["bot_name"] = bot_names[str(inst["owner_id"])]
+                except KeyError:
+                    continue
+                inst.pop("owner_id", None)
+            inst.pop("created_at", None)
+            inst.pop("password", None)
+            public.append(inst)
+
+        body = json.dumps(public, default=str).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        print(f"Collection metadata loaded, version {version}")
+
+        return CollectionMetadata(version=version, body=body, etag=etag, by_key=by_key)
+
+    def _is_fresh(self, snapshot: Optional[CollectionMetadata]) -> bool:
+        return (
+            snapshot is not None
+            and time.monotonic() - snapshot.checked_at
+            < self._settings.collection_cache_check_interval
+        )
+
+    async def get(self) -> CollectionMetadata:
+        """The current snapshot, reloaded if the collections changed."""
+        if self._is_fresh(CollectionMetadataCache._snapshot):
+            return CollectionMetadataCache._snapshot
+
+        async with CollectionMetadataCache._lock:
+            # Another request may have refreshed the snapshot while this one waited
+            snapshot = CollectionMetadataCache._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            version = await self.db_client.get_collections_version()
+            if (
+                snapshot is None
+                or snapshot.version != version
+                or time.monotonic() - snapshot.loaded_at
+                > self._settings.collection_cache_ttl
+            ):
+                snapshot = await self._load(version)
+            else:
+                snapshot.checked_at = time.monotonic()
+
+            CollectionMetadataCache._snapshot = snapshot
+            return snapshot
@@ -0,0 +1,126 @@
+import csv
+import io
+import re
+
+import pandas as pd
+
+
+# Characters of the file passed on if it cannot be parsed as a table
+RAW_EXCERPT_CHARS = 20000
+
+
+def read_csv(raw: bytes) -> pd.DataFrame:
+    """Read an uploaded CSV, detecting the delimiter and falling back to latin-1."""
+    head = raw[:65536].decode("utf-8", errors="ignore")
+    try:
+        delimiter = csv.Sniffer().sniff(head, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+
+    try:
+        return pd.read_csv(io.BytesIO(raw), sep=delimiter, encoding="utf-8")
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(raw), sep=delimiter, encoding="latin-1")
+
+
+def _raw_excerpt(raw: bytes) -> str:
+    """The beginning of a file that is not a readable CSV, as text."""
+    head = raw[: RAW_EXCERPT_CHARS * 4].decode("utf-8", errors="replace")
+    excerpt = head[:RAW_EXCERPT_CHARS]
+    if len(excerpt) < len(head) or len(raw) > RAW_EXCERPT_CHARS * 4:
+        excerpt += " [...]"
+
+    return "Die Datei konnte nicht als Tabelle gelesen werden. Inhalt:\n" + excerpt
+
+
+def _column_summary(series: pd.Series, top_values: int) -> str:
+    summary = (
+        f"- {series.name} ({series.dtype}): {series.notna().sum()} Werte, "
+        f"{series.nunique()} verschieden"
+    )
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        stats = series.describe()
+        summary += (
+            f", min {stats['min']:.4g}, max {stats['max']:.4g}, "
+            f"Mittelwert {stats['mean']:.4g}, Median {series.median():.4g}"
+        )
+    else:
+        counts = series.value_counts().head(top_values)
+        if not counts.empty:
+            summary += ", häufigste: " + ", ".join(
+                f"{value} ({count})" for value, count in counts.items()
+            )
+
+    return summary
+
+
+def _matching_rows(df: pd.DataFrame, question: str, max_rows: int) -> pd.DataFrame:
+    """Rows whose text columns contain one of the words of the question."""
+    words = set(re.findall(r"\w{3,}", question.lower()))
+    text_columns = df.select_dtypes(include=["object", "string"]).columns
+    if not words or text_columns.empty:
+        return df.iloc[0:0]
+
+    pattern = "|".join(re.escape(word) for word in sorted(words))
+    mask = pd.Series(False, index=df.index)
+    for column in text_columns:
+        mask |= (
+            df[column]
+            .astype("string")
+            .str.contains(pattern, case=False, regex=True, na=False)
+        )
+
+    return df[mask].head(max_rows)
+
+
+def profile_csv(
+    raw: bytes,
+    question: str,
+    sample_rows: int,
+    top_values: int,
+    max_matching_rows: int,
+) -> str:
+    """
+    Summarize a CSV file for the LLM instead of passing it on as a whole.
+
+    The summary contains the row count, the schema with per-column statistics and top
+    values, the rows matching the question and a random sample of rows. Small files are
+    passed on completely, files that cannot be parsed as a table as a truncated excerpt.
+    This is CPU bound and meant to be run in a worker thread.
+
+    Args:
+        raw (bytes): The uploaded CSV file.
+        question (str): The question of the user, used to select matching rows.
+        sample_rows (int): Number of randomly sampled rows.
+        top_values (int): Number of most frequent values per non-numeric column.
+        max_matching_rows (int): Maximum number of rows matching the question.
+
+    Returns:
+        str: The summary in German, as the rest of the prompt.
+    """
+    try:
+        df = read_csv(raw)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        print(f"CSV could not be parsed, passing on an excerpt - Error: {e}")
+        return _raw_excerpt(raw)
+
+    if len(df) <= sample_rows + max_matching_rows:
+        return f"{len(df)} Zeilen, {len(df.columns)} Spalten:\n" + df.to_csv(
+            index=False
+        )
+
+    parts = [
+        f"{len(df)} Zeilen, {len(df.columns)} Spalten.",
+        "Spalten:\n"
+        + "\n".join(_column_summary(df[column], top_values) for column in df.columns),
+    ]
+
+    matching = _matching_rows(df, question, max_matching_rows)
+    if not matching.empty:
+        parts.append("Zeilen passend zur Frage:\n" + matching.to_csv(index=True))
+
+    sample = df.sample(n=sample_rows, random_state=0).sort_index()
+    parts.append("Zufällige Stichprobe:\n" + sample.to_csv(index=True))
+
+    return "\n\n".join(parts)
@@ -0,0 +1,123 @@
+import asyncio
+from typing import AsyncIterator, Callable, Hashable, Optional
+
+from src.metrics import QUEUE_DEPTH
+
+
+class Generation:
+    """
+    The events of one answer of the WebSocket channel, kept for resuming.
+
+    Every event gets its index in the generation as sequence number. A client that lost
+    its connection follows the generation again from the first sequence number it did
+    not receive.
+    """
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.finished = False
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def publish(self, event: dict):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    def cancel(self) -> bool:
+        """Cancel the generation, False if it already finished."""
+        if self.task is None or self.task.done():
+            return False
+        self.task.cancel()
+        return True
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[tuple[int, dict]]:
+        """Yield the events from the sequence number offset on, with their number."""
+        index = max(offset, 0)
+        while True:
+            while index < len(self.events):
+                yield index, self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await self._updated.wait()
+
+
+class GenerationRegistry:
+    """
+    Runs the answers of the WebSocket channel independently of the connections.
+
+    An answer keeps running when the connection of its client drops, so that it is
+    persisted in the thread as usual, and is kept for resume_ttl seconds after it
+    finished. Cancelling a generation publishes a final event of type "cancelled".
+    """
+
+    def __init__(self, resume_ttl: float):
+        self.resume_ttl = resume_ttl
+        self._generations: dict[Hashable, Generation] = {}
+        QUEUE_DEPTH.labels(queue="generations").set_function(
+            lambda: sum(1 for g in self._generations.values() if not g.finished)
+        )
+
+    def get(self, key: Hashable) -> Optional[Generation]:
+        return self._generations.get(key)
+
+    def start(
+        self, key: Hashable, produce: Callable[[], AsyncIterator[dict]]
+    ) -> Generation:
+        """
+        Start the generation of the key, or return it if it was already started.
+
+        Args:
+            key (Hashable): Identity of the answer, e.g. thread and request ID.
+            produce (Callable): Starts the answer, an async iterator of its events.
+        """
+        generation = self._generations.get(key)
+        if generation is not None:
+            return generation
+
+        generation = self._generations[key] = Generation()
+        generation.task = asyncio.create_task(self._run(key, generation, produce))
+        generation.task.add_done_callback(
+            lambda task: self._finish(key, generation, task)
+        )
+        return generation
+
+    def _expire(self, key: Hashable, generation: Generation):
+        if self._generations.get(key) is generation:
+            del self._generations[key]
+
+    def _finish(self, key: Hashable, generation: Generation, task: asyncio.Task):
+        # Also covers a task cancelled before it started running
+        if task.cancelled():
+            generation.publish({"type": "cancelled"})
+        generation.finish()
+        asyncio.get_running_loop().call_later(
+            self.resume_ttl, self._expire, key, generation
+        )
+
+    async def _run(
+        self,
+        key: Hashable,
+        generation: Generation,
+        produce: Callable[[], AsyncIterator[dict]],
+    ):
+        try:
+            async for event in produce():
+                generation.publish(event)
+        except Exception as e:
+            print(f"Error in generation {key}: {e}")
+            generation.publish(
+                {
+                    "type": "error",
+                    "answer": "An error occurred while processing your request.",
+                    "error": str(e),
+                }
+            )
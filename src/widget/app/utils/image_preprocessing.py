@@ -0,0 +1,33 @@
+import io
+
+from PIL import Image, ImageOps
+
+from src.widget.app.utils.attachments import to_data_url
+
+
+def downscale_image(raw: bytes, max_edge: int, quality: int) -> str:
+    """
+    Downscale an image to max_edge pixels on its longest side and re-encode it as JPEG.
+
+    This is CPU bound and meant to be run in a worker thread (asyncio.to_thread).
+
+    Args:
+        raw (bytes): The original image file.
+        max_edge (int): Maximum width/height of the result in pixels.
+        quality (int): JPEG quality of the result.
+
+    Returns:
+        str: The re-encoded image as a JPEG data URL.
+    """
+    with Image.open(io.BytesIO(raw)) as image:
+        # Phone photos are often stored rotated with an EXIF orientation tag
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+
+    return to_data_url(buffer.getvalue(), "image/jpeg")
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from src.metrics import QUEUE_DEPTH
+from src.settings import get_settings
+from src.widget.app.utils.cache import LRUCache
+
+
+# Docling converter of the worker process, created once by _init_worker
+_converter = None
+
+_pending = QUEUE_DEPTH.labels(queue="pdf_conversion")
+
+
+def _init_worker():
+    """Create and warm up the Docling converter once per worker process."""
+    global _converter
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import DocumentConverter
+
+    _converter = DocumentConverter()
+    # Loads the layout and table models now instead of on the first upload
+    _converter.initialize_pipeline(InputFormat.PDF)
+
+
+def _ping() -> bool:
+    return True
+
+
+def _convert(pdf_bytes: bytes) -> str:
+    """Convert a PDF to markdown with the converter of the worker process."""
+    from docling.datamodel.base_models import DocumentStream
+
+    source = DocumentStream(name="upload.pdf", stream=io.BytesIO(pdf_bytes))
+    result = _converter.convert(source)
+    return result.document.export_to_markdown()
+
+
+class PDFConverterPool:
+    """
+    Converts PDF attachments to markdown in a dedicated process pool.
+
+    Every worker keeps a long-lived Docling converter, so the models are loaded once per
+    worker and the CPU heavy conversion does not block the event loop of the widget.
+    The markdown is cached by the sha256 of the file.
+
+    A worker that dies (e.g. killed for its memory) breaks the whole pool. The broken
+    pool is replaced by a new one and the conversion is retried once, so that only a
+    file that breaks the pool again fails, and only its own request.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _markdown: Optional[LRUCache[str]] = None
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        settings = get_settings()
+        if cls._executor is None:
+            cls._executor = ProcessPoolExecutor(
+                max_workers=settings.pdf_conversion_workers,
+                # Forking a process with running threads (event loop, torch) is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        if cls._markdown is None:
+            cls._markdown = LRUCache(max_size=settings.pdf_markdown_cache_size)
+        return cls._executor
+
+    @classmethod
+    def _reset(cls, executor: ProcessPoolExecutor):
+        """Drop a broken pool, unless a concurrent request already replaced it."""
+        if cls._executor is executor:
+            print("PDF conversion pool broken, starting a new one")
+            executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    async def start(cls):
+        """Spawn the workers and load the models ahead of the first upload."""
+        executor = cls._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, _ping)
+                for _ in range(get_settings().pdf_conversion_workers)
+            )
+        )
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    def get_cached(cls, digest: str) -> Optional[str]:
+        cls._get_executor()
+        return cls._markdown.get(digest)
+
+    @classmethod
+    async def convert(cls, digest: str, pdf_bytes: bytes) -> str:
+        """Return the markdown of a PDF, converting it in the process pool on a cache miss."""
+        markdown = cls.get_cached(digest)
+        if markdown is not None:
+            return markdown
+
+        loop = asyncio.get_running_loop()
+        _pending.inc()
+        try:
+            for attempt in range(2):
+                executor = cls._get_executor()
+                try:
+                    markdown = await loop.run_in_executor(executor, _convert, pdf_bytes)
+                    break
+                except BrokenProcessPool:
+                    cls._reset(executor)
+                    if attempt == 1:
+                        raise
+        finally:
+            _pending.dec()
+        if markdown:
+            cls._markdown.put(digest, markdown)
+
+        return markdown
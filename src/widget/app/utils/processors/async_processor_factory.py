@@ -1,3 +1,5 @@
+from typing import Optional
+
 from src.widget.app.utils.processors.async_processors import (
     AsyncProcessor,
     AsyncTXTProcessor,
@@ -9,11 +11,33 @@ from src.widget.app.utils.processors.async_processors import (
 )
 
 
+PROCESSORS: dict[str, type[AsyncProcessor]] = {
+    "pdf": AsyncPDFProcessor,
+    "txt": AsyncTXTProcessor,
+    "image": AsyncIMAGEProcessor,
+    "csv": AsyncCSVProcessor,
+    "db": AsyncDBProcessor,
+    "llm": AsyncLLMProcessor,
+}
+
+
 class AsyncProcessorFactory:
-    @staticmethod
-    async def create_processor(user_input_type: str) -> AsyncProcessor:
+    def __init__(self, processors: Optional[dict[str, AsyncProcessor]] = None):
+        """
+        Initialize the factory, optionally with shared processor instances.
+
+        Args:
+            processors (dict[str, AsyncProcessor]): Processors by user input type,
+                reused for every node execution, e.g. those of the AppContainer.
+        """
+        self.processors = processors or {}
+
+    async def create_processor(self, user_input_type: str) -> AsyncProcessor:
         """
-        Create an appropriate AsyncProcessor instance based on the user input type.
+        Return the AsyncProcessor for the user input type.
+
+        The shared processor of the type is returned if the factory has one, otherwise a
+        new instance is created.
 
         Args:
             user_input_type (str): The type of user input (e.g., 'pdf', 'txt', 'image', 'csv', 'db', 'llm').
@@ -22,15 +46,10 @@ class AsyncProcessorFactory:
             AsyncProcessor: An instance of the corresponding processor class.
 
         Raises:
-            KeyError: If the user_input_type is not recognized, processors.get() will return None, which may lead to an error if not handled by the caller.
+            KeyError: If the user_input_type is not recognized.
         """
-        processors = {
-            "pdf": AsyncPDFProcessor,
-            "txt": AsyncTXTProcessor,
-            "image": AsyncIMAGEProcessor,
-            "csv": AsyncCSVProcessor,
-            "db": AsyncDBProcessor,
-            "llm": AsyncLLMProcessor,
-        }
-
-        return processors.get(user_input_type)()
+        processor = self.processors.get(user_input_type)
+        if processor is not None:
+            return processor
+
+        return PROCESSORS[user_input_type]()
@@ -1,24 +1,68 @@
 import sys
 import os
 
-from src.settings import Settings
+from src.settings import get_settings
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
 from abc import ABC, abstractmethod
-import base64
-import tempfile
-import os
+import asyncio
+from typing import Optional
 from langchain_core.prompts import ChatPromptTemplate
-import io
-import aiofiles
+from langchain_core.messages import message_chunk_to_message
 
-from src.widget.app.utils.state import State
+from src.widget.app.utils.state import State, collect_prompt_parts
 from src.clients.async_text_client import AsyncTextModelClient
 from src.clients.async_image_client import AsyncImageModelClient
 from src.clients.async_vector_client import AsyncVectorClient
+from src.clients.async_database_client import AsyncDatabaseClient
+from src.clients.utils.exceptions import LLMBusyException
 from src.widget.app.utils.exceptions import GraphException
-from langchain_docling import DoclingLoader
+from src.widget.app.utils.cache import LRUCache
+from src.widget.app.utils.image_preprocessing import downscale_image
+from src.widget.app.utils.attachments import to_data_url
+from src.widget.app.utils.prompt_assembler import PromptAssembler
+from src.widget.app.utils.pdf_conversion import PDFConverterPool
+from src.widget.app.utils.attachment_index import AttachmentIndex
+from src.widget.app.utils.csv_profiling import profile_csv
+
+
+async def attachment_text(
+    state: State,
+    text: str,
+    prompt_assembler: PromptAssembler,
+    attachment_index: AttachmentIndex,
+) -> str:
+    """
+    Return the text of an attachment as it should go into the prompt.
+
+    Small attachments are used as a whole. Large ones are indexed for the thread and
+    only the passages relevant to the question are used. A large attachment is never
+    used as a whole: if it could not be indexed, its beginning is used instead.
+
+    Args:
+        state (State): The current state containing the attachment reference and messages.
+        text (str): The full text of the attachment.
+        prompt_assembler (PromptAssembler): Counts the tokens of the attachment.
+        attachment_index (AttachmentIndex): Index of the attachments of the threads.
+
+    Returns:
+        str: The full text or the relevant passages of the attachment.
+    """
+    max_tokens = get_settings().attachment_index_min_tokens
+    if prompt_assembler.count_tokens(text) <= max_tokens:
+        return text
+
+    digest = state["user_input_data"].removeprefix("sha256:")
+    thread_id = state.get("thread_id") or digest
+    question = state["messages"][-1].content
+
+    await attachment_index.add(thread_id, digest, text)
+    passages = await attachment_index.search(thread_id, question)
+    if not passages:
+        return prompt_assembler.truncate(text, max_tokens)
+
+    return "\n[...]\n".join(passages)
 
 
 class AsyncProcessor(ABC):
@@ -33,23 +77,52 @@ class AsyncProcessor(ABC):
             state (State): The current state containing user input and messages.
 
         Returns:
-            dict: The processed state or result.
+            dict: The state updates of the node (merged into the state by LangGraph).
+                Prompt parts go to attachment_prompt_parts (attachment nodes) or
+                retrieval_prompt_parts (database node).
         """
         pass
 
+    async def load_attachment(self, state: State) -> tuple[bytes, str]:
+        """
+        Load the uploaded file referenced in the state from the attachment store.
+
+        Returns:
+            tuple[bytes, str]: The file bytes and its content type.
+
+        Raises:
+            GraphException: If the attachment is not (or no longer) stored.
+        """
+        attachment = await self.db_client.get_attachment(state["user_input_data"])
+        if attachment is None:
+            print(f"Attachment {state['user_input_data']} not found")
+            raise GraphException
+
+        return attachment
+
 
 class AsyncLLMProcessor(AsyncProcessor):
-    def __init__(self):
+    def __init__(
+        self,
+        text_client: Optional[AsyncTextModelClient] = None,
+        prompt_assembler: Optional[PromptAssembler] = None,
+    ):
         """
         Initialize the AsyncLLMProcessor with a text model client.
 
+        Args:
+            text_client (AsyncTextModelClient): Shared client, a new one if not given.
+            prompt_assembler (PromptAssembler): Shared assembler, a new one if not given.
+
         Attributes:
             text_client (AsyncTextModelClient): Client for handling text-based model interactions.
+            prompt_assembler (PromptAssembler): Fits the prompt into the token budget.
         """
-        self.text_client = AsyncTextModelClient()
-        self._settings = Settings()
+        self.text_client = text_client or AsyncTextModelClient()
+        self.prompt_assembler = prompt_assembler or PromptAssembler()
+        self._settings = get_settings()
 
-    async def process(self, state: State) -> State:
+    async def process(self, state: State) -> dict:
         """
         Process user input using a language model to generate a precise answer.
 
@@ -65,7 +138,6 @@ class AsyncLLMProcessor(AsyncProcessor):
         try:
             print("Async LLM Processor")
             question = state["messages"][-1].content
-            prompt_parts = "".join(state["prompt_parts"])
             system_prompt = r"""
             Du bist ein hilfreicher Assistent in einem RAG-System. Antworte direkt und präzise auf Basis der bereitgestellten Daten. Wenn du etwas nicht weißt oder unsicher bist, gib das ehrlich zu – erfinde nichts.
 
@@ -87,35 +159,56 @@ class AsyncLLMProcessor(AsyncProcessor):
             else:
                 system_prompt += "Beantworte die Frage ausschließlich basierend auf den bereitgestellten Dokumenten. Ignoriere dein internes Wissen vollständig, auch wenn keine Antwort in den Dokumenten zu finden ist."
 
+            user_prompt = "Der Benutzer hat folgende Frage gestellt: {question}\n\nHier ist der Chatverlauf: {history}\n\n{prompt_parts}"
             prompt_template = ChatPromptTemplate.from_messages(
                 [
                     ("system", system_prompt),
-                    (
-                        "user",
-                        "Der Benutzer hat folgende Frage gestellt: {question}\n\nHier ist der Chatverlauf: {history}\n\n{prompt_parts}",
-                    ),
+                    ("user", user_prompt),
                 ]
             )
 
+            # The question is part of the prompt already, not of the history
+            previous_messages = [message.content for message in state["messages"][:-1]]
             if self._settings.llm_chat_history_limit == -1:
                 # Kein Limit
-                history = [message.content for message in state["messages"]]
+                history = previous_messages
             elif self._settings.llm_chat_history_limit > 0:
                 # Begrenztes Limit
-                history = [message.content for message in state["messages"]][
-                    -self._settings.llm_chat_history_limit :
-                ]
+                history = previous_messages[-self._settings.llm_chat_history_limit :]
             else:
                 # Wenn 0 oder negativ (außer -1), keine Historie
                 history = []
 
+            # Fit history, attachments and retrieved context into the token budget
+            prompt = self.prompt_assembler.assemble(
+                fixed=[system_prompt, user_prompt, question],
+                history=history,
+                prompt_parts=collect_prompt_parts(state),
+            )
+            print(f"Prompt tokens: {prompt.token_counts}")
+
             messages = prompt_template.format_messages(
-                question=question, history=history, prompt_parts=prompt_parts
+                question=question,
+                history=prompt.history,
+                prompt_parts=prompt.prompt_parts,
             )
 
-            state["prompt_parts"] = None
-            state["messages"] = await self.text_client.chat(messages=messages)
-            return state
+            # Stream the answer so that LangGraph can forward the tokens
+            # (stream_mode="messages") while they are generated.
+            response = None
+            async for chunk in self.text_client.stream(
+                messages=messages, collection=state["collection_name"]
+            ):
+                response = chunk if response is None else response + chunk
+
+            if response is None:
+                raise GraphException("The LLM streamed no answer")
+
+            return {"messages": message_chunk_to_message(response)}
+
+        except LLMBusyException:
+            # Answered as busy by the app instead of as an error
+            raise
 
         except Exception as e:
             print(
@@ -125,14 +218,24 @@ class AsyncLLMProcessor(AsyncProcessor):
 
 
 class AsyncDBProcessor(AsyncProcessor):
-    def __init__(self):
+    def __init__(
+        self,
+        vector_client: Optional[AsyncVectorClient] = None,
+        attachment_index: Optional[AttachmentIndex] = None,
+    ):
         """
         Initialize the AsyncDBProcessor with a vector client.
 
+        Args:
+            vector_client (AsyncVectorClient): Shared client, a new one if not given.
+            attachment_index (AttachmentIndex): Shared index, a new one if not given.
+
         Attributes:
             vector_client (AsyncVectorClient): Client for vector database operations.
+            attachment_index (AttachmentIndex): Index of attachments uploaded earlier in the thread.
         """
-        self.vector_client = AsyncVectorClient()
+        self.vector_client = vector_client or AsyncVectorClient()
+        self.attachment_index = attachment_index or AttachmentIndex()
 
     async def process(self, state: State) -> dict:
         """
@@ -142,30 +245,54 @@ class AsyncDBProcessor(AsyncProcessor):
             state (State): The current state containing collection name and messages.
 
         Returns:
-            dict: The updated state with vector database data or empty dict if Basiswissen only should be used.
+            dict: The retrieved context as prompt parts or empty dict if nothing was found.
 
         Raises:
             GraphException: If an error occurs during database processing.
         """
         try:
             print("Async DATABASE Processor")
+            question = state["messages"][-1].content
+            prompt_parts = []
 
-            if state["collection_name"] == "Basiswissen":
-                return state
+            # Follow-up questions also use the attachment uploaded earlier in the thread
+            if state["user_input_type"] == "database" and state.get("thread_id"):
+                passages = await self.attachment_index.search(
+                    state["thread_id"], question
+                )
+                if passages:
+                    prompt_parts.append(
+                        {
+                            "kind": "attachment",
+                            "text": "Die folgenden Abschnitte aus dem zuvor hochgeladenen Dokument könnten für die Beantwortung der Frage des Benutzers relevant sein: "
+                            + "\n[...]\n".join(passages)
+                            + ".\n\n",
+                        }
+                    )
+
+            names = [state["collection_name"], *state.get("collection_names", [])]
+            collection_names = [
+                name for name in names if name and name != "Basiswissen"
+            ]
+            collection_names = list(dict.fromkeys(collection_names))
+
+            if collection_names:
+                search_results = await self.vector_client.get_relevant_context_multi(
+                    collection_names, question
+                )
+                if search_results:
+                    print(search_results)
+                    prompt_parts.append(
+                        {
+                            "kind": "context",
+                            "text": f"Die folgenden abgerufenen Informationen sind für die Beantwortung der Frage des Benutzers relevant: {search_results}.\n\n",
+                        }
+                    )
 
-            search_results = await self.vector_client.get_relevant_context(
-                state["collection_name"], state["messages"][-1].content
-            )
-            if search_results:
-                print(search_results)
-                state["vector_db_data"] = search_results
-                state["prompt_parts"] = [
-                    f"Die folgenden abgerufenen Informationen sind für die Beantwortung der Frage des Benutzers relevant: {state['vector_db_data']}.\n\n"
-                ]
-            else:
-                state["vector_db_data"] = ""
+            if not prompt_parts:
+                return {}
 
-            return state
+            return {"retrieval_prompt_parts": prompt_parts}
 
         except Exception as e:
             print(
@@ -175,52 +302,69 @@ class AsyncDBProcessor(AsyncProcessor):
 
 
 class AsyncPDFProcessor(AsyncProcessor):
-    def __init__(self):
+    def __init__(
+        self,
+        text_client: Optional[AsyncTextModelClient] = None,
+        db_client: Optional[AsyncDatabaseClient] = None,
+        prompt_assembler: Optional[PromptAssembler] = None,
+        attachment_index: Optional[AttachmentIndex] = None,
+    ):
         """
         Initialize the AsyncPDFProcessor with a text model client.
 
+        Args:
+            text_client (AsyncTextModelClient): Shared client, a new one if not given.
+            db_client (AsyncDatabaseClient): Attachment store, a new client if not given.
+            prompt_assembler (PromptAssembler): Shared assembler, a new one if not given.
+            attachment_index (AttachmentIndex): Shared index, a new one if not given.
+
         Attributes:
             text_client (AsyncTextModelClient): Client for handling text-based model interactions.
         """
-        self.text_client = AsyncTextModelClient()
+        self.text_client = text_client or AsyncTextModelClient()
+        self.db_client = db_client or AsyncDatabaseClient()
+        self.prompt_assembler = prompt_assembler or PromptAssembler()
+        self.attachment_index = attachment_index or AttachmentIndex()
 
     async def process(self, state: State) -> dict:
         """
-        Process a PDF file from base64 input, extract relevant information, and update the state.
+        Process an uploaded PDF file and extract its text.
 
         Args:
-            state (State): The current state containing base64 PDF data and messages.
+            state (State): The current state containing the PDF reference and messages.
 
         Returns:
-            dict: The updated state with extracted text from the PDF.
+            dict: The extracted text of the PDF as prompt part.
 
         Raises:
             GraphException: If an error occurs during PDF processing.
         """
         try:
             print("Async PDF Processor")
-            base64_str = state["user_input_data"].split(",")[1]
-
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_pdf_path = os.path.join(temp_dir, "temp.pdf")
-                async with aiofiles.open(temp_pdf_path, "wb") as pdf_file:
-                    decoded = base64.b64decode(base64_str)
-                    await pdf_file.write(decoded)
-                loader = DoclingLoader(file_path=temp_pdf_path)
-                markdown_chunks = loader.alazy_load()
-                markdown = ""
-                async for markdown_chunk in markdown_chunks:
-                    markdown += str(markdown_chunk.page_content)
-
-                if markdown:
-                    state["user_input_data"] = markdown
-                    state["prompt_parts"] = [
-                        f"Das folgende hochgeladene PDF-Dokument könnte für die Beantwortung der Frage des Benutzers relevant sein: {state['user_input_data']}.\n\n"
-                    ]
-                else:
-                    state["user_input_data"] = ""
-
-                return state
+            digest = state["user_input_data"].removeprefix("sha256:")
+
+            markdown = PDFConverterPool.get_cached(digest)
+            if markdown is not None:
+                print(f"PDF markdown cache hit for {digest[:12]}")
+            else:
+                pdf_bytes, _ = await self.load_attachment(state)
+                markdown = await PDFConverterPool.convert(digest, pdf_bytes)
+
+            if not markdown:
+                return {}
+
+            markdown = await attachment_text(
+                state, markdown, self.prompt_assembler, self.attachment_index
+            )
+
+            return {
+                "attachment_prompt_parts": [
+                    {
+                        "kind": "attachment",
+                        "text": f"Das folgende hochgeladene PDF-Dokument könnte für die Beantwortung der Frage des Benutzers relevant sein: {markdown}.\n\n",
+                    }
+                ]
+            }
 
         except Exception as e:
             print(
@@ -230,43 +374,63 @@ class AsyncPDFProcessor(AsyncProcessor):
 
 
 class AsyncTXTProcessor(AsyncProcessor):
-    def __init__(self):
+    def __init__(
+        self,
+        text_client: Optional[AsyncTextModelClient] = None,
+        db_client: Optional[AsyncDatabaseClient] = None,
+        prompt_assembler: Optional[PromptAssembler] = None,
+        attachment_index: Optional[AttachmentIndex] = None,
+    ):
         """
         Initialize the AsyncTXTProcessor with a text model client.
 
+        Args:
+            text_client (AsyncTextModelClient): Shared client, a new one if not given.
+            db_client (AsyncDatabaseClient): Attachment store, a new client if not given.
+            prompt_assembler (PromptAssembler): Shared assembler, a new one if not given.
+            attachment_index (AttachmentIndex): Shared index, a new one if not given.
+
         Attributes:
             text_client (AsyncTextModelClient): Client for handling text-based model interactions.
         """
-        self.text_client = AsyncTextModelClient()
+        self.text_client = text_client or AsyncTextModelClient()
+        self.db_client = db_client or AsyncDatabaseClient()
+        self.prompt_assembler = prompt_assembler or PromptAssembler()
+        self.attachment_index = attachment_index or AttachmentIndex()
 
     async def process(self, state: State) -> dict:
         """
-        Process a TXT file from base64 input, extract relevant information, and update the state.
+        Process an uploaded TXT file and extract its text.
 
         Args:
-            state (State): The current state containing base64 TXT data and messages.
+            state (State): The current state containing the TXT reference and messages.
 
         Returns:
-            dict: The updated state with extracted text from the TXT file.
+            dict: The text of the TXT file as prompt part.
 
         Raises:
             GraphException: If an error occurs during TXT processing.
         """
         try:
             print("Async TXT Processor")
-            base64_str = state["user_input_data"].split(",")[1]
-            decoded_bytes = base64.b64decode(base64_str)
+            decoded_bytes, _ = await self.load_attachment(state)
             text = decoded_bytes.decode("utf-8")
 
-            if text:
-                state["user_input_data"] = text
-                state["prompt_parts"] = [
-                    f"Die folgende hochgeladene txt-Datei könnte für die Beantwortung der Frage des Benutzers relevant sein: {state['user_input_data']}.\n\n"
-                ]
-            else:
-                state["user_input_data"] = ""
+            if not text:
+                return {}
 
-            return state
+            text = await attachment_text(
+                state, text, self.prompt_assembler, self.attachment_index
+            )
+
+            return {
+                "attachment_prompt_parts": [
+                    {
+                        "kind": "attachment",
+                        "text": f"Die folgende hochgeladene txt-Datei könnte für die Beantwortung der Frage des Benutzers relevant sein: {text}.\n\n",
+                    }
+                ]
+            }
 
         except Exception as e:
             print(
@@ -276,43 +440,62 @@ class AsyncTXTProcessor(AsyncProcessor):
 
 
 class AsyncCSVProcessor(AsyncProcessor):
-    def __init__(self):
+    def __init__(
+        self,
+        text_client: Optional[AsyncTextModelClient] = None,
+        db_client: Optional[AsyncDatabaseClient] = None,
+    ):
         """
         Initialize the AsyncCSVProcessor with a text model client.
 
+        Args:
+            text_client (AsyncTextModelClient): Shared client, a new one if not given.
+            db_client (AsyncDatabaseClient): Attachment store, a new client if not given.
+
         Attributes:
             text_client (AsyncTextModelClient): Client for handling text-based model interactions.
         """
-        self.text_client = AsyncTextModelClient()
+        self.text_client = text_client or AsyncTextModelClient()
+        self.db_client = db_client or AsyncDatabaseClient()
+        self._settings = get_settings()
 
     async def process(self, state: State) -> dict:
         """
-        Process a CSV file from base64 input, analyze it with a pandas agent, and update the state.
+        Profile an uploaded CSV file and pass the compact summary on.
 
         Args:
-            state (State): The current state containing base64 CSV data and messages.
+            state (State): The current state containing the CSV reference and messages.
 
         Returns:
-            dict: The updated state with the agent's response from the CSV analysis.
+            dict: The profile of the CSV file as prompt part.
 
         Raises:
             GraphException: If an error occurs during CSV processing.
         """
         try:
             print("async CSV Processor")
-            base64_str = state["user_input_data"].split(",")[1]
-            decoded_bytes = base64.b64decode(base64_str)
-            csv = io.StringIO(decoded_bytes.decode("utf-8"))
-            value = csv.getvalue()
-            if value:
-                print("#", value)
-                state["user_input_data"] = value
-                state["prompt_parts"] = [
-                    f"Basierend auf der hochgeladenen csv-Datei sind die folgenden Informationen für die Beantwortung der Frage des Benutzers relevant: {state['user_input_data']}.\n\n"
+            decoded_bytes, _ = await self.load_attachment(state)
+            if not decoded_bytes.strip():
+                return {}
+
+            value = await asyncio.to_thread(
+                profile_csv,
+                decoded_bytes,
+                state["messages"][-1].content,
+                self._settings.csv_sample_rows,
+                self._settings.csv_top_values,
+                self._settings.csv_max_matching_rows,
+            )
+
+            print("#", value)
+            return {
+                "attachment_prompt_parts": [
+                    {
+                        "kind": "attachment",
+                        "text": f"Basierend auf der hochgeladenen csv-Datei sind die folgenden Informationen für die Beantwortung der Frage des Benutzers relevant: {value}.\n\n",
+                    }
                 ]
-            else:
-                state["user_input_data"] = ""
-            return state
+            }
 
         except Exception as e:
             print(
@@ -322,24 +505,77 @@ class AsyncCSVProcessor(AsyncProcessor):
 
 
 class AsyncIMAGEProcessor(AsyncProcessor):
-    def __init__(self):
+    # Image descriptions by sha256 of the uploaded file, shared by all requests
+    _descriptions: LRUCache[str] = LRUCache(
+        max_size=get_settings().image_description_cache_size
+    )
+
+    def __init__(
+        self,
+        image_client: Optional[AsyncImageModelClient] = None,
+        db_client: Optional[AsyncDatabaseClient] = None,
+    ):
         """
         Initialize the AsyncIMAGEProcessor with an image model client.
 
+        Args:
+            image_client (AsyncImageModelClient): Shared client, a new one if not given.
+            db_client (AsyncDatabaseClient): Attachment store, a new client if not given.
+
         Attributes:
             image_client (AsyncImageModelClient): Client for handling image-to-text conversions.
         """
-        self.image_client = AsyncImageModelClient()
+        self.image_client = image_client or AsyncImageModelClient()
+        self.db_client = db_client or AsyncDatabaseClient()
+        self._settings = get_settings()
+
+    async def describe_image(
+        self, raw: bytes, digest: str, content_type: str, collection: str = ""
+    ) -> str:
+        """
+        Describe an image with the vision model and cache the description by content hash.
+
+        The image is decoded, downscaled and re-encoded in a worker thread so that large
+        phone photos neither block the event loop nor inflate the request to the model.
+
+        Args:
+            raw (bytes): The uploaded image file.
+            digest (str): sha256 of the file, used as cache key.
+            content_type (str): The content type of the upload.
+            collection (str): The collection of the chat, for the LLM scheduler.
+
+        Returns:
+            str: The description of the image.
+        """
+        data_url = to_data_url(raw, content_type)
+        try:
+            data_url = await asyncio.to_thread(
+                downscale_image,
+                raw,
+                self._settings.image_max_edge,
+                self._settings.image_jpeg_quality,
+            )
+        except Exception as e:
+            # Formats PIL cannot read are forwarded unchanged
+            print(f"Could not preprocess image, sending original - Error: {e}")
+
+        description = await self.image_client.image_to_text(
+            base64_str=data_url, collection=collection
+        )
+        if description:
+            self._descriptions.put(digest, description)
+
+        return description
 
     async def process(self, state: State) -> dict:
         """
-        Process an image from the state and convert it to text, updating the state.
+        Describe an uploaded image, reusing the description of identical uploads.
 
         Args:
-            state (State): The current state containing image data.
+            state (State): The current state containing the image reference.
 
         Returns:
-            dict: The updated state with text extracted from the image.
+            dict: The description of the image as prompt part.
 
         Raises:
             GraphException: If an error occurs during image processing.
@@ -347,19 +583,31 @@ class AsyncIMAGEProcessor(AsyncProcessor):
         try:
             print("async IMAGE Processor")
 
-            base64_str = state["user_input_data"]
+            digest = state["user_input_data"].removeprefix("sha256:")
 
-            response = await self.image_client.image_to_text(base64_str=base64_str)
+            response = self._descriptions.get(digest)
+            if response is not None:
+                print(f"Image description cache hit for {digest[:12]}")
+            else:
+                raw, content_type = await self.load_attachment(state)
+                response = await self.describe_image(
+                    raw, digest, content_type, state["collection_name"]
+                )
 
-            if response:
-                state["user_input_data"] = response
-                state["prompt_parts"] = [
-                    f"Basierend auf dem hochgeladenen Bild sind die folgenden Informationen für die Beantwortung der Frage des Benutzers relevant: {state['user_input_data']}.\n\n"
+            if not response:
+                return {}
+
+            return {
+                "attachment_prompt_parts": [
+                    {
+                        "kind": "attachment",
+                        "text": f"Basierend auf dem hochgeladenen Bild sind die folgenden Informationen für die Beantwortung der Frage des Benutzers relevant: {response}.\n\n",
+                    }
                 ]
-            else:
-                state["user_input_data"] = ""
+            }
 
-            return state
+        except LLMBusyException:
+            raise
 
         except Exception as e:
             print(
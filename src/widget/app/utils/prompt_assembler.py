@@ -0,0 +1,185 @@
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.settings import get_settings
+
+
+# Order in which unused budget of one section is handed to the others
+SECTION_PRIORITY = ("context", "attachment", "history")
+# Seconds until loading the encoding is retried after it failed
+ENCODING_RETRY_INTERVAL = 300
+
+_encoding = None
+_encoding_retry_at = 0.0
+
+
+def load_encoding():
+    """
+    The tiktoken encoding used for counting, None if it cannot be loaded.
+
+    tiktoken downloads the encoding on first use unless it is in TIKTOKEN_CACHE_DIR
+    (prefetched in Dockerfile.widget). The app loads it at startup, so that no request
+    waits for the download. A failure is not kept: loading is retried after
+    ENCODING_RETRY_INTERVAL seconds, tokens are estimated from characters until then.
+    """
+    global _encoding, _encoding_retry_at
+
+    if _encoding is not None or time.monotonic() < _encoding_retry_at:
+        return _encoding
+
+    try:
+        import tiktoken
+
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        _encoding_retry_at = time.monotonic() + ENCODING_RETRY_INTERVAL
+        print(f"tiktoken not available, estimating tokens from characters - Error: {e}")
+
+    return _encoding
+
+
+@dataclass
+class AssembledPrompt:
+    history: list[str]
+    prompt_parts: str
+    token_counts: dict[str, int] = field(default_factory=dict)
+
+
+class PromptAssembler:
+    """
+    Fits chat history, retrieved context and attachments into a token budget.
+
+    Tokens are counted locally with tiktoken (cl100k_base). It does not match the
+    tokenizer of the served model exactly, which is why the budget should leave some
+    headroom to the context window of the model.
+
+    The budget that remains after the system prompt and the question is split by the
+    configured shares. The history must not contain the question again, it is already
+    counted as fixed text. Budget a section does not need is handed to the other sections.
+    Attachments and retrieved context are cut at the end, history is trimmed from the
+    oldest message on.
+    """
+
+    def __init__(self):
+        self._settings = get_settings()
+
+    @property
+    def _encoding(self):
+        return load_encoding()
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            return len(text) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is None:
+            return text[: max_tokens * 4]
+
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens]) + " [...]"
+
+    def _allocate(self, needs: dict[str, int], available: int) -> dict[str, int]:
+        shares = {
+            "history": self._settings.prompt_history_share,
+            "context": self._settings.prompt_context_share,
+            "attachment": self._settings.prompt_attachment_share,
+        }
+
+        allocation = {
+            section: min(need, int(available * shares[section]))
+            for section, need in needs.items()
+        }
+
+        leftover = available - sum(allocation.values())
+        for section in SECTION_PRIORITY:
+            extra = min(needs[section] - allocation[section], max(leftover, 0))
+            allocation[section] += extra
+            leftover -= extra
+
+        return allocation
+
+    def _fit_history(self, history: list[str], budget: int) -> list[str]:
+        fitted = []
+        for message in reversed(history):
+            tokens = self.count_tokens(message)
+            if tokens > budget:
+                break
+            fitted.append(message)
+            budget -= tokens
+
+        return list(reversed(fitted))
+
+    def _fit_parts(self, texts: list[str], budget: int) -> list[str]:
+        fitted = []
+        for text in texts:
+            if budget <= 0:
+                break
+            truncated = self.truncate(text, budget)
+            if truncated != text:
+                truncated += "\n\n"
+            fitted.append(truncated)
+            budget -= self.count_tokens(truncated)
+
+        return fitted
+
+    def assemble(
+        self,
+        fixed: list[str],
+        history: list[str],
+        prompt_parts: list[dict],
+        budget: Optional[int] = None,
+    ) -> AssembledPrompt:
+        """
+        Fit history and prompt parts into the budget.
+
+        Args:
+            fixed (list[str]): Text that is always sent (system prompt, question, template).
+            history (list[str]): Chat history before the question, oldest message first.
+            prompt_parts (list[dict]): Prompt parts of the nodes ({"kind": ..., "text": ...}).
+            budget (int): Prompt token budget, defaults to prompt_token_budget.
+
+        Returns:
+            AssembledPrompt: The fitted history, the joined prompt parts and the token counts.
+        """
+        budget = budget or self._settings.prompt_token_budget
+        fixed_tokens = sum(self.count_tokens(text) for text in fixed)
+
+        texts = {"context": [], "attachment": []}
+        for part in prompt_parts:
+            texts["attachment" if part["kind"] != "context" else "context"].append(
+                part["text"]
+            )
+
+        needs = {
+            "history": sum(self.count_tokens(message) for message in history),
+            "context": sum(self.count_tokens(text) for text in texts["context"]),
+            "attachment": sum(self.count_tokens(text) for text in texts["attachment"]),
+        }
+        allocation = self._allocate(needs, max(budget - fixed_tokens, 0))
+
+        fitted_history = self._fit_history(history, allocation["history"])
+        fitted_parts = self._fit_parts(
+            texts["attachment"], allocation["attachment"]
+        ) + self._fit_parts(texts["context"], allocation["context"])
+
+        history_tokens = sum(self.count_tokens(message) for message in fitted_history)
+        parts_tokens = sum(self.count_tokens(text) for text in fitted_parts)
+        token_counts = {
+            "fixed": fixed_tokens,
+            "history": history_tokens,
+            "prompt_parts": parts_tokens,
+            "total": fixed_tokens + history_tokens + parts_tokens,
+            "dropped": max(sum(needs.values()) - history_tokens - parts_tokens, 0),
+        }
+
+        return AssembledPrompt(
+            history=fitted_history,
+            prompt_parts="".join(fitted_parts),
+            token_counts=token_counts,
+        )
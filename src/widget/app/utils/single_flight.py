@@ -0,0 +1,130 @@
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Hashable, Optional
+
+from src.metrics import COALESCED_REQUESTS, QUEUE_DEPTH
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation insensitive form of a question."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").casefold()
+
+
+class Flight:
+    """
+    One shared execution: the tokens produced so far and the final answer.
+
+    Subscribers replay the tokens from the first one and then follow the new ones, so a
+    request joining late still receives the complete answer. When the last subscriber
+    leaves before the execution finished, e.g. because its answer was cancelled, the
+    execution is cancelled as nobody is waiting for it anymore.
+    """
+
+    def __init__(self):
+        self.tokens: list[str] = []
+        self.answer: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.finished = False
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+        # Set when the execution was cancelled for lack of subscribers
+        self.abandoned = False
+        self._updated = asyncio.Event()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def publish(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.answer = "".join(self.tokens)
+        self.error = error
+        self.finished = True
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield all tokens of the flight, raise its error if the execution failed."""
+        self.subscribers += 1
+        try:
+            index = 0
+            while True:
+                while index < len(self.tokens):
+                    yield self.tokens[index]
+                    index += 1
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._updated.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished and self.task is not None:
+                self.abandoned = True
+                self.task.cancel()
+
+    async def result(self) -> str:
+        async for _ in self.subscribe():
+            pass
+        return self.answer
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests into one execution.
+
+    The first request of a key starts the execution in its own task and every request
+    with the same key arriving before it finished subscribes to the same Flight. The
+    task is independent of the requests, so a disconnecting client does not abort the
+    answer of the others. It is cancelled once all of its requests left.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, Flight] = {}
+        self._tasks: set[asyncio.Task] = set()
+        QUEUE_DEPTH.labels(queue="single_flight").set_function(
+            lambda: len(self._flights)
+        )
+
+    def join(
+        self, key: Hashable, produce: Callable[[], AsyncIterator[str]]
+    ) -> tuple[Flight, bool]:
+        """
+        Return the flight of the key and whether this request started it.
+
+        Args:
+            key (Hashable): Identity of the request.
+            produce (Callable): Starts the execution, an async iterator of the tokens.
+        """
+        flight = self._flights.get(key)
+        # An abandoned flight is about to end cancelled, it is not joined anymore
+        if flight is not None and not flight.abandoned:
+            COALESCED_REQUESTS.labels(role="follower").inc()
+            return flight, False
+
+        COALESCED_REQUESTS.labels(role="leader").inc()
+        flight = self._flights[key] = Flight()
+        task = flight.task = asyncio.create_task(self._run(key, flight, produce))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight, True
+
+    async def _run(
+        self, key: Hashable, flight: Flight, produce: Callable[[], AsyncIterator[str]]
+    ):
+        error = None
+        try:
+            async for token in produce():
+                flight.publish(token)
+        except Exception as e:
+            error = e
+        except asyncio.CancelledError:
+            error = RuntimeError("The shared execution was cancelled")
+            raise
+        finally:
+            # New requests start a new execution from here on
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.finish(error)
@@ -1,20 +1,36 @@
+from langgraph.channels import UntrackedValue
 from langgraph.graph.message import add_messages
-from typing import Annotated, Union
+from typing import Annotated
 from typing_extensions import TypedDict
 
 
-def add_prompt_parts(
-    current_list: list[str], new_value: Union[list[str], None]
-) -> list[str]:
-    if new_value is None:
-        return []
-    return current_list + new_value
+# Order of the prompt parts in the prompt, independent of which node finished first
+PROMPT_PART_ORDER = {"attachment": 0, "context": 1}
 
 
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     user_input_type: str = "empty"
+    # Reference ("sha256:<digest>") to the uploaded file in the attachment store, the
+    # file itself is never part of the state so that it is not written to every checkpoint
     user_input_data: str = ""
-    vector_db_data: str = ""
     collection_name: str = ""
-    prompt_parts: Annotated[list[str], add_prompt_parts]
+    # Additional collections to search together with collection_name
+    collection_names: list[str]
+    thread_id: str = ""
+    # Prompt parts for the llm node: {"kind": "attachment" | "context", "text": str}.
+    # One channel per writer, as the attachment and database nodes run in the same step.
+    # Untracked channels are never part of a checkpoint and start empty in every turn
+    attachment_prompt_parts: Annotated[list[dict], UntrackedValue]
+    retrieval_prompt_parts: Annotated[list[dict], UntrackedValue]
+
+
+def collect_prompt_parts(state: State) -> list[dict]:
+    """The prompt parts of the turn, in prompt order."""
+    parts = state.get("attachment_prompt_parts", []) + state.get(
+        "retrieval_prompt_parts", []
+    )
+    return sorted(
+        parts,
+        key=lambda part: PROMPT_PART_ORDER.get(part["kind"], len(PROMPT_PART_ORDER)),
+    )
@@ -0,0 +1,31 @@
+from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
+
+from src.metrics import MONGO_SECONDS, timed
+from src.tracing import set_attribute, traced
+
+
+class TracedAsyncMongoDBSaver(AsyncMongoDBSaver):
+    """AsyncMongoDBSaver recording its reads and writes as spans and latency metrics."""
+
+    @traced("checkpoint.get_tuple", kind="client")
+    @timed(MONGO_SECONDS, operation="checkpoint_get_tuple")
+    async def aget_tuple(self, config):
+        return await super().aget_tuple(config)
+
+    @traced("checkpoint.list", kind="client")
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for checkpoint_tuple in super().alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield checkpoint_tuple
+
+    @traced("checkpoint.put", kind="client")
+    @timed(MONGO_SECONDS, operation="checkpoint_put")
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+    @traced("checkpoint.put_writes", kind="client")
+    @timed(MONGO_SECONDS, operation="checkpoint_put_writes")
+    async def aput_writes(self, config, writes, task_id, *args, **kwargs):
+        set_attribute("writes", len(writes))
+        return await super().aput_writes(config, writes, task_id, *args, **kwargs)
@@ -1,40 +1,86 @@
 import sys
 import os
+import asyncio
+import json
+import time
 from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
 )
 
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from src.widget.app.async_graph import AsyncGraph
-from bson import ObjectId
+from src.widget.frontend.static_assets import PrecompressedStaticFiles, load_manifest
+from src.widget.app.container import AppContainer
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
 
 
 from src.clients.async_database_client import AsyncDatabaseClient
+from src.clients.async_answer_cache import AnswerCacheKey, AsyncAnswerCache
+from src.clients.async_vector_client import AsyncVectorContextManager
+from src.clients.utils.exceptions import LLMBusyException
+from src.widget.app.utils.checkpoint_maintenance import CheckpointMaintenance
+from src.widget.app.utils.collection_metadata import CollectionMetadataCache
+from src.widget.app.utils.generations import Generation, GenerationRegistry
+from src.widget.app.utils.attachments import decode_data_url
+from src.widget.app.utils.pdf_conversion import PDFConverterPool
+from src.widget.app.utils.prompt_assembler import load_encoding
+from src.widget.app.utils.single_flight import SingleFlight, normalize_question
+from src.settings import get_settings
+from src import metrics, tracing
 
 # Global variables
+CONTAINER = None
 GRAPH = None
 DB_CLIENT = None
+ANSWER_CACHE = None
+DENSE_CLIENT = None
+COLLECTION_METADATA = None
+SINGLE_FLIGHT = SingleFlight()
+
+_settings = get_settings()
+
+# Answers of the WebSocket channel, resumable after a dropped connection
+GENERATIONS = GenerationRegistry(_settings.ws_resume_ttl)
 
 
 # Lifespan handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
-    global GRAPH, DB_CLIENT
-    GRAPH = await AsyncGraph().build_graph()
-    DB_CLIENT = AsyncDatabaseClient()
+    global CONTAINER, GRAPH, DB_CLIENT, ANSWER_CACHE, DENSE_CLIENT, COLLECTION_METADATA
+    AsyncVectorContextManager.require_server_backend("widget")
+    CONTAINER = AppContainer.create()
+    GRAPH = await AsyncGraph(CONTAINER).build_graph()
+    DB_CLIENT = CONTAINER.db_client
     await DB_CLIENT.get_client()
+    await DB_CLIENT.ensure_indexes()
+    COLLECTION_METADATA = CollectionMetadataCache(DB_CLIENT)
+    ANSWER_CACHE = AsyncAnswerCache()
+    DENSE_CLIENT = CONTAINER.dense_client
+
+    checkpoint_maintenance = CheckpointMaintenance(DB_CLIENT)
+    await checkpoint_maintenance.ensure_indexes()
+    compaction_task = asyncio.create_task(checkpoint_maintenance.run_periodically())
+
+    await PDFConverterPool.start()
+    # Load the token counting encoding before the first request needs it
+    await asyncio.to_thread(load_encoding)
 
     yield
 
+    compaction_task.cancel()
+    PDFConverterPool.shutdown()
+
     if DB_CLIENT is not None:
         await AsyncDatabaseClient.close_client()
+    await AsyncVectorContextManager.close_local_client()
+    await CONTAINER.aclose()
 
 
 # Initialize FastAPI app with lifespan
@@ -49,9 +95,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Static files and templates
-app.mount("/static", StaticFiles(directory="src/widget/frontend/static"), name="static")
+# Traces of the requests, with TRACE_DEBUG_ROUTES the waterfall of a request is at
+# /debug/trace/{trace_id}
+tracing.install(
+    app,
+    service_name="widget",
+    remote_services=[
+        f"{_settings.dense.url}:{_settings.dense.port}",
+        f"{_settings.sparse.url}:{_settings.sparse.port}",
+    ],
+)
+metrics.install(app)
+
+_answers_in_flight = metrics.QUEUE_DEPTH.labels(queue="answers")
+_open_sockets = metrics.QUEUE_DEPTH.labels(queue="websockets")
+
+# Static files and templates, the built assets of build_static.py if there are any
+STATIC_DIR = "src/widget/frontend/static"
+ASSET_MANIFEST = load_manifest(STATIC_DIR)
+app.mount(
+    "/static",
+    PrecompressedStaticFiles(directory=STATIC_DIR, manifest=ASSET_MANIFEST),
+    name="static",
+)
 templates = Jinja2Templates(directory="src/widget/frontend/templates")
+templates.env.globals["asset"] = lambda path: ASSET_MANIFEST.get(path, path)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -72,48 +140,279 @@ async def home(request: Request):
     )
 
 
+# Answer when the LLM scheduler found no free request within the queue timeout
+BUSY_ANSWER = "The assistant is very busy right now. Please try again in a moment."
+
+TYPE_PREFIXES = {
+    "data:image": "image",
+    "data:text/csv": "csv",
+    "data:text/plain": "txt",
+    "data:application/pdf": "pdf",
+}
+
+
+def build_graph_input(data: dict) -> tuple[dict, dict]:
+    """Build the graph input and config from the JSON body of a chat request."""
+    user_message = data.get("message", "")
+    user_input_data = data.get("data", "")
+    collection = data.get("collection", "")
+    # Optional further collections to answer from, e.g. general exam regulations
+    collections = data.get("collections") or []
+    thread_id = data.get("thread_id")
+
+    config = {"configurable": {"thread_id": thread_id}}
+
+    if user_input_data == "":
+        user_input_type = "database"
+    else:
+        for prefix, user_input_type in TYPE_PREFIXES.items():
+            if user_input_data.startswith(prefix):
+                break
+
+    graph_input = {
+        "messages": user_message,
+        "user_input_type": user_input_type,
+        "user_input_data": user_input_data,
+        "collection_name": collection,
+        "collection_names": [name for name in collections if name != collection],
+        "thread_id": thread_id,
+    }
+
+    return graph_input, config
+
+
+async def store_attachment(graph_input: dict) -> dict:
+    """
+    Move an uploaded file into the attachment store and keep only its reference in the
+    graph input, so that the file is not serialized into every checkpoint of the turn.
+    """
+    if graph_input["user_input_type"] == "database":
+        return graph_input
+
+    raw, digest, content_type = await asyncio.to_thread(
+        decode_data_url, graph_input["user_input_data"]
+    )
+    graph_input["user_input_data"] = await DB_CLIENT.put_attachment(
+        digest, raw, content_type
+    )
+
+    return graph_input
+
+
+async def log_turn(graph_input: dict, config: dict, answer: str) -> None:
+    """Append the question and answer of a finished turn to the thread's message log."""
+    try:
+        await DB_CLIENT.append_messages(
+            thread_id=config["configurable"]["thread_id"],
+            messages=[graph_input["messages"], answer],
+        )
+    except Exception as e:
+        print(f"Error writing the message log: {e}")
+
+
+async def is_shareable(graph_input: dict, config: dict) -> bool:
+    """
+    Whether the answer of the request may be shared with other requests.
+
+    Only the first question of a thread without an attachment is shareable, because
+    every other answer also depends on the chat history or on the uploaded file.
+    """
+    if graph_input["user_input_type"] != "database":
+        return False
+    if not graph_input["collection_name"]:
+        return False
+
+    try:
+        snapshot = await GRAPH.aget_state(config)
+        return not snapshot.values.get("messages")
+    except Exception as e:
+        print(f"Error reading the thread state: {e}")
+        return False
+
+
+async def answer_cache_key(
+    graph_input: dict, shareable: bool
+) -> Optional[AnswerCacheKey]:
+    """
+    Return the answer cache key if the answer cache may answer the request.
+
+    The ingest version of the collection is read before the answer is generated, so that
+    an answer based on points changed in the meantime is not cached.
+    """
+    if not _settings.answer_cache_enabled or not shareable:
+        return None
+    if graph_input["collection_names"]:
+        return None
+
+    try:
+        embeddings, version = await asyncio.gather(
+            DENSE_CLIENT.calc_dense_embeddings(texts=graph_input["messages"]),
+            ANSWER_CACHE.current_version(graph_input["collection_name"]),
+        )
+        if version is None:
+            return None
+        return AnswerCacheKey(embedding=embeddings[0], version=version)
+
+    except Exception as e:
+        print(f"Error building the answer cache key: {e}")
+        return None
+
+
+def coalescing_key(graph_input: dict, shareable: bool) -> Optional[tuple]:
+    """Key under which identical concurrent questions share one graph run."""
+    if not _settings.single_flight_enabled or not shareable:
+        return None
+
+    return (
+        graph_input["collection_name"],
+        tuple(sorted(graph_input["collection_names"])),
+        normalize_question(graph_input["messages"]),
+    )
+
+
+async def save_answer(graph_input: dict, config: dict, answer: str) -> None:
+    """Persist an answer produced outside of the graph in the thread of the request."""
+    await GRAPH.aupdate_state(
+        config,
+        {
+            "messages": [
+                HumanMessage(content=graph_input["messages"]),
+                AIMessage(content=answer),
+            ],
+            "user_input_type": graph_input["user_input_type"],
+            "user_input_data": graph_input["user_input_data"],
+            "collection_name": graph_input["collection_name"],
+        },
+        as_node="llm",
+    )
+
+
+async def lookup_cached_answer(
+    graph_input: dict, config: dict, cache_key: Optional[AnswerCacheKey]
+) -> Optional[str]:
+    """Return a cached answer and persist it in the thread as if the graph produced it."""
+    if cache_key is None:
+        return None
+
+    answer = await ANSWER_CACHE.lookup(graph_input["collection_name"], cache_key)
+    if answer is None:
+        return None
+
+    await save_answer(graph_input, config, answer)
+    await log_turn(graph_input, config, answer)
+    print(f"Answer cache hit for collection {graph_input['collection_name']}")
+
+    return answer
+
+
+async def store_cached_answer(
+    graph_input: dict,
+    cache_key: Optional[AnswerCacheKey],
+    answer: str,
+    generation_seconds: float,
+) -> None:
+    if cache_key is None or not answer:
+        return
+
+    await ANSWER_CACHE.store(
+        collection_name=graph_input["collection_name"],
+        question=graph_input["messages"],
+        key=cache_key,
+        answer=answer,
+        generation_seconds=generation_seconds,
+    )
+
+
+async def graph_tokens(graph_input: dict, config: dict) -> AsyncIterator[str]:
+    """Run the graph and yield the tokens of the answer while they are generated."""
+    async for chunk, metadata in GRAPH.astream(
+        graph_input, config, stream_mode="messages"
+    ):
+        # Only forward the tokens of the answer, not of other model calls
+        if metadata.get("langgraph_node") != "llm":
+            continue
+        if not isinstance(chunk, AIMessageChunk) or not chunk.content:
+            continue
+        yield chunk.content
+
+
+def answer_tokens(
+    graph_input: dict, config: dict, key: Optional[tuple]
+) -> tuple[AsyncIterator[str], bool]:
+    """
+    Return the tokens of the answer and whether they are shared with another request.
+
+    Requests with the same coalescing key arriving while its graph run is in flight
+    subscribe to that run instead of starting their own.
+    """
+    if key is None:
+        return graph_tokens(graph_input, config), False
+
+    flight, leader = SINGLE_FLIGHT.join(key, lambda: graph_tokens(graph_input, config))
+    return flight.subscribe(), not leader
+
+
+async def finish_turn(
+    graph_input: dict,
+    config: dict,
+    answer: str,
+    shared: bool,
+    cache_key: Optional[AnswerCacheKey],
+    generation_seconds: float,
+) -> None:
+    """Log the turn, a shared answer is also persisted in the thread of the request."""
+    if shared:
+        await save_answer(graph_input, config, answer)
+        print(f"Shared answer for collection {graph_input['collection_name']}")
+    await log_turn(graph_input, config, answer)
+    if not shared:
+        await store_cached_answer(graph_input, cache_key, answer, generation_seconds)
+
+
 @app.post("/generate_answer")
 async def generate_answer(request: Request):
     try:
         global GRAPH
-        type_prefixes = {
-            "data:image": "image",
-            "data:text/csv": "csv",
-            "data:text/plain": "txt",
-            "data:application/pdf": "pdf",
-        }
-
         data = await request.json()
-        user_message = data.get("message", "")
-        user_input_data = data.get("data", "")
-        collection = data.get("collection", "")
-        thread_id = data.get("thread_id")
-
-        config = {"configurable": {"thread_id": thread_id}}
-
-        if user_input_data == "":
-            user_input_type = "database"
-        else:
-            for prefix, user_input_type in type_prefixes.items():
-                if user_input_data.startswith(prefix):
-                    break
-
-        answer = await GRAPH.ainvoke(
-            {
-                "messages": user_message,
-                "user_input_type": user_input_type,
-                "user_input_data": user_input_data,
-                "collection_name": collection,
-            },
-            config,
+        graph_input, config = build_graph_input(data)
+        graph_input = await store_attachment(graph_input)
+
+        shareable = await is_shareable(graph_input, config)
+        cache_key = await answer_cache_key(graph_input, shareable)
+        cached_answer = await lookup_cached_answer(graph_input, config, cache_key)
+        if cached_answer is not None:
+            return JSONResponse(content={"answer": cached_answer}, status_code=200)
+
+        key = coalescing_key(graph_input, shareable)
+        shared = False
+        start = time.perf_counter()
+        _answers_in_flight.inc()
+        try:
+            if key is None:
+                answer = await GRAPH.ainvoke(graph_input, config)
+                answer = answer["messages"][-1].content
+            else:
+                tokens, shared = answer_tokens(graph_input, config, key)
+                answer = "".join([token async for token in tokens])
+        finally:
+            _answers_in_flight.dec()
+
+        await finish_turn(
+            graph_input, config, answer, shared, cache_key, time.perf_counter() - start
         )
 
+        return JSONResponse(content={"answer": answer}, status_code=200)
+
+    except LLMBusyException:
         return JSONResponse(
-            content={"answer": answer["messages"][-1].content}, status_code=200
+            content={"answer": BUSY_ANSWER, "busy": True},
+            status_code=503,
+            headers={"Retry-After": "10"},
         )
 
     except Exception as e:
         print(e)
+        metrics.ERRORS.labels(where="generate_answer").inc()
         return JSONResponse(
             content={
                 "answer": "An error occurred while processing your request.",
@@ -123,42 +422,319 @@ async def generate_answer(request: Request):
         )
 
 
-@app.get("/get_collections")
-async def get_collections():
+async def answer_events(graph_input: dict, config: dict) -> AsyncIterator[dict]:
+    """
+    Run the graph and yield the LLM tokens as events while they are generated.
+
+    Events:
+        {"type": "token", "content": str}
+        {"type": "done", "answer": str, "ttft": float, "duration": float,
+         "shared": bool, "trace_id": str}
+        {"type": "error", "answer": str, "error": str, "busy": bool}
+    """
+    start = time.perf_counter()
+    ttft = None
+    answer = ""
+
     try:
-        global DB_CLIENT
-        institutions_collection = await DB_CLIENT.get_collection(
-            database_name="admin_panel", collection_name="collections"
+        graph_input = await store_attachment(graph_input)
+        shareable = await is_shareable(graph_input, config)
+        cache_key = await answer_cache_key(graph_input, shareable)
+        cached_answer = await lookup_cached_answer(graph_input, config, cache_key)
+        if cached_answer is not None:
+            yield {"type": "token", "content": cached_answer}
+            duration = time.perf_counter() - start
+            yield {
+                "type": "done",
+                "answer": cached_answer,
+                "ttft": duration,
+                "duration": duration,
+                "cached": True,
+            }
+            return
+
+        tokens, shared = answer_tokens(
+            graph_input, config, coalescing_key(graph_input, shareable)
         )
-        institutions = institutions_collection.find()
+        _answers_in_flight.inc()
+        try:
+            async for token in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    print(f"Time to first token: {ttft:.3f}s")
+
+                answer += token
+                yield {"type": "token", "content": token}
+        finally:
+            _answers_in_flight.dec()
+
+        duration = time.perf_counter() - start
+        print(f"Answer streamed in {duration:.3f}s")
+        await finish_turn(graph_input, config, answer, shared, cache_key, duration)
+        yield {
+            "type": "done",
+            "answer": answer,
+            "ttft": ttft,
+            "duration": duration,
+            "shared": shared,
+            "trace_id": tracing.current_trace_id(),
+        }
 
-        # Get bot name from users collection
-        users_collection = await DB_CLIENT.get_collection(
-            database_name="admin_panel", collection_name="users"
+    except LLMBusyException:
+        yield {"type": "error", "answer": BUSY_ANSWER, "error": "busy", "busy": True}
+
+    except Exception as e:
+        print(e)
+        metrics.ERRORS.labels(where="stream_answer").inc()
+        yield {
+            "type": "error",
+            "answer": "An error occurred while processing your request.",
+            "error": str(e),
+        }
+
+
+async def stream_answer(graph_input: dict, config: dict) -> AsyncIterator[str]:
+    """The events of answer_events as NDJSON lines."""
+    async for event in answer_events(graph_input, config):
+        yield json.dumps(event) + "\n"
+
+
+@app.post("/generate_answer_stream")
+async def generate_answer_stream(request: Request):
+    try:
+        data = await request.json()
+        graph_input, config = build_graph_input(data)
+
+        return StreamingResponse(
+            stream_answer(graph_input, config),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-        users = users_collection.find()
 
-        bot_names = {}
-        async for user in users:
-            if "bot_name" in user:
-                bot_names[str(user["_id"])] = user["bot_name"]
+    except Exception as e:
+        print(e)
+        return JSONResponse(
+            content={
+                "answer": "An error occurred while processing your request.",
+                "error": str(e),
+            },
+            status_code=500,
+        )
 
-        modified_institutions = []
 
-        async for inst in institutions:
-            inst["_id"] = str(inst["_id"])
-            if "owner_id" in inst and isinstance(inst["owner_id"], ObjectId):
-                inst["owner_id"] = str(inst["owner_id"])
-                try:
-                    inst["bot_name"] = bot_names[str(inst["owner_id"])]
-                except KeyError:
+SOCKET_MESSAGE_TYPES = ("ask", "resume", "cancel", "history", "ping")
+
+
+def is_int(value, minimum: int) -> bool:
+    """Whether a field of a WebSocket message is an integer of at least minimum."""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= minimum
+
+
+async def socket_answer_events(graph_input: dict, config: dict) -> AsyncIterator[dict]:
+    """answer_events of a WebSocket question, traced like an HTTP request."""
+    with tracing.span(
+        "WS ask", kind="server", collection=graph_input["collection_name"]
+    ):
+        async for event in answer_events(graph_input, config):
+            yield event
+
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket):
+    """
+    Chat channel of a widget session: questions, answers, history and cancelling over
+    one connection.
+
+    Client messages, "id" is chosen by the client and repeated in every reply:
+        {"type": "ask", "id": str, "thread_id": str, "message": str, "data": str,
+         "collection": str, "collections": list}
+        {"type": "resume", "id": str, "thread_id": str, "offset": int}
+        {"type": "cancel", "id": str, "thread_id": str}
+        {"type": "history", "id": str, "thread_id": str, "after": int, "last": int}
+        {"type": "ping"}
+
+    Server messages: {"type": "ready", "ping_interval": float} after connecting, the
+    events of answer_events with "id" and their sequence number "seq", a final
+    {"type": "cancelled"} for a cancelled answer, {"type": "history", "messages",
+    "start"}, {"type": "pong"} and {"type": "error", "error": str}. Resuming with the
+    first sequence number not received replays the rest of the answer, an answer that
+    is no longer known is reported as error with "resumable": false. Binary frames and
+    messages that are no JSON object are answered with an error event.
+
+    Connections without a message for ws_idle_timeout seconds are closed.
+    """
+    await websocket.accept()
+    _open_sockets.inc()
+    send_lock = asyncio.Lock()
+    # Tasks sending the events of the answers of this connection, by request ID
+    forwarders: dict[str, asyncio.Task] = {}
+
+    async def send(event: dict):
+        async with send_lock:
+            await websocket.send_json(event)
+
+    async def forward(request_id: str, generation: Generation, offset: int):
+        try:
+            async for seq, event in generation.follow(offset):
+                await send({**event, "id": request_id, "seq": seq})
+        except Exception as e:
+            # The connection is gone, the client resumes on its next one
+            print(f"Error sending answer {request_id}: {e}")
+
+    def follow(request_id: str, generation: Generation, offset: int):
+        previous = forwarders.pop(request_id, None)
+        if previous is not None:
+            previous.cancel()
+
+        task = forwarders[request_id] = asyncio.create_task(
+            forward(request_id, generation, offset)
+        )
+
+        def discard(_):
+            if forwarders.get(request_id) is task:
+                del forwarders[request_id]
+
+        task.add_done_callback(discard)
+
+    try:
+        await send({"type": "ready", "ping_interval": _settings.ws_ping_interval})
+
+        while True:
+            received = await asyncio.wait_for(
+                websocket.receive(), _settings.ws_idle_timeout
+            )
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+
+            try:
+                if received.get("text") is None:
+                    raise ValueError("Expected a text frame")
+                message = json.loads(received["text"])
+                if not isinstance(message, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError as e:
+                await send({"type": "error", "error": f"Invalid message: {e}"})
+                continue
+
+            message_type = message.get("type")
+            metrics.WEBSOCKET_MESSAGES.labels(
+                type=message_type if message_type in SOCKET_MESSAGE_TYPES else "unknown"
+            ).inc()
+
+            if message_type == "ping":
+                await send({"type": "pong"})
+                continue
+
+            request_id = str(message.get("id") or "")
+            thread_id = message.get("thread_id")
+            if not request_id or not thread_id or not isinstance(thread_id, str):
+                error = "id and thread_id (a string) are required"
+                await send({"type": "error", "id": request_id, "error": error})
+                continue
+            # Answers are only found again with the thread they belong to
+            key = (thread_id, request_id)
+
+            if message_type == "ask":
+                graph_input, config = build_graph_input(message)
+                # Asking again with the same ID, e.g. after a reconnect, does not
+                # start a second answer
+                generation = GENERATIONS.start(
+                    key, lambda: socket_answer_events(graph_input, config)
+                )
+                follow(request_id, generation, 0)
+
+            elif message_type == "resume":
+                generation = GENERATIONS.get(key)
+                if generation is None:
+                    await send(
+                        {
+                            "type": "error",
+                            "id": request_id,
+                            "error": "unknown answer",
+                            "resumable": False,
+                        }
+                    )
+                else:
+                    offset = message.get("offset")
+                    if not isinstance(offset, int):
+                        offset = 0
+                    follow(request_id, generation, offset)
+
+            elif message_type == "cancel":
+                # The answer ends with a cancelled event through its forwarder
+                generation = GENERATIONS.get(key)
+                if generation is not None:
+                    generation.cancel()
+
+            elif message_type == "history":
+                # The same rule as the query parameters of /get_chat_history
+                after, last = message.get("after"), message.get("last")
+                if not (after is None or is_int(after, 0)) or not (
+                    last is None or is_int(last, 1)
+                ):
+                    error = "after must be an integer >= 0 and last an integer >= 1"
+                    await send({"type": "error", "id": request_id, "error": error})
                     continue
-                inst.pop("owner_id", None)
-            inst.pop("created_at", None)
-            inst.pop("password", None)
-            modified_institutions.append(inst)
 
-        return JSONResponse(content=modified_institutions)
+                try:
+                    start, messages = await DB_CLIENT.get_messages(
+                        thread_id=thread_id, after=after, last=last
+                    )
+                    await send(
+                        {
+                            "type": "history",
+                            "id": request_id,
+                            "messages": messages,
+                            "start": start,
+                        }
+                    )
+                except Exception as e:
+                    print(f"Error loading the chat history: {e}")
+                    await send({"type": "error", "id": request_id, "error": str(e)})
+
+            else:
+                await send(
+                    {
+                        "type": "error",
+                        "id": request_id,
+                        "error": f"Unknown message type {message_type}",
+                    }
+                )
+
+    except asyncio.TimeoutError:
+        print("Closing idle WebSocket connection")
+        await websocket.close(code=1000, reason="idle")
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        # The answers keep running and stay resumable, only their forwarding stops
+        for task in forwarders.values():
+            task.cancel()
+        _open_sockets.dec()
+
+
+async def answer_cache_stats():
+    return JSONResponse(content=AsyncAnswerCache.stats(), status_code=200)
+
+
+# Unauthenticated like the /debug routes, so only served when enabled
+if _settings.answer_cache_stats_route:
+    app.add_api_route("/answer_cache/stats", answer_cache_stats, methods=["GET"])
+
+
+@app.get("/get_collections")
+async def get_collections(request: Request):
+    try:
+        metadata = await COLLECTION_METADATA.get()
+        headers = {"ETag": metadata.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == metadata.etag:
+            return Response(status_code=304, headers=headers)
+
+        return Response(
+            content=metadata.body, media_type="application/json", headers=headers
+        )
 
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
@@ -188,29 +764,15 @@ async def get_users():
 @app.post("/process_key")
 async def process_key(request: Request):
     try:
-        global DB_CLIENT
         data = await request.json()
         received_key = data.get("key", "")
         print(f"Received Key: {received_key}")
 
-        institutions_collection = await DB_CLIENT.get_collection(
-            database_name="admin_panel", collection_name="collections"
-        )
-        institutions = institutions_collection.find()
-
-        async for inst in institutions:
-            if inst["password"] is not None:
-                check_key = inst["password"]
-                if received_key.encode("utf-8") == check_key.encode("utf-8"):
-                    return JSONResponse(
-                        content={
-                            "answer": "collection found",
-                            "collection_name": inst["collection_name"],
-                            "welcome_message": inst["welcome_message"],
-                            "data_source_name": inst["data_source_name"],
-                        },
-                        status_code=200,
-                    )
+        # Keys are looked up in the cached collection metadata
+        metadata = await COLLECTION_METADATA.get()
+        collection = metadata.by_key.get(received_key)
+        if collection is not None:
+            return JSONResponse(content=collection, status_code=200)
 
         return JSONResponse(
             content={"answer": "no collection with this key"}, status_code=200
@@ -236,11 +798,19 @@ async def delete_chat(request: Request):
 
 
 @app.get("/get_chat_history")
-async def get_chat_history(thread_id: str):
+async def get_chat_history(
+    thread_id: str,
+    after: Optional[int] = Query(None, ge=0),
+    last: Optional[int] = Query(None, ge=1),
+):
     global DB_CLIENT
     try:
-        messages = await DB_CLIENT.get_latest_checkpoint(thread_id=thread_id)
-        return JSONResponse(content={"messages": messages}, status_code=200)
+        start, messages = await DB_CLIENT.get_messages(
+            thread_id=thread_id, after=after, last=last
+        )
+        return JSONResponse(
+            content={"messages": messages, "start": start}, status_code=200
+        )
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
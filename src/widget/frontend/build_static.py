@@ -0,0 +1,134 @@
+"""
+Build step for the static assets of the widget.
+
+Writes content-hashed copies of the widget's CSS and JavaScript to static/dist, with
+brotli (if the Brotli package is installed) and gzip variants, and the manifest that
+maps every source path to its hashed path. The manifest is also written into app.js
+and embed.js (ASSET_MANIFEST), which load the modules and the stylesheet. embed.js
+keeps its name, because host pages embed it by a fixed URL.
+
+Usage (run in the Dockerfile, after the CSS was built):
+    python -m src.widget.frontend.build_static
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+
+
+STATIC_DIR = Path(__file__).parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+
+# Referenced by the others, so they are hashed first
+LEAF_ASSETS = ("style.final.css", "modules/*.js")
+# Contain the manifest of the leaf assets
+LOADERS = ("app.js",)
+# Embedded by host pages, served under their own name
+ENTRY_POINTS = ("embed.js",)
+
+MANIFEST_PLACEHOLDER = "const ASSET_MANIFEST = {};"
+SOURCE_MAP_PATTERN = re.compile(r"sourceMappingURL=(\S+?)(\s*\*/)?$", re.MULTILINE)
+# Compressing tiny files does not pay off
+MIN_COMPRESS_SIZE = 256
+
+
+def hashed_name(path: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:10]
+    stem, extension = os.path.splitext(path)
+    return f"dist/{stem}.{digest}{extension}"
+
+
+def _brotli():
+    try:
+        import brotli
+
+        return brotli
+    except ImportError:
+        print("Brotli not installed, writing gzip variants only")
+        return None
+
+
+def write_asset(target: str, content: bytes, brotli) -> None:
+    """Write an asset and its compressed variants, if they are smaller."""
+    path = STATIC_DIR / target
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    if len(content) < MIN_COMPRESS_SIZE:
+        return
+
+    # mtime=0 keeps the output reproducible
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content, quality=11)
+
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(content):
+            path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+def with_manifest(content: bytes, manifest: dict[str, str], source: str) -> bytes:
+    text = content.decode("utf-8")
+    if MANIFEST_PLACEHOLDER not in text:
+        raise ValueError(f"{source} does not contain {MANIFEST_PLACEHOLDER}")
+    return text.replace(
+        MANIFEST_PLACEHOLDER,
+        f"const ASSET_MANIFEST = {json.dumps(manifest, sort_keys=True)};",
+    ).encode("utf-8")
+
+
+def with_source_map(content: bytes, source: str, target: str) -> bytes:
+    """Point the source map reference of a stylesheet to the map next to its source."""
+
+    def relocate(match: re.Match) -> str:
+        source_map = os.path.join(os.path.dirname(source), match.group(1))
+        relative = os.path.relpath(source_map, os.path.dirname(target))
+        return f"sourceMappingURL={relative}{match.group(2) or ''}"
+
+    return SOURCE_MAP_PATTERN.sub(relocate, content.decode("utf-8")).encode("utf-8")
+
+
+def build() -> dict[str, str]:
+    """Build static/dist and return the manifest."""
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    brotli = _brotli()
+    manifest: dict[str, str] = {}
+
+    sources = sorted(
+        path.relative_to(STATIC_DIR).as_posix()
+        for pattern in LEAF_ASSETS
+        for path in STATIC_DIR.glob(pattern)
+    )
+    for source in sources:
+        content = (STATIC_DIR / source).read_bytes()
+        target = hashed_name(source, content)
+        if source.endswith(".css"):
+            content = with_source_map(content, source, target)
+        write_asset(target, content, brotli)
+        manifest[source] = target
+
+    leaves = dict(manifest)
+    for source in LOADERS:
+        content = with_manifest((STATIC_DIR / source).read_bytes(), leaves, source)
+        target = hashed_name(source, content)
+        write_asset(target, content, brotli)
+        manifest[source] = target
+
+    for source in ENTRY_POINTS:
+        content = with_manifest((STATIC_DIR / source).read_bytes(), leaves, source)
+        target = f"dist/{source}"
+        write_asset(target, content, brotli)
+        manifest[source] = target
+
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    return manifest
+
+
+if __name__ == "__main__":
+    for source, target in build().items():
+        print(f"{source} -> {target}")
@@ -5,6 +5,9 @@
  * This file imports all the modular components of the Kiwi Chat Widget.
  */
 
+// Fingerprinted paths of the modules, written by build_static.py
+const ASSET_MANIFEST = {};
+
 // Global widget container for Shadow DOM isolation
 class KiwiChatWidget {
     constructor(shadowRoot, baseUrl) {
@@ -21,7 +24,8 @@ class KiwiChatWidget {
         }
 
         const script = document.createElement('script');
-        script.src = `${this.baseUrl}/static/modules/${src}`;
+        const path = `modules/${src}`;
+        script.src = `${this.baseUrl}/static/${ASSET_MANIFEST[path] || path}`;
         script.onload = () => {
             this.loadedScripts.add(src);
             callback();
@@ -44,6 +48,7 @@ class KiwiChatWidget {
         const scripts = [
             'kiwi-config.js',
             'kiwi-thread.js',
+            'kiwi-socket.js',
             'kiwi-chat.js',
             'kiwi-ui.js',
             'kiwi-collections.js',
@@ -1,4 +1,11 @@
 (function() {
+    // Fingerprinted paths of the stylesheet and the modules, written by build_static.py
+    const ASSET_MANIFEST = {};
+
+    function assetUrl(baseUrl, path) {
+        return `${baseUrl}/static/${ASSET_MANIFEST[path] || path}`;
+    }
+
     // Initialize widget when DOM is ready
     if (document.readyState === 'loading') {
         document.addEventListener('DOMContentLoaded', initWidget);
@@ -68,7 +75,7 @@
             'https://fonts.googleapis.com/css2?family=Open+Sans:ital,wght@0,300..800;1,300..800&family=Poppins:ital,wght@0,100;0,200;0,300;0,400;0,500;0,600;0,700;0,800;0,900;1,100;1,200;1,300;1,400;1,500;1,600;1,700;1,800;1,900&display=swap',
             'https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.9.0/styles/default.min.css',
             'https://cdn.jsdelivr.net/npm/katex@0.16.22/dist/katex.min.css',
-            `${baseUrl}/static/style.final.css`
+            assetUrl(baseUrl, 'style.final.css')
         ];
 
         await Promise.all(stylesheets.map(async href => {
@@ -192,6 +199,7 @@
         const modules = [
             'kiwi-config.js',
             'kiwi-thread.js',
+            'kiwi-socket.js',
             'kiwi-chat.js',
             'kiwi-ui.js',
             'kiwi-collections.js',
@@ -202,7 +210,7 @@
         for (const module of modules) {
             await new Promise((resolve, reject) => {
                 const script = document.createElement('script');
-                script.src = `${baseUrl}/static/modules/${module}`;
+                script.src = assetUrl(baseUrl, `modules/${module}`);
 
                 const timeoutId = setTimeout(() => {
                     reject(new Error(`Timeout loading module ${module}`));
@@ -24,6 +24,8 @@ async function deleteChat(thread_id) {
     deleteChatFrontend();
 
     if (thread_id) {
+        cancelSocketAnswers(thread_id);
+
         try {
             const response = await fetch(`${domain}/delete_chat`, {
                 method: "POST",
@@ -53,13 +55,17 @@ async function deleteChat(thread_id) {
  */
 async function buildChat(thread_id) {
     try {
-        const response = await fetch(`${domain}/get_chat_history?thread_id=${thread_id}`);
-        const data = await response.json();
+        let data = await socketRequest({ type: "history", thread_id: thread_id });
+        if (!data || data.type === "error") {
+            const response = await fetch(`${domain}/get_chat_history?thread_id=${thread_id}`);
+            data = await response.json();
+        }
         const messages = data.messages;
+        const start = data.start || 0;
 
         // Display the chat history in the frontend
         for (let i = 0; i < messages.length; i++) {
-            if (i % 2 === 0) {
+            if ((start + i) % 2 === 0) {
                 sendInputMessage(messages[i]);
             } else {
                 sendOutputMessage(messages[i]);
@@ -190,34 +196,131 @@ async function sendDataToServer(userInput, base64Data) {
                 setThreadID(thread_id);
             }
 
-            const response = await fetch(`${domain}/generate_answer`, {
+            const request = {
+                message: userInput,
+                data: base64Data,
+                collection: collection,
+                thread_id: thread_id
+            };
+
+            // Over the open WebSocket connection if there is one
+            const renderer = createAnswerRenderer();
+            if (await socketRequest({ type: "ask", ...request }, renderer.handleEvent)) {
+                renderer.finish();
+                return;
+            }
+
+            const response = await fetch(`${domain}/generate_answer_stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({
-                    message: userInput,
-                    data: base64Data,
-                    collection: collection,
-                    thread_id: thread_id
-                }),
+                body: JSON.stringify(request),
             });
 
-            if (response.ok) {
-                const botMessage = await response.json();
-                sendOutputMessage(botMessage.answer);
-                chatbox.scrollTop = chatbox.scrollHeight;
+            if (response.ok && response.body) {
+                await readAnswerStream(response.body);
             } else {
                 console.error('Error fetching the answer:', response.statusText);
+                hideLoadingAnimation();
                 sendOutputMessage('Sorry, something went wrong.');
             }
         } catch (error) {
             console.error('Error fetching the answer:', error);
+            hideLoadingAnimation();
             sendOutputMessage('Sorry, something went wrong.');
         }
     }
 }
 
+/**
+ * Creates the renderer of a streamed answer
+ * @returns {{handleEvent: Function, finish: Function}} Event handler and final render
+ */
+function createAnswerRenderer() {
+    let answer = "";
+    let messageContainer = null;
+    let renderScheduled = false;
+    let cancelled = false;
+
+    const scheduleRender = () => {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            renderMarkdown(messageContainer, answer, false);
+            chatbox.scrollTop = chatbox.scrollHeight;
+        });
+    };
+
+    const handleEvent = (event) => {
+        if (event.type === "token") {
+            if (!messageContainer) {
+                // First token: replace the loading animation with the answer bubble
+                hideLoadingAnimation();
+                messageContainer = createOutputMessage();
+            }
+            answer += event.content;
+            scheduleRender();
+        } else if (event.type === "done") {
+            answer = event.answer || answer;
+        } else if (event.type === "error") {
+            console.error('Error fetching the answer:', event.error);
+            // The server is saturated: show its "busy" answer instead of a failure
+            answer = answer || (event.busy ? event.answer : 'Sorry, something went wrong.');
+        } else if (event.type === "cancelled") {
+            cancelled = true;
+        }
+    };
+
+    const finish = () => {
+        hideLoadingAnimation();
+        // Cancelled before the first token, e.g. because the chat was deleted
+        if (cancelled && !messageContainer) {
+            return;
+        }
+        if (!messageContainer) {
+            messageContainer = createOutputMessage();
+        }
+        renderMarkdown(messageContainer, answer, true);
+        chatbox.scrollTop = chatbox.scrollHeight;
+    };
+
+    return { handleEvent, finish };
+}
+
+/**
+ * Reads the NDJSON answer stream and renders the tokens as they arrive
+ * @param {ReadableStream} body - Response body of /generate_answer_stream
+ */
+async function readAnswerStream(body) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    const { handleEvent, finish } = createAnswerRenderer();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (line.trim()) {
+                handleEvent(JSON.parse(line));
+            }
+        }
+    }
+
+    if (buffer.trim()) {
+        handleEvent(JSON.parse(buffer));
+    }
+
+    finish();
+}
+
 /**
  * Displays user message in chat
  * @param {string} userMessage - Message from user
@@ -267,10 +370,10 @@ async function sendDataToServer(userInput, base64Data) {
 }
 
 /**
- * Displays bot message in chat
- * @param {string} outputMessage - Message from bot
+ * Creates an empty bot message bubble in the chat
+ * @returns {HTMLElement} The message container to render into
  */
-async function sendOutputMessage(outputMessage) {
+function createOutputMessage() {
     let newOutputMessage = document.createElement("li");
     newOutputMessage.classList.add("chat", "outgoing");
 
@@ -281,15 +384,29 @@ async function sendOutputMessage(outputMessage) {
     let messageContainer = document.createElement("div");
     messageContainer.classList.add("message-container");
 
-    const rawHtml = marked.parse(outputMessage);
-    messageContainer.innerHTML = DOMPurify.sanitize(rawHtml);
-
     newOutputMessage.appendChild(icon);
     newOutputMessage.appendChild(messageContainer);
 
     chatbox.appendChild(newOutputMessage);
 
-    const codeBlocks = newOutputMessage.querySelectorAll('pre code');
+    return messageContainer;
+}
+
+/**
+ * Renders markdown into a bot message container
+ * @param {HTMLElement} messageContainer - Container created by createOutputMessage
+ * @param {string} outputMessage - Markdown to render
+ * @param {boolean} final - Whether the message is complete (enables code and math rendering)
+ */
+function renderMarkdown(messageContainer, outputMessage, final = true) {
+    const rawHtml = marked.parse(outputMessage);
+    messageContainer.innerHTML = DOMPurify.sanitize(rawHtml);
+
+    if (!final) {
+        return;
+    }
+
+    const codeBlocks = messageContainer.querySelectorAll('pre code');
     codeBlocks.forEach(block => {
         hljs.highlightElement(block);
     });
@@ -307,5 +424,13 @@ async function sendOutputMessage(outputMessage) {
     } else {
         console.warn("KaTeX auto-render extension not loaded, math formulas may not render.");
     }
+}
 
-}
\ No newline at end of file
+/**
+ * Displays bot message in chat
+ * @param {string} outputMessage - Message from bot
+ */
+async function sendOutputMessage(outputMessage) {
+    const messageContainer = createOutputMessage();
+    renderMarkdown(messageContainer, outputMessage);
+}
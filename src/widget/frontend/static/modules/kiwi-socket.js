@@ -0,0 +1,222 @@
+/**
+ * Kiwi Socket Module
+ * Keeps one WebSocket connection to the server for answers and chat history.
+ * Callers fall back to the HTTP endpoints if the connection is not available.
+ */
+
+// Reconnect attempts while requests are open, with exponential backoff
+const SOCKET_MAX_RETRIES = 5;
+const SOCKET_RETRY_DELAY = 500;
+// Events ending a request
+const SOCKET_FINAL_EVENTS = ["done", "error", "cancelled", "history"];
+
+let chatSocket = null;
+let socketConnecting = null;
+let socketPingTimer = null;
+let socketRetries = 0;
+let socketEverOpened = false;
+// Set if the connection never opened, e.g. because a proxy blocks WebSockets
+let socketUnavailable = false;
+// Open requests by ID: { payload, onEvent, resolve, nextSeq }
+const socketRequests = new Map();
+
+/**
+ * Generates a new request ID
+ * @returns {string} New request ID
+ */
+function generateRequestId() {
+    return "req_" + Math.random().toString(36).substr(2, 9);
+}
+
+/**
+ * Sends pings, so that the server and proxies keep the connection open
+ * @param {WebSocket} socket - The open connection
+ * @param {number} interval - Seconds between two pings, as announced by the server
+ */
+function startSocketPing(socket, interval) {
+    stopSocketPing();
+    socketPingTimer = setInterval(() => {
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify({ type: "ping" }));
+        }
+    }, (interval || 20) * 1000);
+}
+
+/**
+ * Stops sending pings
+ */
+function stopSocketPing() {
+    if (socketPingTimer) {
+        clearInterval(socketPingTimer);
+        socketPingTimer = null;
+    }
+}
+
+/**
+ * Opens the connection, or returns the open one
+ * @returns {Promise<WebSocket|null>} The connection, null if it is not available
+ */
+function connectSocket() {
+    if (socketUnavailable || typeof WebSocket === "undefined") {
+        return Promise.resolve(null);
+    }
+    if (chatSocket && chatSocket.readyState === WebSocket.OPEN) {
+        return Promise.resolve(chatSocket);
+    }
+    if (socketConnecting) {
+        return socketConnecting;
+    }
+
+    socketConnecting = new Promise((resolve) => {
+        let opened = false;
+        let socket;
+
+        try {
+            socket = new WebSocket(`${domain.replace(/^http/, "ws")}/ws`);
+        } catch (error) {
+            console.error("WebSocket nicht verfügbar:", error);
+            socketUnavailable = true;
+            socketConnecting = null;
+            resolve(null);
+            return;
+        }
+
+        socket.onmessage = (message) => {
+            const event = JSON.parse(message.data);
+
+            // The server is ready after accepting the connection
+            if (event.type === "ready") {
+                opened = true;
+                socketEverOpened = true;
+                socketRetries = 0;
+                chatSocket = socket;
+                socketConnecting = null;
+                startSocketPing(socket, event.ping_interval);
+                resolve(socket);
+                return;
+            }
+
+            handleSocketEvent(event);
+        };
+
+        socket.onclose = () => {
+            stopSocketPing();
+            if (chatSocket === socket) {
+                chatSocket = null;
+            }
+            if (!opened) {
+                socketConnecting = null;
+                // Never connected: use the HTTP endpoints from now on
+                if (!socketEverOpened) {
+                    socketUnavailable = true;
+                }
+                resolve(null);
+            }
+            scheduleSocketReconnect();
+        };
+    });
+
+    return socketConnecting;
+}
+
+/**
+ * Passes an event to its request and ends the request with its final event
+ * @param {Object} event - Event received from the server
+ */
+function handleSocketEvent(event) {
+    const request = socketRequests.get(event.id);
+    if (!request) {
+        return;
+    }
+
+    if (event.seq !== undefined) {
+        // Replayed after resuming, already received before the connection dropped
+        if (event.seq < request.nextSeq) {
+            return;
+        }
+        request.nextSeq = event.seq + 1;
+    }
+
+    request.onEvent(event);
+
+    if (SOCKET_FINAL_EVENTS.includes(event.type)) {
+        socketRequests.delete(event.id);
+        request.resolve(event);
+    }
+}
+
+/**
+ * Reconnects while requests are open and resumes them on the new connection
+ */
+function scheduleSocketReconnect() {
+    if (socketRequests.size === 0) {
+        return;
+    }
+
+    if (socketUnavailable || socketRetries >= SOCKET_MAX_RETRIES) {
+        for (const [id, request] of socketRequests) {
+            handleSocketEvent({
+                type: "error",
+                id: id,
+                error: "connection lost",
+                answer: "Sorry, something went wrong."
+            });
+        }
+        return;
+    }
+
+    const delay = SOCKET_RETRY_DELAY * 2 ** socketRetries;
+    socketRetries++;
+
+    setTimeout(async () => {
+        const socket = await connectSocket();
+        if (!socket) {
+            return;
+        }
+
+        for (const [id, request] of socketRequests) {
+            // Answers continue from the first event not received, the rest is resent
+            const message = request.payload.type === "ask"
+                ? { type: "resume", id: id, thread_id: request.payload.thread_id, offset: request.nextSeq }
+                : request.payload;
+            socket.send(JSON.stringify(message));
+        }
+    }, delay);
+}
+
+/**
+ * Sends a request over the connection
+ * @param {Object} payload - Message with type and thread_id, see /ws in app.py
+ * @param {Function} onEvent - Called with every event of the request
+ * @returns {Promise<Object|null>} The final event, null if there is no connection
+ */
+async function socketRequest(payload, onEvent = () => {}) {
+    const socket = await connectSocket();
+    if (!socket) {
+        return null;
+    }
+
+    const id = generateRequestId();
+    const message = { ...payload, id: id };
+
+    return new Promise((resolve) => {
+        socketRequests.set(id, { payload: message, onEvent, resolve, nextSeq: 0 });
+        socket.send(JSON.stringify(message));
+    });
+}
+
+/**
+ * Cancels the running answers of a thread
+ * @param {string} thread_id - The thread whose answers are cancelled
+ */
+function cancelSocketAnswers(thread_id) {
+    if (!chatSocket || chatSocket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+
+    for (const [id, request] of socketRequests) {
+        if (request.payload.type === "ask" && request.payload.thread_id === thread_id) {
+            chatSocket.send(JSON.stringify({ type: "cancel", id: id, thread_id: thread_id }));
+        }
+    }
+}
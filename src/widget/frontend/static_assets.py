@@ -0,0 +1,84 @@
+import json
+import mimetypes
+import re
+import stat
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+
+# Content-hashed files written by build_static.py, their content never changes
+FINGERPRINTED = re.compile(r"^dist/.+\.[0-9a-f]{10}\.\w+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def load_manifest(static_dir: str) -> dict[str, str]:
+    """The manifest of build_static.py, empty if the assets were not built."""
+    try:
+        return json.loads((Path(static_dir) / "dist" / "manifest.json").read_text())
+    except FileNotFoundError:
+        print("Static assets not built, serving the sources")
+        return {}
+
+
+def _accepted_encodings(scope: Scope) -> set[str]:
+    header = Headers(scope=scope).get("accept-encoding", "")
+    encodings = set()
+    for part in header.split(","):
+        name, _, parameters = part.strip().partition(";")
+        if parameters.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00"):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles serving the built assets of build_static.py.
+
+    Requests for a source path (e.g. /static/embed.js) are answered with its built file,
+    as brotli or gzip variant if the client accepts it. Fingerprinted paths are cached
+    as immutable, all others are revalidated with their ETag on every use.
+    """
+
+    def __init__(self, *args, manifest: dict[str, str], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        target = self.manifest.get(path, path)
+        accepted = _accepted_encodings(scope)
+
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(
+                self.lookup_path, target + suffix
+            )
+            if stat_result is not None and stat.S_ISREG(stat_result.st_mode):
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["content-encoding"] = encoding
+                media_type = (
+                    mimetypes.guess_type(target)[0] or "application/octet-stream"
+                )
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                response.headers["content-type"] = media_type
+                break
+
+        if response is None:
+            response = await super().get_response(target, scope)
+
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = (
+            IMMUTABLE if FINGERPRINTED.match(path) else "no-cache"
+        )
+        return response